@@ -1,8 +1,16 @@
 from __future__ import unicode_literals
 from django.contrib import admin
-from .models import AuthCode, LinfootFunnel, SocialAccount, User, UserPhone
+from .models import (
+    AuthCode,
+    ContactManifest,
+    LinfootFunnel,
+    SocialAccount,
+    User,
+    UserPhone,
+)
 
 
-@admin.register(AuthCode, LinfootFunnel, SocialAccount, User, UserPhone)
+@admin.register(AuthCode, ContactManifest, LinfootFunnel, SocialAccount, User,
+                UserPhone)
 class AuthAdmin(admin.ModelAdmin):
     pass
@@ -5,3 +5,6 @@ class AuthConfig(AppConfig):
     name = 'rallytap.apps.auth'
     label = 'down_auth'
     verbose_name = 'Rallytap auth'
+
+    def ready(self):
+        from . import signals
@@ -1,17 +1,162 @@
 from __future__ import unicode_literals
+from collections import OrderedDict
+import cPickle as pickle
+import hmac
+import threading
+import time
 from django.conf import settings
+from django.core.cache import cache
 from rest_framework import authentication
 from rest_framework import exceptions
 
 
+class MeteorServerUser(object):
+    """
+    The user for requests from the meteor server.
+    """
+    id = None
+    pk = None
+    is_active = True
+    is_staff = False
+
+    def is_authenticated(self):
+        return True
+
+    def is_anonymous(self):
+        return False
+
+meteor_server = MeteorServerUser()
+
+_meteor_keys = None
+_meteor_headers = ()
+
+
+def get_meteor_headers():
+    """
+    Return the `Authorization` headers the meteor server can send, one for each
+    key in `METEOR_KEYS`. Only build them again when the keys change.
+    """
+    global _meteor_keys, _meteor_headers
+    if _meteor_keys is not settings.METEOR_KEYS:
+        _meteor_headers = tuple(
+                'Token {key}'.format(key=key).encode('utf-8')
+                for key in settings.METEOR_KEYS)
+        _meteor_keys = settings.METEOR_KEYS
+    return _meteor_headers
+
+
 class MeteorAuthentication(authentication.BaseAuthentication):
     """
-    Raise an exception if the request isn't authenticated with the meteor server
-    key.
+    Authenticate requests from the meteor server, which sends one of the keys in
+    `METEOR_KEYS` as its token. Compare the header with every key in constant
+    time, so that the time it takes doesn't leak the keys.
     """
 
     def authenticate(self, request):
-        meteor_token = 'Token {meteor_key}'.format(meteor_key=settings.METEOR_KEY)
-        if request.META.get('HTTP_AUTHORIZATION') != meteor_token:
-            raise exceptions.AuthenticationFailed('Bath auth token')
-        return None
+        header = authentication.get_authorization_header(request)
+        matched = False
+        for meteor_header in get_meteor_headers():
+            matched |= hmac.compare_digest(header, meteor_header)
+        if not matched:
+            raise exceptions.AuthenticationFailed('Invalid meteor server key.')
+        return (meteor_server, None)
+
+    def authenticate_header(self, request):
+        return 'Token'
+
+
+class LocalTokenCache(object):
+    """
+    A thread-safe LRU cache of pickled tokens for this process. Entries expire
+    after `TOKEN_LOCAL_CACHE_TIMEOUT` seconds, since we can only invalidate the
+    entries in the process that deleted the token or saved the user.
+    """
+
+    def __init__(self):
+        self.tokens = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.tokens.pop(key, None)
+            if entry is None:
+                return None
+            pickled_token, expires_at = entry
+            if expires_at < time.time():
+                return None
+            # Move the token to the end, since it was used most recently.
+            self.tokens[key] = entry
+        return pickled_token
+
+    def set(self, key, pickled_token):
+        expires_at = time.time() + settings.TOKEN_LOCAL_CACHE_TIMEOUT
+        with self.lock:
+            self.tokens.pop(key, None)
+            self.tokens[key] = (pickled_token, expires_at)
+            while len(self.tokens) > settings.TOKEN_LOCAL_CACHE_SIZE:
+                self.tokens.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.tokens.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.tokens.clear()
+
+local_tokens = LocalTokenCache()
+
+
+def get_token_cache_key(key):
+    return 'token:{key}'.format(key=key)
+
+def get_user_token_cache_key(user_id):
+    return 'user-token:{id}'.format(id=user_id)
+
+def invalidate_token(key):
+    local_tokens.delete(key)
+    cache.delete(get_token_cache_key(key))
+
+def invalidate_user_token(user_id):
+    """
+    Invalidate the cached token for the user, so that the next request loads
+    the latest version of the user.
+    """
+    key = cache.get(get_user_token_cache_key(user_id))
+    if key is not None:
+        invalidate_token(key)
+
+
+class CachedTokenAuthentication(authentication.TokenAuthentication):
+    """
+    Token authentication that caches each token and its user in this process,
+    and in the shared cache, so that most requests don't query the database to
+    authenticate.
+    """
+
+    def authenticate_credentials(self, key):
+        # Only cache keys that look like tokens, since cache keys can't have
+        # spaces or control characters.
+        if not (len(key) == 40 and key.isalnum()):
+            return super(CachedTokenAuthentication, self) \
+                    .authenticate_credentials(key)
+        key = key.decode('ascii')
+
+        pickled_token = local_tokens.get(key)
+        if pickled_token is None:
+            pickled_token = cache.get(get_token_cache_key(key))
+            if pickled_token is not None:
+                local_tokens.set(key, pickled_token)
+        if pickled_token is not None:
+            token = pickle.loads(pickled_token)
+            return (token.user, token)
+
+        user, token = super(CachedTokenAuthentication, self) \
+                .authenticate_credentials(key)
+        pickled_token = pickle.dumps(token, pickle.HIGHEST_PROTOCOL)
+        local_tokens.set(key, pickled_token)
+        cache.set_many({
+            get_token_cache_key(key): pickled_token,
+            get_user_token_cache_key(user.id): key,
+        }, settings.TOKEN_CACHE_TIMEOUT)
+        return (user, token)
@@ -0,0 +1,40 @@
+from __future__ import unicode_literals
+from rallytap.apps.friends.models import Friendship
+from rallytap.apps.jobs.utils import enqueue
+from rallytap.apps.utils.utils import bump_cache_version, get_cache_versions
+
+SYSTEM_GENERATION_KEY = 'user-generation:system'
+
+
+def get_user_generation(user_id):
+    """
+    Return the user's generation, which we bump whenever a cached response for
+    the user could have changed. Every user's friends include the system
+    accounts, so the generation also includes the system accounts' generation.
+    """
+    keys = ['user-generation:{id}'.format(id=user_id), SYSTEM_GENERATION_KEY]
+    versions = get_cache_versions(keys)
+    return '{user}.{system}'.format(user=versions[keys[0]],
+                                    system=versions[keys[1]])
+
+def bump_user_generations(user_ids):
+    for user_id in user_ids:
+        bump_cache_version('user-generation:{id}'.format(id=user_id))
+
+def bump_system_generation():
+    bump_cache_version(SYSTEM_GENERATION_KEY)
+
+def invalidate_user_responses(user_ids):
+    """
+    Invalidate the cached responses for the users, and queue a job to
+    invalidate the cached responses for the users who added them as a friend,
+    since their friends list includes the users.
+    """
+    bump_user_generations(user_ids)
+    enqueue('rallytap.apps.auth.generations.invalidate_added_me_responses',
+            user_ids=list(user_ids))
+
+def invalidate_added_me_responses(user_ids):
+    added_me_ids = Friendship.objects.filter(friend_id__in=user_ids) \
+            .values_list('user_id', flat=True)
+    bump_user_generations(set(added_me_ids))
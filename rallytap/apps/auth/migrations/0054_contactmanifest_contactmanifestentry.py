@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('down_auth', '0053_auto_20151214_2222'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContactManifest',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('version', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ContactManifestEntry',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('phone_hash', models.CharField(max_length=64)),
+                ('manifest', models.ForeignKey(related_name='entries', to='down_auth.ContactManifest')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='contactmanifestentry',
+            unique_together=set([('manifest', 'phone_hash')]),
+        ),
+    ]
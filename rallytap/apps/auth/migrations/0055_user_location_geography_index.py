@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from rallytap.apps.utils.operations import RunSQLOutsideTransaction
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('down_auth', '0054_contactmanifest_contactmanifestentry'),
+    ]
+
+    operations = [
+        # Index the expression that the `near` lookup filters on. Build the
+        # index concurrently so that we don't block writes while it builds.
+        RunSQLOutsideTransaction(
+            sql=('CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+                 'down_auth_user_location_geography '
+                 'ON down_auth_user '
+                 'USING GIST (geography(ST_FlipCoordinates(location)))'),
+            reverse_sql=('DROP INDEX CONCURRENTLY IF EXISTS '
+                         'down_auth_user_location_geography'),
+        ),
+    ]
@@ -68,6 +68,30 @@ class UserPhone(models.Model):
         return unicode(self.user.name)
 
 
+class ContactManifest(models.Model):
+    """
+    The phone hashes of every contact the user has synced, so that clients can
+    sync only the contacts that changed.
+    """
+    user = models.OneToOneField(User)
+    version = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        return unicode(self.user.name)
+
+
+class ContactManifestEntry(models.Model):
+    manifest = models.ForeignKey(ContactManifest, related_name='entries')
+    phone_hash = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ('manifest', 'phone_hash')
+
+    def __unicode__(self):
+        return unicode(self.phone_hash)
+
+
 class SocialAccount(models.Model):
     user = models.ForeignKey(User)
     FACEBOOK = 1
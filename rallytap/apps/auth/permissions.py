@@ -1,6 +1,6 @@
 from __future__ import unicode_literals
-from django.conf import settings
 from rest_framework import permissions
+from .authentication import meteor_server
 
 
 class IsCurrentUserOrReadOnly(permissions.BasePermission):
@@ -29,8 +29,9 @@ class IsStaff(permissions.BasePermission):
 
 class IsMeteor(permissions.BasePermission):
     """
-    Only allow the meteor server to access an object.
+    Only allow the meteor server to access an object. Use with
+    `MeteorAuthentication`.
     """
 
     def has_permission(self, request, view):
-        return request.user.id == settings.METEOR_USER_ID
+        return request.user is meteor_server
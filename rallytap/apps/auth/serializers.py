@@ -3,7 +3,6 @@ from phonenumber_field import phonenumber
 from rest_framework import serializers
 from rest_framework.serializers import ValidationError
 from rest_framework_gis.serializers import GeoModelSerializer
-from rallytap.apps.friends.models import Friendship
 from .models import (
     AuthCode,
     FellowshipApplication,
@@ -67,15 +66,17 @@ class FriendSerializer(GeoModelSerializer):
 class UserSerializer(GeoModelSerializer):
     authtoken = serializers.SerializerMethodField(required=False)
     friends = serializers.SerializerMethodField(required=False)
+    friends_version = serializers.SerializerMethodField(required=False)
     facebook_friends = serializers.SerializerMethodField(required=False)
 
     class Meta:
         model = User
         fields = ('id', 'name', 'first_name', 'last_name',
                   'image_url', 'username', 'location', 'friends',
-                  'updated_at', 'authtoken', 'facebook_friends',
-                  'email', 'points')
-        read_only_fields = ('updated_at', 'friends', 'facebook_friends', 'points')
+                  'friends_version', 'updated_at', 'authtoken',
+                  'facebook_friends', 'email', 'points')
+        read_only_fields = ('updated_at', 'friends', 'friends_version',
+                            'facebook_friends', 'points')
 
     def get_authtoken(self, obj):
         return self.context.get('authtoken')
@@ -88,6 +89,9 @@ class UserSerializer(GeoModelSerializer):
         else:
             return None
 
+    def get_friends_version(self, obj):
+        return self.context.get('friends_version')
+
     def get_facebook_friends(self, obj):
         facebook_friends = self.context.get('facebook_friends')
         if facebook_friends is not None:
@@ -124,13 +128,6 @@ class UserPhoneSerializer(serializers.ModelSerializer):
             userphone = UserPhone(user=user, phone=validated_data['phone'])
             userphone.save()
 
-            # Make the user friends with Team Rallytap.
-            teamrallytap = User.objects.get(username='teamrallytap')
-            friendships = []
-            friendships.append(Friendship(user=user, friend=teamrallytap))
-            friendships.append(Friendship(user=teamrallytap, friend=user))
-            Friendship.objects.bulk_create(friendships)
-
         return userphone
 
 
@@ -139,6 +136,13 @@ class ContactSerializer(serializers.Serializer):
     name = serializers.CharField()
 
 
+class ContactsDeltaSerializer(serializers.Serializer):
+    version = serializers.IntegerField(min_value=0)
+    added = serializers.ListField(required=False, default=[])
+    removed = serializers.ListField(child=serializers.CharField(max_length=64),
+                                    required=False, default=[])
+
+
 class FacebookSessionSerializer(serializers.Serializer):
     access_token = serializers.CharField()
 
@@ -0,0 +1,54 @@
+from __future__ import unicode_literals
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from rallytap.apps.friends.models import Friendship
+from rallytap.apps.friends.utils import (
+    get_system_user_ids,
+    invalidate_system_user_ids,
+    is_system_user,
+)
+from .authentication import invalidate_token, invalidate_user_token
+from .generations import (
+    bump_system_generation,
+    bump_user_generations,
+    invalidate_user_responses,
+)
+from .models import User, UserPhone
+from .serializers import FriendSerializer
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(sender, instance, update_fields=None, **kwargs):
+    if (update_fields is not None and
+            not set(update_fields) & set(FriendSerializer.Meta.fields)):
+        # None of the fields that changed show up in friends lists, so only
+        # the user's own responses changed.
+        bump_user_generations([instance.id])
+    else:
+        invalidate_user_responses([instance.id])
+    if is_system_user(instance) or instance.id in get_system_user_ids():
+        # Every user's friends include the system accounts.
+        invalidate_system_user_ids()
+        bump_system_generation()
+    invalidate_user_token(instance.id)
+
+    # The username might have been free before.
+    if instance.username:
+        cache.delete('username:{username}'.format(
+                username=instance.username.lower()))
+
+
+@receiver(post_save, sender=Friendship)
+@receiver(post_delete, sender=Friendship)
+@receiver(post_save, sender=UserPhone)
+@receiver(post_delete, sender=UserPhone)
+def invalidate_related_user(sender, instance, **kwargs):
+    bump_user_generations([instance.user_id])
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
@@ -0,0 +1,154 @@
+from __future__ import unicode_literals
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.utils import override_settings
+import mock
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+from rallytap.apps.auth.authentication import (
+    CachedTokenAuthentication,
+    MeteorAuthentication,
+    get_meteor_headers,
+    local_tokens,
+    meteor_server,
+)
+from rallytap.apps.auth.models import User
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_tokens.clear()
+
+        # Mock a user.
+        self.user = User(name='Alan Tdog Turing')
+        self.user.save()
+        self.token = Token(user=self.user)
+        self.token.save()
+
+        self.authentication = CachedTokenAuthentication()
+
+    def test_authenticate(self):
+        with self.assertNumQueries(1):
+            user, token = self.authentication.authenticate_credentials(
+                    self.token.key)
+        self.assertEqual(user, self.user)
+        self.assertEqual(token, self.token)
+
+        # It should return the cached user and token without querying them.
+        with self.assertNumQueries(0):
+            user, token = self.authentication.authenticate_credentials(
+                    self.token.key)
+        self.assertEqual(user, self.user)
+        self.assertEqual(user.name, self.user.name)
+        self.assertEqual(token, self.token)
+
+    @mock.patch('rallytap.apps.auth.authentication.cache')
+    def test_authenticate_local_cache(self, mock_cache):
+        mock_cache.get.return_value = None
+        self.authentication.authenticate_credentials(self.token.key)
+        mock_cache.reset_mock()
+
+        # It should return the user and token from this process's cache without
+        # querying the database or the shared cache.
+        with self.assertNumQueries(0):
+            user, token = self.authentication.authenticate_credentials(
+                    self.token.key)
+        self.assertEqual(user, self.user)
+        self.assertFalse(mock_cache.get.called)
+
+    def test_authenticate_shared_cache(self):
+        self.authentication.authenticate_credentials(self.token.key)
+
+        # Mock a request to another process.
+        local_tokens.clear()
+
+        # It should return the user and token from the shared cache.
+        with self.assertNumQueries(0):
+            user, token = self.authentication.authenticate_credentials(
+                    self.token.key)
+        self.assertEqual(user, self.user)
+
+    def test_authenticate_user_changed(self):
+        self.authentication.authenticate_credentials(self.token.key)
+
+        self.user.name = 'Alan'
+        self.user.save()
+
+        # It should return the updated user.
+        user, token = self.authentication.authenticate_credentials(
+                self.token.key)
+        self.assertEqual(user.name, 'Alan')
+
+    def test_authenticate_user_deactivated(self):
+        self.authentication.authenticate_credentials(self.token.key)
+
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    def test_authenticate_token_deleted(self):
+        self.authentication.authenticate_credentials(self.token.key)
+
+        self.token.delete()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+
+@override_settings(METEOR_KEYS=['new-key', 'old-key'])
+class MeteorAuthenticationTests(TestCase):
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.authentication = MeteorAuthentication()
+
+    def test_authenticate(self):
+        request = self.factory.post('/', HTTP_AUTHORIZATION='Token new-key')
+        user, auth = self.authentication.authenticate(request)
+        self.assertIs(user, meteor_server)
+
+    def test_authenticate_old_key(self):
+        # The meteor server might still use the old key while we rotate keys.
+        request = self.factory.post('/', HTTP_AUTHORIZATION='Token old-key')
+        user, auth = self.authentication.authenticate(request)
+        self.assertIs(user, meteor_server)
+
+    def test_authenticate_bad_key(self):
+        request = self.factory.post('/', HTTP_AUTHORIZATION='Token bad-key')
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate(request)
+
+    def test_authenticate_no_key(self):
+        request = self.factory.post('/')
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate(request)
+
+    @mock.patch('rallytap.apps.auth.authentication.cache')
+    def test_authenticate_warm(self, mock_cache):
+        request = self.factory.post('/', HTTP_AUTHORIZATION='Token old-key')
+        self.authentication.authenticate(request)
+        meteor_headers = get_meteor_headers()
+
+        # It should reuse the headers it built for the keys, without querying
+        # the database or the cache.
+        with self.assertNumQueries(0):
+            for i in xrange(100):
+                self.authentication.authenticate(request)
+        self.assertIs(get_meteor_headers(), meteor_headers)
+        self.assertFalse(mock_cache.get.called)
+
+    @override_settings(METEOR_KEYS=['newer-key'])
+    def test_authenticate_keys_changed(self):
+        request = self.factory.post('/', HTTP_AUTHORIZATION='Token newer-key')
+        user, auth = self.authentication.authenticate(request)
+        self.assertIs(user, meteor_server)
+
+        # It should stop accepting keys that were rotated out.
+        request = self.factory.post('/', HTTP_AUTHORIZATION='Token old-key')
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authentication.authenticate(request)
@@ -1,6 +1,13 @@
 from __future__ import unicode_literals
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
 from rest_framework.test import APITestCase
-from rallytap.apps.auth.models import AuthCode
+from rallytap.apps.auth.generations import get_user_generation
+from rallytap.apps.auth.models import AuthCode, User
+from rallytap.apps.friends.models import Friendship
+from rallytap.apps.jobs.models import Job
+from rallytap.apps.jobs.utils import claim_job, run_job
 
 
 class AuthCodeTests(APITestCase):
@@ -12,3 +19,43 @@ class AuthCodeTests(APITestCase):
 
         # Valid auth code is six numbers
         self.assertRegexpMatches(auth.code, r'^[1-9]\d{3}$')
+
+
+class UserInvalidationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+        # Mock a user, and a friend who added them.
+        self.user = User(name='Alan Tdog Turing')
+        self.user.save()
+        self.friend = User(name='Joan Clarke')
+        self.friend.save()
+        friendship = Friendship(user=self.friend, friend=self.user)
+        friendship.save()
+        Job.objects.all().delete()
+
+    def test_save(self):
+        user_generation = get_user_generation(self.user.id)
+        friend_generation = get_user_generation(self.friend.id)
+
+        self.user.name = 'Alan Turing'
+        self.user.save()
+
+        # It should invalidate the user's responses right away, and queue a
+        # job to invalidate the responses of the users who added them.
+        self.assertNotEqual(get_user_generation(self.user.id), user_generation)
+        self.assertEqual(get_user_generation(self.friend.id), friend_generation)
+        run_job(claim_job())
+        self.assertNotEqual(get_user_generation(self.friend.id),
+                            friend_generation)
+
+    def test_save_self_only_fields(self):
+        user_generation = get_user_generation(self.user.id)
+
+        self.user.last_post_notification = timezone.now()
+        self.user.save(update_fields=['last_post_notification'])
+
+        # It should only invalidate the user's own responses.
+        self.assertNotEqual(get_user_generation(self.user.id), user_generation)
+        self.assertEqual(Job.objects.count(), 0)
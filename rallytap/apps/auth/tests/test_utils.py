@@ -1,21 +1,30 @@
 from __future__ import unicode_literals
 import json
 from django.conf import settings
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.db.models.query import QuerySet
 from django.test import TestCase
 import httpretty
+import mock
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.exceptions import ParseError
-from rallytap.apps.auth.models import SocialAccount, User
+from rallytap.apps.auth.models import ContactManifest, SocialAccount, User
 from rallytap.apps.auth import utils
 from rallytap.apps.friends.models import Friendship
+from rallytap.apps.utils import meteor
 from rallytap.apps.utils.exceptions import ServiceUnavailable
 
 
 class FacebookFriendsTests(TestCase):
 
     def setUp(self):
+        # Don't use friends cached by another test, or reuse connections that
+        # were opened while httpretty was enabled.
+        cache.clear()
+        self.addCleanup(utils.get_graph_session().close)
+
         # Mock a user.
         self.user = User(email='aturing@gmail.com', name='Alan Tdog Turing',
                          username='tdog', image_url='http://imgur.com/tdog',
@@ -86,6 +95,39 @@ class FacebookFriendsTests(TestCase):
         # It should return a queryset of the users facebook friends.
         self.assertEqual(list(friends), [friend1, friend2])
 
+    @httpretty.activate
+    def test_facebook_friends_cached(self):
+        # Mock one of the user's friends.
+        friend = User(name='Joan Clarke')
+        friend.save()
+        friend_social = SocialAccount(user=friend,
+                                      provider=SocialAccount.FACEBOOK,
+                                      uid='20101293050283881',
+                                      profile={'access_token': '2234asdf'})
+        friend_social.save()
+
+        # Mock the user's Facebook friends.
+        body = json.dumps({'data': [{'id': friend_social.uid}]})
+        httpretty.register_uri(httpretty.GET, self.friends_url, body=body,
+                               content_type='application/json')
+
+        friends = utils.get_facebook_friends(self.user_social)
+        self.assertEqual(list(friends), [friend])
+
+        # It should request a large page of friends.
+        querystring = httpretty.last_request().querystring
+        self.assertEqual(querystring['limit'],
+                         [unicode(utils.FACEBOOK_FRIENDS_PAGE_SIZE)])
+        self.assertEqual(querystring['access_token'], ['1234asdf'])
+
+        # Mock Facebook being down.
+        httpretty.register_uri(httpretty.GET, self.friends_url,
+                               status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        # It should return the cached friends without requesting them again.
+        friends = utils.get_facebook_friends(self.user_social)
+        self.assertEqual(list(friends), [friend])
+
     @httpretty.activate
     def test_facebook_friends_error(self):
         # Mock a bad response from Facebook when requesting the user's facebook
@@ -138,6 +180,9 @@ class FacebookFriendsTests(TestCase):
 class FacebookProfileTests(TestCase):
 
     def setUp(self):
+        # Don't reuse connections that were opened while httpretty was enabled.
+        self.addCleanup(utils.get_graph_session().close)
+
         # Mock a user.
         self.user = User(email='aturing@gmail.com', name='Alan Tdog Turing',
                          first_name='Alan', last_name='Turing', username='tdog',
@@ -197,9 +242,45 @@ class FacebookProfileTests(TestCase):
             utils.get_facebook_profile(self.access_token)
 
 
+class ContactManifestTests(TestCase):
+
+    def setUp(self):
+        self.user = User()
+        self.user.save()
+
+    def test_lock_contact_manifest(self):
+        manifest = utils.lock_contact_manifest(self.user)
+
+        # It should create the user's manifest.
+        self.assertEqual(ContactManifest.objects.get(user=self.user), manifest)
+
+    def test_lock_contact_manifest_race(self):
+        # Mock another sync creating the manifest after this sync looked for
+        # it.
+        manifest = ContactManifest(user=self.user)
+        manifest.save()
+        get = QuerySet.get
+        calls = []
+        def mock_get(queryset, *args, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise ContactManifest.DoesNotExist()
+            return get(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'get', mock_get):
+            locked_manifest = utils.lock_contact_manifest(self.user)
+
+        # It should return the other sync's manifest.
+        self.assertEqual(locked_manifest, manifest)
+        self.assertEqual(len(calls), 2)
+
+
 class MeteorLoginTests(TestCase):
 
     def setUp(self):
+        # Don't reuse connections that were opened while httpretty was enabled.
+        self.addCleanup(meteor.get_session().close)
+
         self.user = User()
         self.user.save()
         self.token = Token(user=self.user)
@@ -1,11 +1,15 @@
 from __future__ import unicode_literals
 from binascii import a2b_hex
+import calendar
 from datetime import datetime, timedelta
 import json
 import mock
 from urllib import urlencode
 from django.conf import settings
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 import httpretty
 import pytz
@@ -13,10 +17,11 @@ from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
-import time
 from twilio import TwilioRestException
+from rallytap.apps.auth.authentication import CachedTokenAuthentication
 from rallytap.apps.auth.models import (
     AuthCode,
+    ContactManifest,
     FellowshipApplication,
     LinfootFunnel,
     Points,
@@ -29,18 +34,26 @@ from rallytap.apps.auth.serializers import (
     UserSerializer,
     UserPhoneSerializer,
 )
-from rallytap.apps.events.models import Event, SavedEvent
+from rallytap.apps.auth.generations import get_user_generation
+from rallytap.apps.auth.utils import hash_phone
+from rallytap.apps.events.models import ArchivedSavedEvent, Event, SavedEvent
 from rallytap.apps.events.serializers import (
+    ArchivedSavedEventSerializer,
     SavedEventSerializer,
     SavedEventFullEventSerializer,
 )
+from rallytap.apps.events.utils import archive_events
 from rallytap.apps.friends.models import Friendship
+from rallytap.apps.friends.utils import get_friends
+from rallytap.apps.jobs.utils import claim_job, run_job
 from rallytap.apps.utils.exceptions import ServiceUnavailable
 
 
 class UserTests(APITestCase):
 
     def setUp(self):
+        cache.clear()
+
         self.patcher = mock.patch('requests.patch')
         self.mock_patch = self.patcher.start()
 
@@ -115,6 +128,37 @@ class UserTests(APITestCase):
         json_user = JSONRenderer().render(serializer.data)
         self.assertEqual(response.content, json_user)
 
+    def test_get_me_not_modified(self):
+        response = self.client.get(self.me_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.me_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        # It shouldn't query the database.
+        self.assertEqual(len(queries), 0)
+
+    def test_get_me_changed(self):
+        response = self.client.get(self.me_url)
+        etag = response['ETag']
+
+        # Update the user.
+        self.user.name = 'Alan'
+        self.user.save()
+
+        response = self.client.get(self.me_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # It should return the updated user.
+        user = User.objects.get(id=self.user.id)
+        serializer = UserSerializer(user)
+        json_user = JSONRenderer().render(serializer.data)
+        self.assertEqual(response.content, json_user)
+
     def test_put(self):
         new_name = 'Alan'
         data = {
@@ -211,6 +255,35 @@ class UserTests(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_get_username_not_modified(self):
+        url = reverse('user-username-detail', kwargs={
+            'username': self.user.username,
+        })
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_get_username_changed(self):
+        url = reverse('user-username-detail', kwargs={'username': 'tpain'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # Take the username.
+        self.friend1.username = 'tpain'
+        self.friend1.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Give up the username.
+        self.friend1.username = 'tpain2'
+        self.friend1.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_get_username_taken_upper(self):
         # Usernames should be unique regardless of case.
         username = self.user.username.upper()
@@ -230,6 +303,158 @@ class UserTests(APITestCase):
         json_friends = JSONRenderer().render(serializer.data)
         self.assertEqual(response.content, json_friends)
 
+    def test_friends_cached(self):
+        url = reverse('user-friends')
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should return the cached friends without querying the database.
+        self.assertEqual(len(queries), 0)
+        serializer = FriendSerializer([self.friend1], many=True)
+        json_friends = JSONRenderer().render(serializer.data)
+        self.assertEqual(response.content, json_friends)
+
+    def test_friends_friend_changed(self):
+        url = reverse('user-friends')
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        # Update the user's friend, and run the job that invalidates the
+        # responses of the users who added them.
+        self.friend1.name = 'Joan'
+        self.friend1.save()
+        job = claim_job()
+        while job is not None:
+            run_job(job)
+            job = claim_job()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should return the updated friend.
+        serializer = FriendSerializer([self.friend1], many=True)
+        json_friends = JSONRenderer().render(serializer.data)
+        self.assertEqual(response.content, json_friends)
+
+    def test_friends_friendship_deleted(self):
+        url = reverse('user-friends')
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        self.friendship.delete()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should return the user's remaining friends.
+        self.assertEqual(response.content, '[]')
+
+    def mock_friends(self, num_friends):
+        friends = []
+        for i in xrange(num_friends):
+            friend = User(name='Friend {}'.format(i))
+            friend.save()
+            friendship = Friendship(user=self.user, friend=friend)
+            friendship.save()
+            friends.append(friend)
+        return friends
+
+    def test_friends_paginated(self):
+        friends = self.mock_friends(2)
+        url = reverse('user-friends')
+
+        response = self.client.get(url, {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should return the friends who joined most recently.
+        content = json.loads(response.content)
+        self.assertEqual([friend['id'] for friend in content['results']],
+                         [friends[1].id, friends[0].id])
+
+        response = self.client.get(url, {
+            'limit': 2,
+            'cursor': content['next'],
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should return the rest of the friends.
+        content = json.loads(response.content)
+        self.assertEqual([friend['id'] for friend in content['results']],
+                         [self.friend1.id])
+        self.assertIsNone(content['next'])
+
+    def test_friends_updated_since(self):
+        # Mock the user having added their friend a while ago.
+        a_day_ago = timezone.now() - timedelta(days=1)
+        User.objects.filter(id=self.friend1.id).update(updated_at=a_day_ago)
+        Friendship.objects.filter(id=self.friendship.id) \
+                .update(updated_at=a_day_ago)
+
+        # Mock a friend who changed their profile recently, and a friend who
+        # the user added recently.
+        changed_friend, added_friend = self.mock_friends(2)
+        Friendship.objects.filter(user=self.user, friend=changed_friend) \
+                .update(updated_at=a_day_ago)
+
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        url = reverse('user-friends')
+        response = self.client.get(url, {
+            'updated_since': calendar.timegm(an_hour_ago.utctimetuple()),
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should only return the friends who changed since then.
+        content = json.loads(response.content)
+        self.assertEqual({friend['id'] for friend in content['results']},
+                         {changed_friend.id, added_friend.id})
+        self.assertEqual(content['removed_ids'], [])
+
+    def test_friends_updated_since_removed(self):
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        url = reverse('user-friends')
+        params = {
+            'updated_since': calendar.timegm(an_hour_ago.utctimetuple()),
+        }
+
+        # Mock the user removing their friend.
+        self.friendship.delete()
+
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should return the friend the user removed.
+        content = json.loads(response.content)
+        self.assertEqual(content['results'], [])
+        self.assertEqual(content['removed_ids'], [self.friend1.id])
+
+        # It should return the removed friend on every page.
+        response = self.client.get(url, dict(params, limit=10))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = json.loads(response.content)
+        self.assertEqual(content['results'], [])
+        self.assertEqual(content['removed_ids'], [self.friend1.id])
+
+        # Mock the user adding their friend back.
+        friendship = Friendship(user=self.user, friend=self.friend1)
+        friendship.save()
+
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should only return the friend as added.
+        content = json.loads(response.content)
+        self.assertEqual([friend['id'] for friend in content['results']],
+                         [self.friend1.id])
+        self.assertEqual(content['removed_ids'], [])
+
+    def test_friends_updated_since_invalid(self):
+        url = reverse('user-friends')
+        response = self.client.get(url, {'updated_since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     @mock.patch('rallytap.apps.auth.views.utils.get_facebook_friends')
     def test_facebook_friends(self, mock_get_facebook_friends):
         # Mock the friends Facebook returns.
@@ -273,6 +498,30 @@ class UserTests(APITestCase):
         json_added_me = JSONRenderer().render(serializer.data)
         self.assertEqual(response.content, json_added_me)
 
+    def test_archived_saved_events(self):
+        # Mock the user being interested in an event that we archived.
+        nineteen_eighty = datetime(year=1980, month=5, day=21,
+                                   tzinfo=pytz.utc)
+        event = Event(title='see the new star wars', creator=self.user,
+                      datetime=nineteen_eighty, expired=True)
+        event.save()
+        saved_event = SavedEvent(user=self.user, event=event,
+                                 location=self.user.location)
+        saved_event.save()
+        archive_events(timezone.now(), 10)
+
+        url = reverse('user-archived-saved-events')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should return the user's archived saved events.
+        archived_saved_events = ArchivedSavedEvent.objects.filter(
+                id=saved_event.id)
+        serializer = ArchivedSavedEventSerializer(archived_saved_events,
+                                                  many=True)
+        json_saved_events = JSONRenderer().render(serializer.data)
+        self.assertEqual(response.content, json_saved_events)
+
     def test_saved_events(self):
         # Mock the user being interested in two events.
         event1 = Event(title='bbq in the park', creator=self.user)
@@ -325,19 +574,45 @@ class UserTests(APITestCase):
         json_saved_events = JSONRenderer().render(serializer.data)
         self.assertEqual(response.content, json_saved_events)
 
+    def mock_saved_events(self, num_events):
+        # Mock the user and their friend being interested in a bunch of events.
+        Event.objects.bulk_create([
+            Event(title='event {}'.format(i), creator=self.user)
+            for i in xrange(num_events)
+        ])
+        events = Event.objects.filter(creator=self.user)
+        SavedEvent.objects.bulk_create([
+            SavedEvent(user=user, event=event, location=self.user.location)
+            for event in events
+            for user in [self.user, self.friend1]
+        ])
+
+    def test_saved_events_benchmark(self):
+        url = reverse('user-saved-events')
+
+        self.mock_saved_events(1)
+        # Cache the user's token so that both requests skip authenticating.
+        CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        num_queries = len(queries)
+
+        # Mock a user with thousands of saved events.
+        self.mock_saved_events(2000)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(json.loads(response.content)), 2001)
+
+        # It should use the same number of queries no matter how many events
+        # the user saved.
+        self.assertEqual(len(queries), num_queries)
+
     @mock.patch('rallytap.apps.auth.views.send_message')
     def test_invite(self, mock_send_message):
-        # Use the meteor server's auth token.
-        try:
-            meteor_user = User.objects.get(id=settings.METEOR_USER_ID)
-            token = Token.objects.get(user=meteor_user)
-        except User.DoesNotExist:
-            dt = timezone.now()
-            meteor_user = User(id=settings.METEOR_USER_ID, date_joined=dt)
-            meteor_user.save()
-            token = Token(user=meteor_user)
-            token.save()
-        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        # Use the meteor server's key.
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + settings.METEOR_KEY)
 
         # Save the user's current score to compare to after the request.
         user_points = self.user.points
@@ -541,7 +816,7 @@ class SocialAccountTests(APITestCase):
         # It should return the user.
         data = {
             'facebook_friends': facebook_friends,
-            'friends': self.user.friends,
+            'friends': get_friends(self.user),
             'authtoken': self.token.key,
         }
         serializer = UserSerializer(self.user, context=data)
@@ -698,16 +973,33 @@ class SessionTests(APITestCase):
         # It should login to the meteor server.
         mock_meteor_login.assert_called_once_with(token)
 
-        # The user should be friends with Team Rallytap.
-        Friendship.objects.get(user=user, friend=self.teamrallytap_user)
-        Friendship.objects.get(user=self.teamrallytap_user, friend=user)
+        # The user should be friends with Team Rallytap without any
+        # friendships.
+        self.assertIn(self.teamrallytap_user, get_friends(user))
+        self.assertEqual(Friendship.objects.count(), 0)
 
         # It should return the user.
-        data = {'authtoken': token.key, 'friends': user.friends}
+        data = {'authtoken': token.key, 'friends': get_friends(user)}
         serializer = UserSerializer(user, context=data)
         json_user = JSONRenderer().render(serializer.data)
         self.assertEqual(response.content, json_user)
 
+    @mock.patch('rallytap.apps.auth.views.utils.meteor_login')
+    def test_create_friends_version(self, mock_meteor_login):
+        self.mock_user()
+
+        data = {'phone': unicode(self.auth.phone), 'code': self.auth.code}
+        url = '{list_url}?friends=version'.format(list_url=self.list_url)
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # It should return the version of the user's friends list instead of
+        # the friends.
+        content = json.loads(response.content)
+        self.assertIsNone(content['friends'])
+        self.assertEqual(content['friends_version'],
+                         get_user_generation(self.user.id))
+
     def test_create_bad_credentials(self):
         # Mock an auth code.
         auth = AuthCode(phone='+12345678910')
@@ -742,7 +1034,7 @@ class SessionTests(APITestCase):
         mock_meteor_login.assert_called_once_with(token)
 
         # The response should have the same user object
-        data = {'authtoken': token.key, 'friends': self.user.friends}
+        data = {'authtoken': token.key, 'friends': get_friends(self.user)}
         serializer = UserSerializer(self.user, context=data)
         user_json = JSONRenderer().render(serializer.data)
         self.assertEqual(response.content, user_json)
@@ -768,7 +1060,7 @@ class SessionTests(APITestCase):
         mock_meteor_login.assert_called_once_with(token)
 
         # The response should have the same user object
-        data = {'authtoken': token.key, 'friends': self.user.friends}
+        data = {'authtoken': token.key, 'friends': get_friends(self.user)}
         serializer = UserSerializer(self.user, context=data)
         user_json = JSONRenderer().render(serializer.data)
         self.assertEqual(response.content, user_json)
@@ -838,7 +1130,7 @@ class SessionTests(APITestCase):
         mock_meteor_login.assert_called_once_with(token)
 
         # It should return the user.
-        context = {'authtoken': token.key, 'friends': user.friends}
+        context = {'authtoken': token.key, 'friends': get_friends(user)}
         serializer = UserSerializer(user, context=context)
         json_user = JSONRenderer().render(serializer.data)
         self.assertEqual(response.content, json_user)
@@ -873,7 +1165,7 @@ class SessionTests(APITestCase):
         mock_meteor_login.assert_called_once_with(token)
 
         # It should return the user.
-        context = {'authtoken': token.key, 'friends': user.friends}
+        context = {'authtoken': token.key, 'friends': get_friends(user)}
         serializer = UserSerializer(user, context=context)
         json_user = JSONRenderer().render(serializer.data)
         self.assertEqual(response.content, json_user)
@@ -884,11 +1176,9 @@ class SessionTests(APITestCase):
         token = Token(user=self.teamrallytap_user)
         token.save()
 
-        # Mock the rallytap user's friend.
+        # Mock a user, who's friends with the rallytap user.
         friend = User(username='teamtaprally')
         friend.save()
-        friendship = Friendship(user=self.teamrallytap_user, friend=friend)
-        friendship.save()
 
         # Mock a staff member.
         staff_user = User(is_staff=True)
@@ -993,9 +1283,10 @@ class UserPhoneTests(APITestCase):
         contact_user = contact_userphone.user
         self.assertEqual(contact_user.name, contact_name)
 
-        # It should make the contact friends with Team Rallytap.
-        Friendship.objects.get(user=contact_user, friend=self.teamrallytap_user)
-        Friendship.objects.get(user=self.teamrallytap_user, friend=contact_user)
+        # It should make the contact friends with Team Rallytap without any
+        # friendships.
+        self.assertIn(self.teamrallytap_user, get_friends(contact_user))
+        self.assertFalse(Friendship.objects.filter(user=contact_user).exists())
 
         # It should update the user who was added by phone number's name.
         user = User.objects.get(id=added_by_phone_user.id)
@@ -1020,6 +1311,139 @@ class UserPhoneTests(APITestCase):
         json_user_phones = JSONRenderer().render(serializer.data)
         self.assertEqual(response.content, json_user_phones)
 
+    def test_query_by_contacts_duplicates_and_invalid(self):
+        contact_phone = '+19176227310'
+        data = {'contacts': [
+            {
+                'name': 'Ada',
+                'phone': contact_phone,
+            },
+            {
+                'name': 'Ada Lovelace',
+                'phone': contact_phone,
+            },
+            {
+                'name': 'Bad Number',
+                'phone': '+1555',
+            },
+        ]}
+        response = self.client.post(self.phones_url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should create a single userphone for the duplicate phone number.
+        contact_userphone = UserPhone.objects.get(phone=contact_phone)
+        self.assertEqual(contact_userphone.user.name, 'Ada Lovelace')
+
+        # It should skip the invalid contact.
+        self.assertEqual(len(json.loads(response.content)), 1)
+
+    def mock_contacts(self, num_contacts, first_number):
+        # Mock users who were added by phone number, and new contacts.
+        phones = ['+1212555{:04d}'.format(first_number + i)
+                  for i in xrange(num_contacts)]
+        added_phones = phones[::2]
+        User.objects.bulk_create([User(name=phone) for phone in added_phones])
+        UserPhone.objects.bulk_create([
+            UserPhone(user=user, phone=user.name)
+            for user in User.objects.filter(name__in=added_phones)
+        ])
+        contacts = [{'name': 'Contact {}'.format(i), 'phone': phone}
+                    for i, phone in enumerate(phones)]
+        return {'contacts': contacts}
+
+    def test_query_by_contacts_num_queries(self):
+        data = self.mock_contacts(4, 0)
+        # Cache the user's token so that both requests skip authenticating.
+        CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.phones_url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        num_queries = len(queries)
+
+        # Mock an address book with thousands of contacts.
+        data = self.mock_contacts(5000, 1000)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.phones_url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(json.loads(response.content)), 5000)
+
+        # It should use the same number of queries no matter how many contacts
+        # there are.
+        self.assertEqual(len(queries), num_queries)
+
+        # It should name the users who were added by phone number.
+        user = UserPhone.objects.get(phone='+12125551000').user
+        self.assertEqual(user.name, 'Contact 0')
+
+    def test_contacts_delta(self):
+        url = reverse('userphone-contacts-delta')
+        ada_phone = '+19176227310'
+        grace_phone = '+12036227310'
+
+        # Sync the whole address book.
+        data = {
+            'version': 0,
+            'added': [
+                {'name': 'Ada Lovelace', 'phone': ada_phone},
+                {'name': 'Grace Hopper', 'phone': grace_phone},
+            ],
+        }
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should save the contacts' phone hashes.
+        manifest = ContactManifest.objects.get(user=self.user)
+        self.assertEqual(manifest.version, 1)
+        phone_hashes = set(manifest.entries.values_list('phone_hash', flat=True))
+        self.assertEqual(phone_hashes, {hash_phone(ada_phone),
+                                        hash_phone(grace_phone)})
+
+        # It should return the new version and the userphones.
+        userphones = [
+            UserPhone.objects.get(phone=ada_phone),
+            UserPhone.objects.get(phone=grace_phone),
+        ]
+        serializer = UserPhoneSerializer(userphones, many=True)
+        self.assertEqual(json.loads(response.content), {
+            'version': 1,
+            'userphones': json.loads(JSONRenderer().render(serializer.data)),
+        })
+
+        # Sync only what changed.
+        new_phone = '+15148333650'
+        data = {
+            'version': 1,
+            'added': [{'name': 'Alan Turing', 'phone': new_phone}],
+            'removed': [hash_phone(grace_phone)],
+        }
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should update the manifest.
+        manifest = ContactManifest.objects.get(user=self.user)
+        self.assertEqual(manifest.version, 2)
+        phone_hashes = set(manifest.entries.values_list('phone_hash', flat=True))
+        self.assertEqual(phone_hashes, {hash_phone(ada_phone),
+                                        hash_phone(new_phone)})
+
+        # It should only return the added contact's userphone.
+        content = json.loads(response.content)
+        self.assertEqual(content['version'], 2)
+        self.assertEqual([userphone['phone']
+                          for userphone in content['userphones']], [new_phone])
+
+    def test_contacts_delta_stale_version(self):
+        manifest = ContactManifest(user=self.user, version=3)
+        manifest.save()
+
+        url = reverse('userphone-contacts-delta')
+        data = {'version': 2, 'added': [], 'removed': []}
+        response = self.client.post(url, data)
+
+        # It should tell the client which version the server has.
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(json.loads(response.content), {'version': 3})
+
     def test_query_by_contacts_not_logged_in(self):
         # Unauth the user.
         self.client.credentials()
@@ -1039,9 +1463,10 @@ class UserPhoneTests(APITestCase):
         user = userphone.user
         self.assertEqual(user.name, data['phone'])
 
-        # The user should be friends with Team Rallytap.
-        Friendship.objects.get(user=user, friend=self.teamrallytap_user)
-        Friendship.objects.get(user=self.teamrallytap_user, friend=user)
+        # The user should be friends with Team Rallytap without any
+        # friendships.
+        self.assertIn(self.teamrallytap_user, get_friends(user))
+        self.assertEqual(Friendship.objects.count(), 0)
 
         # It should return the userphone.
         serializer = UserPhoneSerializer(userphone)
@@ -1,20 +1,74 @@
 from __future__ import unicode_literals
-import json
+from collections import OrderedDict
+from functools import wraps
+import hashlib
 from urllib import urlencode
 from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, TextField, Value, When
+from django.utils import timezone
 import requests
 from rest_framework import status
 from rest_framework.exceptions import ParseError
-from .models import SocialAccount, User
+from rest_framework.response import Response
+from rallytap.apps.friends.utils import is_system_user
 from rallytap.apps.utils.exceptions import ServiceUnavailable
+from rallytap.apps.utils.meteor import meteor_login
+from rallytap.apps.utils.profiling import profile_http
+from rallytap.apps.utils.utils import bulk_create_returning
+from .authentication import invalidate_user_token
+from .generations import get_user_generation, invalidate_user_responses
+from .models import ContactManifest, SocialAccount, User, UserPhone
+from .serializers import ContactSerializer
 
+# The max number of friends to request per page. Facebook caps how many it
+# returns, but asking for more than the default of 25 saves round trips.
+FACEBOOK_FRIENDS_PAGE_SIZE = 5000
 
-def get_facebook_friends(user_facebook_account):
-    params = {'access_token': user_facebook_account.profile['access_token']}
+_graph_session = None
+
+
+def get_graph_session():
+    """
+    Return the session shared by every request to the Facebook Graph API, so
+    that requests reuse pooled keep-alive connections.
+    """
+    global _graph_session
+    if _graph_session is None:
+        _graph_session = requests.Session()
+    return _graph_session
+
+def graph_get(url):
+    """
+    GET the url from the Facebook Graph API, and return the response.
+    """
+    try:
+        with profile_http('facebook'):
+            return get_graph_session().get(url,
+                                           timeout=settings.FACEBOOK_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        raise ServiceUnavailable(unicode(e))
+
+def get_facebook_friend_ids(user_facebook_account):
+    """
+    Return a list of the Facebook ids of the user's Facebook friends who use
+    the app. Cache the list for `FACEBOOK_FRIENDS_CACHE_TIMEOUT` seconds.
+    """
+    cache_key = 'facebook-friends:{id}'.format(id=user_facebook_account.id)
+    facebook_friend_ids = cache.get(cache_key)
+    if facebook_friend_ids is not None:
+        return facebook_friend_ids
+
+    params = {
+        'access_token': user_facebook_account.profile['access_token'],
+        'fields': 'id',
+        'limit': FACEBOOK_FRIENDS_PAGE_SIZE,
+    }
     url = 'https://graph.facebook.com/v2.2/me/friends?' + urlencode(params)
     facebook_friend_ids = []
     while True:
-        response = requests.get(url)
+        response = graph_get(url)
         if response.status_code == status.HTTP_400_BAD_REQUEST:
             raise ParseError(response.content)
         elif response.status_code != status.HTTP_200_OK:
@@ -28,18 +82,25 @@ def get_facebook_friends(user_facebook_account):
                 facebook_friend['id']
                 for facebook_friend in facebook_json['data']
             ]
-            facebook_friend_ids.extend(new_friend_ids)
-            paging = facebook_json.get('paging')
-            if len(new_friend_ids) < 25 or 'next' not in paging:
-                break
-            url = paging.get('next')
         except KeyError:
             raise ServiceUnavailable('Facebook response did not contain data.')
+        facebook_friend_ids.extend(new_friend_ids)
+        paging = facebook_json.get('paging', {})
+        if len(new_friend_ids) == 0 or 'next' not in paging:
+            break
+        url = paging['next']
+
+    cache.set(cache_key, facebook_friend_ids,
+              settings.FACEBOOK_FRIENDS_CACHE_TIMEOUT)
+    return facebook_friend_ids
+
+def get_facebook_friends(user_facebook_account):
+    facebook_friend_ids = get_facebook_friend_ids(user_facebook_account)
 
     # Use the list of the user's Facebook friends to create a queryset of the
     # user's friends on rallytap.
-    social_accounts = SocialAccount.objects.filter(uid__in=facebook_friend_ids)
-    friend_ids = [account.user_id for account in social_accounts]
+    friend_ids = SocialAccount.objects.filter(uid__in=facebook_friend_ids) \
+            .values('user_id')
     friends = User.objects.filter(id__in=friend_ids)
     return friends
 
@@ -49,7 +110,7 @@ def get_facebook_profile(access_token):
     """
     params = {'access_token': access_token}
     url = 'https://graph.facebook.com/v2.2/me?' + urlencode(params)
-    r = requests.get(url)
+    r = graph_get(url)
     if r.status_code != 200:
         raise ServiceUnavailable(r.content)
     # TODO: Handle bad data.
@@ -59,22 +120,216 @@ def get_facebook_profile(access_token):
     profile['access_token'] = access_token
     return profile
 
-def meteor_login(token):
+def get_valid_contacts(contacts):
     """
-    Authenticate the user on the meteor server.
+    Return the validated data for every valid contact, skipping the
+    invalid ones.
     """
-    url = '{meteor_url}/users'.format(meteor_url=settings.METEOR_URL)
-    data = json.dumps({
-        'user_id': token.user_id,
-        'password': token.key,
-    })
-    auth_header = 'Token {api_key}'.format(api_key=settings.METEOR_KEY)
-    headers = {
-        'Authorization': auth_header,
-        'Content-Type': 'application/json',
-    }
-    response = requests.post(url, data=data, headers=headers)
-    if response.status_code != 200:
-        error_msg = '{status} response from the meteor server'.format(
-                status=response.status_code)
-        raise ServiceUnavailable(error_msg)
+    serializer = ContactSerializer(data=contacts, many=True)
+    if serializer.is_valid():
+        return serializer.validated_data
+    if not isinstance(serializer.errors, list):
+        # The contacts weren't a list.
+        return []
+
+    # Only validate the valid contacts again.
+    contacts = [contact for contact, errors in zip(contacts,
+                                                   serializer.errors)
+                if not errors]
+    serializer = ContactSerializer(data=contacts, many=True)
+    serializer.is_valid()
+    return serializer.validated_data
+
+def sync_contacts(contacts):
+    """
+    Return a list of userphones for the validated contacts. Create users and
+    userphones for any contacts without userphones.
+    """
+    # Filter user phone numbers using the phone number data. If a phone
+    # number shows up more than once, use the last contact's name.
+    phone_names = OrderedDict()
+    for contact in contacts:
+        phone_names[unicode(contact['phone'])] = contact['name']
+    userphones = list(UserPhone.objects.filter(phone__in=phone_names.keys()) \
+            .select_related('user') \
+            .order_by('id'))
+
+    with transaction.atomic():
+        # Find any users who were added by phone number (their name is a
+        # phone number), or who don't have a name yet, and set their name
+        # to the contact name.
+        now = timezone.now()
+        renamed_users = []
+        renamed_ids = []
+        for userphone in userphones:
+            user = userphone.user
+            if user.name is not None and not user.name.startswith('+'):
+                continue
+            user.name = phone_names[unicode(userphone.phone)]
+            user.updated_at = now
+            renamed_users.append(user)
+        if len(renamed_users) > 0:
+            renamed_ids = [renamed_user.id for renamed_user in renamed_users]
+            User.objects.filter(id__in=renamed_ids) \
+                    .update(name=Case(*[
+                        When(id=renamed_user.id,
+                             then=Value(renamed_user.name))
+                        for renamed_user in renamed_users
+                    ], output_field=TextField()), updated_at=now)
+
+        # Create users and userphones for any contacts who don't have
+        # userphones yet.
+        existing_phones = {unicode(userphone.phone)
+                           for userphone in userphones}
+        new_phones = [phone for phone in phone_names
+                      if phone not in existing_phones]
+        if len(new_phones) > 0:
+            contacts_users = [User(name=phone_names[phone])
+                              for phone in new_phones]
+            bulk_create_returning(contacts_users)
+
+            contacts_userphones = [UserPhone(user=user, phone=phone)
+                                   for user, phone in zip(contacts_users,
+                                                          new_phones)]
+            bulk_create_returning(contacts_userphones)
+
+            # Merge the new contacts' userphones and the existing
+            # userphones.
+            userphones.extend(contacts_userphones)
+
+    # Invalidate the renamed users' responses after the transaction commits,
+    # so that other requests can't cache the old names under the new
+    # generation.
+    if len(renamed_ids) > 0:
+        invalidate_user_responses(renamed_ids)
+
+    return userphones
+
+def lock_contact_manifest(user):
+    """
+    Return the user's contact manifest locked for update, and create it if the
+    user doesn't have one yet. Call this inside a transaction.
+
+    Two first syncs can both miss the manifest. The one that loses the race to
+    create it locks the one the other sync created.
+    """
+    manifests = ContactManifest.objects.select_for_update()
+    try:
+        return manifests.get(user=user)
+    except ContactManifest.DoesNotExist:
+        pass
+
+    try:
+        with transaction.atomic():
+            return ContactManifest.objects.create(user=user)
+    except IntegrityError:
+        return manifests.get(user=user)
+
+def hash_phone(phone):
+    """
+    Return the hash that clients use to identify a phone number in their
+    contact manifest: the hex SHA-256 of the E.164 phone number.
+    """
+    return hashlib.sha256(unicode(phone).encode('utf-8')).hexdigest()
+
+def get_username_user_id(username):
+    """
+    Return a `(user_id, generation)` tuple for the user with the username,
+    regardless of case, or `(None, None)` if no user has the username. Cache
+    the user's id until their generation changes.
+    """
+    cache_key = 'username:{username}'.format(username=username.lower())
+    cached = cache.get(cache_key)
+    if cached is not None:
+        user_id, generation = cached
+        if user_id is None or get_user_generation(user_id) == generation:
+            return user_id, generation
+
+    user_ids = list(User.objects.filter(username__iexact=username) \
+            .values_list('id', flat=True))
+    if len(user_ids) == 0:
+        user_id, generation = None, None
+    else:
+        user_id = user_ids[0]
+        generation = get_user_generation(user_id)
+    cache.set(cache_key, (user_id, generation),
+              settings.USER_RESPONSE_CACHE_TIMEOUT)
+    return user_id, generation
+
+def add_points(user_id, points):
+    """
+    Give the user points. Increment the points in the database instead of
+    saving the user, since the user might be a stale copy from the token cache,
+    and saving it would undo any changes since it was cached.
+    """
+    User.objects.filter(id=user_id).update(points=F('points') + points)
+
+    # Updates don't send the `post_save` signal, so invalidate the user here.
+    invalidate_user_responses([user_id])
+    invalidate_user_token(user_id)
+
+def get_login_friends(request, user, friends):
+    """
+    Return the friends context for a login response. Clients that sync their
+    friends from the paginated friends endpoint can send `friends=version` to
+    get the version of the user's friends list instead of the full list.
+    """
+    if request.query_params.get('friends') == 'version':
+        return {'friends_version': get_user_generation(user.id)}
+    return {'friends': friends}
+
+def etag_matches(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+    etags = [tag.strip() for tag in if_none_match.split(',')]
+    return etag in etags or '*' in etags
+
+def cache_user_response(name):
+    """
+    Cache a view's successful responses for the current user, and return a 304
+    when the client already has the latest response.
+
+    The ETag and the cache key include the user's generation, which we bump
+    whenever the response could change, so a request for an unchanged response
+    only costs a single cache lookup. They also include a hash of the query
+    params, since those can change the response.
+
+    System accounts are friends with every user, so their responses can change
+    whenever any user changes. Don't cache them.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            if is_system_user(request.user):
+                return view(self, request, *args, **kwargs)
+
+            generation = get_user_generation(request.user.id)
+            query = urlencode(sorted(
+                    (key.encode('utf-8'), value.encode('utf-8'))
+                    for key, value in request.query_params.items()))
+            query_hash = hashlib.md5(query).hexdigest()[:12] if query else ''
+            etag = '"{name}:{query_hash}:{user_id}:{generation}"'.format(
+                    name=name, query_hash=query_hash, user_id=request.user.id,
+                    generation=generation)
+            if etag_matches(request, etag):
+                return Response(status=status.HTTP_304_NOT_MODIFIED,
+                                headers={'ETag': etag})
+
+            cache_key = 'user-response:' + etag.strip('"')
+            data = cache.get(cache_key)
+            if data is not None:
+                response = Response(data)
+            else:
+                response = view(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                # Pickling serializer data turns it into a plain dict or list,
+                # so copy it to keep the order of the fields.
+                if isinstance(response.data, dict):
+                    data = OrderedDict(response.data)
+                else:
+                    data = list(response.data)
+                cache.set(cache_key, data, settings.USER_RESPONSE_CACHE_TIMEOUT)
+            response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
@@ -1,42 +1,52 @@
 from __future__ import unicode_literals
 from datetime import datetime, timedelta
 import json
-import time
 from urllib import urlencode
 from django.conf import settings
 from django.contrib import auth
 from django.contrib.gis.measure import D
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.db.models import F, Q
 from django.shortcuts import render
 from django.utils import timezone
 from django.views.generic.base import RedirectView, TemplateView
-from hashids import Hashids
-import phonenumbers
 import requests
 from rest_framework import mixins, status, viewsets
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import detail_route, list_route
+from rest_framework.exceptions import ParseError
 from rest_framework.filters import DjangoFilterBackend
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from twilio import TwilioRestException
 from twilio.rest import TwilioRestClient
-from rallytap.apps.events.models import Event, SavedEvent
+from rallytap.apps.events.models import ArchivedSavedEvent, Event, SavedEvent
 from rallytap.apps.events.serializers import (
+    ArchivedSavedEventSerializer,
     EventSerializer,
     SavedEventFullEventSerializer,
 )
-from rallytap.apps.friends.models import Friendship
+from rallytap.apps.events.utils import (
+    get_interested_friends,
+    get_user_saved_events,
+)
+from rallytap.apps.friends.models import Friendship, RemovedFriend
+from rallytap.apps.friends.utils import get_friend_ids, get_friends
 from rallytap.apps.notifications.utils import send_message
 from rallytap.apps.utils.exceptions import ServiceUnavailable
-from rallytap.apps.utils.utils import add_members
-from .authentication import MeteorAuthentication
+from rallytap.apps.utils.meteor import add_members
+from rallytap.apps.utils.pagination import DateJoinedPagination, KeysetPagination
+from rallytap.apps.utils.profiling import (
+    profile_http,
+    profile_serialization,
+)
+from .authentication import CachedTokenAuthentication, MeteorAuthentication
 from .filters import UserFilter
+from .generations import bump_user_generations
 from .models import (
     AuthCode,
+    ContactManifestEntry,
     FellowshipApplication,
     LinfootFunnel,
     Points,
@@ -47,7 +57,7 @@ from .models import (
 from .permissions import IsCurrentUserOrReadOnly, IsMeteor, IsStaff
 from .serializers import (
     AuthCodeSerializer,
-    ContactSerializer,
+    ContactsDeltaSerializer,
     FacebookSessionSerializer,
     FellowshipApplicationSerializer,
     FriendSerializer,
@@ -63,7 +73,7 @@ from . import utils
 
 class UserViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin,
                   mixins.UpdateModelMixin, viewsets.GenericViewSet):
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     filter_backends = (DjangoFilterBackend,)
     filter_class = UserFilter
     permission_classes = (IsAuthenticated, IsCurrentUserOrReadOnly)
@@ -77,10 +87,54 @@ class UserViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin,
         return super(UserViewSet, self).list(request, *args, **kwargs)
 
     @list_route(methods=['get'])
+    @utils.cache_user_response('friends')
     def friends(self, request, pk=None):
-        # TODO: Handle when the user doesn't exist.
-        serializer = FriendSerializer(request.user.friends, many=True)
-        return Response(serializer.data)
+        """
+        Get a list of the user's friends. Clients can send a `limit` to page
+        through the friends, and an `updated_since` unix timestamp to only get
+        the friends who were added or who changed since then.
+
+        When clients send `updated_since`, return the friends as `results`,
+        along with the ids of the friends who the user removed since then as
+        `removed_ids`.
+        """
+        friends = get_friends(request.user)
+
+        removed_ids = None
+        updated_since = request.query_params.get('updated_since')
+        if updated_since:
+            try:
+                since = datetime.utcfromtimestamp(int(updated_since)) \
+                        .replace(tzinfo=timezone.utc)
+            except (ValueError, OverflowError):
+                raise ParseError('Invalid updated_since: {}'.format(
+                        updated_since))
+            updated_friend_ids = Friendship.objects.filter(
+                    user=request.user, updated_at__gte=since) \
+                    .values('friend_id')
+            friends = friends.filter(Q(updated_at__gte=since) |
+                                     Q(id__in=updated_friend_ids))
+            removed_ids = list(RemovedFriend.objects.filter(
+                    user=request.user, removed_at__gte=since) \
+                    .values_list('friend_id', flat=True))
+
+        paginator = DateJoinedPagination()
+        page = paginator.paginate_queryset(friends, request, view=self)
+        if page is not None:
+            serializer = FriendSerializer(page, many=True)
+            with profile_serialization():
+                data = serializer.data
+            response = paginator.get_paginated_response(data)
+            if removed_ids is not None:
+                response.data['removed_ids'] = removed_ids
+            return response
+
+        serializer = FriendSerializer(friends, many=True)
+        with profile_serialization():
+            data = serializer.data
+        if removed_ids is not None:
+            return Response({'results': data, 'removed_ids': removed_ids})
+        return Response(data)
 
     @list_route(methods=['get'], url_path='facebook-friends')
     def facebook_friends(self, request, pk=None):
@@ -97,6 +151,7 @@ class UserViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin,
         return Response(friends)
 
     @list_route(methods=['get'])
+    @utils.cache_user_response('me')
     def me(self, request):
         serializer = UserSerializer(request.user)
         return Response(serializer.data)
@@ -108,16 +163,14 @@ class UserViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin,
         whose friendship the user hasn't ackowledged yet - either by adding the
         user back, or deleting the added me notification.
         """
-        added_me = Friendship.objects.filter(friend=request.user)
-        added_me_ids = [friendship.user_id for friendship in added_me]
-        added = Friendship.objects.filter(user=request.user,
-                                          friend_id__in=added_me_ids)
-        added_ids = set(friendship.friend_id for friendship in added)
-        new_added_me = [friendship.user for friendship in added_me
-                        if friendship.user_id not in added_ids]
+        added_me = Friendship.objects.filter(friend=request.user, mutual=False) \
+                .select_related('user')
+        new_added_me = [friendship.user for friendship in added_me]
 
         serializer = FriendSerializer(new_added_me, many=True)
-        return Response(serializer.data)
+        with profile_serialization():
+            data = serializer.data
+        return Response(data)
 
     @list_route(methods=['get'], url_path='saved-events')
     def saved_events(self, request):
@@ -126,70 +179,51 @@ class UserViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin,
         if the event has a date, and by when the event was created if the event
         doesn't have a date.
         """
-        # Convert the queryset into a list to evaluate the queryset.
-        saved_events = list(SavedEvent.objects.filter(user=request.user) \
-                .select_related('event'))
-
-        # Sort the saved events from newest to oldest.
-        saved_events.sort(lambda a, b: 1
-                if ((a.event.datetime is None and b.event.datetime is None
-                     and a.event.created_at < b.event.created_at) or 
-                    (a.event.datetime is None and b.event.datetime is not None
-                     and a.event.created_at < b.event.datetime) or 
-                    (a.event.datetime is not None and b.event.datetime is None
-                     and a.event.datetime < b.event.created_at) or 
-                    (a.event.datetime is not None and b.event.datetime is not None
-                     and a.event.datetime < b.event.datetime))
-                else -1)
-
-        # Get the total number of users who are interested in each event the user
-        # has saved.
         # Convert the queryset to a list to evaluate it.
-        event_ids = set()
-        for saved_event in saved_events:
-            event_ids.add(saved_event.event_id)
-        all_saved_events = list(SavedEvent.objects.filter(event_id__in=event_ids))
-        total_num_interested = {
-            event_id: len([
-                saved_event for saved_event in all_saved_events
-                if saved_event.event_id == event_id
-            ])
-            for event_id in event_ids
-        }
+        saved_events = list(get_user_saved_events(request.user))
 
         # Get the user's friends who are interested in each event.
-        interested_friends = {}
-        all_friends_ids = set(Friendship.objects.filter(user=request.user) \
-                .values_list('friend_id', flat=True))
-        # Create a set of friend ids of every friend who is intersted in any of
-        # the user's saved events.
-        friends_ids = set()
-        for saved_event in all_saved_events:
-            if saved_event.user_id in all_friends_ids:
-                friends_ids.add(saved_event.user_id)
-        # Convert the queryset into a list to evaluate the queryset.
-        # TODO: Double check that this is necessary.
-        friends = list(User.objects.filter(id__in=friends_ids))
-        friends_dict = {friend.id: friend for friend in friends}
-        for saved_event in saved_events:
-            this_event_saved_events = [_saved_event
-                    for _saved_event in all_saved_events
-                    if _saved_event.event_id == saved_event.event_id
-                    and _saved_event.user_id in friends_ids]
-            this_event_interested_friends = [friends_dict[_saved_event.user_id]
-                    for _saved_event in this_event_saved_events
-                    if _saved_event.user_id != request.user.id]
-            interested_friends[saved_event.event_id] = this_event_interested_friends
-
-        context = {
-            'interested_friends': interested_friends,
-            'total_num_interested': total_num_interested,
-        }
+        event_ids = [saved_event.event_id for saved_event in saved_events]
+        friend_ids = get_friend_ids(request.user)
+        friends_saved_events = SavedEvent.objects.filter(user_id__in=friend_ids)
+        interested_friends = get_interested_friends(request.user, event_ids,
+                                                    friends_saved_events)
+
+        context = {'interested_friends': interested_friends}
         serializer = SavedEventFullEventSerializer(saved_events, many=True,
                                                    context=context)
-        return Response(serializer.data)
+        with profile_serialization():
+            data = serializer.data
+        return Response(data)
 
-    @detail_route(methods=['post'], permission_classes=(IsMeteor,))
+    @list_route(methods=['get'], url_path='archived-saved-events')
+    def archived_saved_events(self, request):
+        """
+        Return the user's saved events for events that we've archived, from
+        newest to oldest. Clients can send a `limit` to page through them.
+        """
+        archived_saved_events = ArchivedSavedEvent.objects \
+                .filter(user=request.user) \
+                .select_related('event', 'event__place') \
+                .order_by('-created_at', '-id')
+
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(archived_saved_events, request,
+                                           view=self)
+        if page is not None:
+            serializer = ArchivedSavedEventSerializer(page, many=True)
+            with profile_serialization():
+                data = serializer.data
+            return paginator.get_paginated_response(data)
+
+        serializer = ArchivedSavedEventSerializer(archived_saved_events,
+                                                  many=True)
+        with profile_serialization():
+            data = serializer.data
+        return Response(data)
+
+    @detail_route(methods=['post'], permission_classes=(IsMeteor,),
+                  authentication_classes=(MeteorAuthentication,))
     def invite(self, request, pk=None):
         user = self.get_object()
 
@@ -203,8 +237,7 @@ class UserViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin,
         send_message(user_ids, message)
 
         # Give the user points for inviting someone to an event.
-        user.points += Points.SENT_INVITATION
-        user.save()
+        utils.add_points(user.id, Points.SENT_INVITATION)
 
         return Response()
 
@@ -212,15 +245,20 @@ class UserViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin,
 class UserUsernameDetail(APIView):
 
     def get(self, request, username=None):
-        try:
-            User.objects.get(username__iexact=username)
-            return Response()
-        except User.DoesNotExist:
+        user_id, generation = utils.get_username_user_id(username)
+        if user_id is None:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
+        etag = '"username:{user_id}:{generation}"'.format(user_id=user_id,
+                                                          generation=generation)
+        if utils.etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers={'ETag': etag})
+        return Response(headers={'ETag': etag})
+
 
 class SocialAccountSync(APIView):
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def post(self, request):
@@ -256,6 +294,7 @@ class SocialAccountSync(APIView):
 
                 # Then update their userphone to point to that user
                 UserPhone.objects.filter(user=request.user).update(user=user)
+                bump_user_generations([user.id])
 
                 # Delete the current user.
                 request.user.delete()
@@ -271,7 +310,11 @@ class SocialAccountSync(APIView):
                 user.first_name = profile['first_name']
                 user.last_name = profile['last_name']
                 user.image_url = profile['image_url']
-                user.save()
+                # Only save the fields from Facebook, since the user might be
+                # a stale copy from the token cache.
+                user.save(update_fields=['email', 'name', 'first_name',
+                                         'last_name', 'image_url',
+                                         'updated_at'])
 
                 # Create the user's social account.
                 social_account = SocialAccount(user_id=request.user.id,
@@ -282,9 +325,9 @@ class SocialAccountSync(APIView):
         facebook_friends = utils.get_facebook_friends(social_account)
         data = {
             'facebook_friends': facebook_friends,
-            'friends': user.friends,
             'authtoken': token.key,
         }
+        data.update(utils.get_login_friends(request, user, get_friends(user)))
         serializer = UserSerializer(user, context=data)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -327,8 +370,9 @@ class AuthCodeViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
         client = TwilioRestClient(settings.TWILIO_ACCOUNT, settings.TWILIO_TOKEN)
         message = 'Your Rallytap code: {}'.format(auth_code)
         try:
-            client.messages.create(to=phone, from_=settings.TWILIO_PHONE,
-                                   body=message)
+            with profile_http('twilio'):
+                client.messages.create(to=phone, from_=settings.TWILIO_PHONE,
+                                       body=message)
         except TwilioRestException:
             raise ServiceUnavailable('Error calling the Twilio API')
     
@@ -364,13 +408,6 @@ class SessionViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
             userphone = UserPhone(user=user, phone=serializer.data['phone'])
             userphone.save()
 
-            # Make the user friends with Team Rallytap.
-            teamrallytap = User.objects.get(username='teamrallytap')
-            friendships = []
-            friendships.append(Friendship(user=user, friend=teamrallytap))
-            friendships.append(Friendship(user=teamrallytap, friend=user))
-            Friendship.objects.bulk_create(friendships)
-
         # Authenticate the user on the meteor server.
         utils.meteor_login(token)
 
@@ -378,7 +415,8 @@ class SessionViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
         if serializer.data['phone'] != '+15555555555':
             auth.delete()
 
-        data = {'authtoken': token.key, 'friends': user.friends}
+        data = {'authtoken': token.key}
+        data.update(utils.get_login_friends(request, user, get_friends(user)))
         serializer = UserSerializer(user, context=data)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -409,12 +447,13 @@ class SessionViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
         token, created = Token.objects.get_or_create(user=user)
         utils.meteor_login(token)
 
-        context = {'authtoken': token.key, 'friends': user.friends}
+        context = {'authtoken': token.key}
+        context.update(utils.get_login_friends(request, user, get_friends(user)))
         serializer = UserSerializer(user, context=context)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @list_route(methods=['get'], permission_classes=(IsAuthenticated, IsStaff),
-                authentication_classes=(TokenAuthentication,))
+                authentication_classes=(CachedTokenAuthentication,))
     def teamrallytap(self, request):
         user = User.objects.get(username='teamrallytap')
         token = Token.objects.get(user=user)
@@ -423,14 +462,15 @@ class SessionViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
         utils.meteor_login(token)
 
         # Only return friends with usernames to make the response smaller.
-        friends = user.friends.filter(username__isnull=False)
-        context = {'authtoken': token.key, 'friends': friends}
+        friends = get_friends(user).filter(username__isnull=False)
+        context = {'authtoken': token.key}
+        context.update(utils.get_login_friends(request, user, friends))
         serializer = UserSerializer(user, context=context)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 class UserPhoneViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     queryset = UserPhone.objects.all()
     serializer_class = UserPhoneSerializer
@@ -441,79 +481,61 @@ class UserPhoneViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
         Return a list of userphones with the given phone numbers. Create
         userphones for any contacts without userphones.
         """
-        # TODO: Handle when the data is invalid.
-        contacts = request.data['contacts']
-        serializer = ContactSerializer(data=contacts, many=True)
-        serializer.is_valid()
+        contacts = utils.get_valid_contacts(request.data.get('contacts', []))
+        userphones = utils.sync_contacts(contacts)
+        serializer = UserPhoneSerializer(userphones, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
-        # Filter user phone numbers using the phone number data.
-        phone_names = {contact['phone']: contact['name']
-                       for contact in serializer.data}
-        phones = phone_names.keys()
-        userphones = UserPhone.objects.filter(phone__in=phones)
-        userphones.prefetch_related('user')
-
-        # Find any users who were added by phone number (their name is a phone
-        # number), and set their name to the contact name.
-        for userphone in userphones:
-            user = userphone.user
-            if ((user.name is not None and not user.name.startswith('+'))
-                    or not phonenumbers.is_valid_number(userphone.phone)):
-                continue
-
-            phone = unicode(userphone.phone)
-            user.name = phone_names[phone]
-            user.save()
+    @list_route(methods=['post'], url_path='contacts-delta')
+    def contacts_delta(self, request):
+        """
+        Sync only the contacts that were added or removed since the version of
+        the user's contact manifest that the client last saw. A version of 0
+        replaces the whole manifest with the added contacts.
 
-        # Create userphones for any contacts who don't have userphones yet. First,
-        # we create users with the contacts' names. Then we create userphones for
-        # each user. `bulk_ref` is used to query for the objects we bulk created,
-        # since Django doesn't set ids on objects that were bulk created.
-        phones_set = {unicode(userphone.phone) for userphone in userphones}
-        userless_contacts = [contact for contact in contacts
-                             if contact['phone'] not in phones_set]
-        if len(userless_contacts) > 0:
-            # Create the `bulk_ref` for querying the objects we bulk create.
-            hashids = Hashids(salt=settings.HASHIDS_SALT)
-            timestamp = int(time.time())
-            bulk_ref = hashids.encode(request.user.id, timestamp)
-
-            # Create users for contacts without userphones.
-            contacts_users = [User(name=contact['name'], bulk_ref=bulk_ref)
-                              for contact in userless_contacts]
-            User.objects.bulk_create(contacts_users)
-            contacts_users = User.objects.filter(bulk_ref=bulk_ref)
-
-            # Make the users friends with Team Rallytap.
-            teamrallytap = User.objects.get(username='teamrallytap')
-            friendships = []
-            for user in contacts_users:
-                friendships.append(Friendship(user=user, friend=teamrallytap))
-                friendships.append(Friendship(user=teamrallytap, friend=user))
-            Friendship.objects.bulk_create(friendships)
-
-            # Create userphones for the users we created.
-            # contacts_dict == {'Andrew': ['+19251234567', '+19252234456'], ...}
-            contacts_dict = {}
-            for contact in userless_contacts:
-                name = contact['name']
-                contacts_dict[name] = contacts_dict.get(name, [])
-                contacts_dict[name].append(contact['phone'])
-            contacts_userphones = []
-            for user in contacts_users:
-                phone = contacts_dict[user.name].pop()
-                userphone = UserPhone(user=user, phone=phone, bulk_ref=bulk_ref)
-                contacts_userphones.append(userphone)
-            UserPhone.objects.bulk_create(contacts_userphones)
-            contacts_userphones = UserPhone.objects.filter(bulk_ref=bulk_ref)
-            contacts_userphones.prefetch_related('user')
-            
-            # Merge the new contacts' userphones and the existing userphones.
-            userphones = list(userphones)
-            userphones.extend(list(contacts_userphones))
+        Return the new manifest version, and the userphones for the added
+        contacts. Return a 409 with the current version if the client's
+        version is out of date.
+        """
+        serializer = ContactsDeltaSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        # Only parse the contacts that were added. Sync them before locking
+        # the manifest, so that the users' cached responses are invalidated
+        # after the renamed users are committed. Syncing is idempotent, so a
+        # conflict just means the client syncs them again.
+        contacts = utils.get_valid_contacts(data['added'])
+        userphones = utils.sync_contacts(contacts)
+
+        with transaction.atomic():
+            manifest = utils.lock_contact_manifest(request.user)
+            if data['version'] not in (0, manifest.version):
+                return Response({'version': manifest.version},
+                                status=status.HTTP_409_CONFLICT)
+
+            added_hashes = {utils.hash_phone(contact['phone'])
+                            for contact in contacts}
+            entries = manifest.entries.all()
+            if data['version'] == 0:
+                entries.delete()
+            elif len(data['removed']) > 0:
+                entries.filter(phone_hash__in=data['removed']).delete()
+            existing_hashes = set(entries.filter(phone_hash__in=added_hashes) \
+                    .values_list('phone_hash', flat=True))
+            ContactManifestEntry.objects.bulk_create([
+                ContactManifestEntry(manifest=manifest, phone_hash=phone_hash)
+                for phone_hash in added_hashes - existing_hashes
+            ])
+
+            manifest.version += 1
+            manifest.save()
 
         serializer = UserPhoneSerializer(userphones, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response({
+            'version': manifest.version,
+            'userphones': serializer.data,
+        }, status=status.HTTP_200_OK)
 
 
 class LinfootFunnelViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
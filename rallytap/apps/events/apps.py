@@ -0,0 +1,9 @@
+from __future__ import unicode_literals
+from django.apps import AppConfig
+
+class EventsConfig(AppConfig):
+    name = 'rallytap.apps.events'
+    verbose_name = 'Rallytap events'
+
+    def ready(self):
+        from . import signals
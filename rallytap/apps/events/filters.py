@@ -1,11 +1,9 @@
 from __future__ import unicode_literals
-from django.conf import settings
 from django.contrib.gis.measure import D
 from django.db.models import Q
 from django_filters import Filter, FilterSet
-from rest_framework.filters import BaseFilterBackend
 from rallytap.apps.utils.filters import UnixEpochDateFilter
-from .models import Event, Place
+from .models import Event, FeedEntry, Place, SavedEvent
 
 
 class EventFilter(FilterSet):
@@ -16,15 +14,32 @@ class EventFilter(FilterSet):
         fields = ['min_updated_at']
 
 
-class NearbyPlaceFilter(BaseFilterBackend):
+class ChangedSinceFilter(UnixEpochDateFilter):
     """
-    Only return events that are either nearby the current user, or don't have a
-    place.
+    Only return saved events that were created, or whose event was updated,
+    since the given unix timestamp.
     """
-    def filter_queryset(self, request, queryset, view):
-        center = request.user.location
-        radius = settings.NEARBY_RADIUS
-        nearby_circle = center.buffer(radius)
-        return queryset.select_related('place').filter(
-                Q(place__isnull=True) |
-                Q(place__geo__contained=nearby_circle))
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+
+        since = self.to_datetime(value)
+        return qs.filter(Q(created_at__gte=since) | Q(event__updated_at__gte=since))
+
+
+class SavedEventFilter(FilterSet):
+    since = ChangedSinceFilter()
+
+    class Meta:
+        model = SavedEvent
+        fields = ['since']
+
+
+class FeedEntryFilter(FilterSet):
+    since = ChangedSinceFilter()
+
+    class Meta:
+        model = FeedEntry
+        fields = ['since']
+
@@ -0,0 +1,25 @@
+from __future__ import unicode_literals
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rallytap.apps.events.utils import archive_events
+
+
+class Command(BaseCommand):
+    help = ('Moves expired events, and their saved events, to the archive '
+            'tables.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=settings.ARCHIVE_EVENTS_AFTER_DAYS,
+                            help=('Archive expired events that happened at '
+                                  'least this many days ago.'))
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.ARCHIVE_EVENTS_BATCH_SIZE,
+                            help='The number of events to archive at a time.')
+
+    def handle(self, *args, **options):
+        happened_before = timezone.now() - timedelta(days=options['days'])
+        num_archived = archive_events(happened_before, options['batch_size'])
+        self.stdout.write('Archived {count} events.'.format(count=num_archived))
@@ -0,0 +1,28 @@
+from __future__ import unicode_literals
+from django.core.management.base import BaseCommand
+from rallytap.apps.auth.models import User
+from rallytap.apps.events.utils import rebuild_feed
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the feed entries for every user with a location from the '
+            'saved events in their feed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='The number of users to load at a time.')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(location__isnull=False).order_by('id')
+        num_rebuilt = 0
+        last_id = 0
+        while True:
+            batch = list(users.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            for user in batch:
+                rebuild_feed(user)
+            num_rebuilt += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write('Rebuilt {count} feeds.'.format(count=num_rebuilt))
@@ -0,0 +1,42 @@
+from __future__ import unicode_literals
+from django.core.management.base import BaseCommand
+from rallytap.apps.auth.models import User
+from rallytap.apps.events.utils import get_feed_differences, rebuild_feed
+
+
+class Command(BaseCommand):
+    help = ('Compares users\' feed entries against the saved events in their '
+            'feed, and prints how many feeds don\'t match.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int,
+                            help='Only check this many random users.')
+        parser.add_argument('--fix', action='store_true', default=False,
+                            help='Rebuild the feeds that don\'t match.')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(location__isnull=False)
+        if options['sample'] is not None:
+            users = users.order_by('?')[:options['sample']]
+
+        num_checked = 0
+        num_mismatched = 0
+        num_missing = 0
+        num_extra = 0
+        for user in users.iterator():
+            num_checked += 1
+            missing, extra = get_feed_differences(user)
+            if not missing and not extra:
+                continue
+
+            num_mismatched += 1
+            num_missing += len(missing)
+            num_extra += len(extra)
+            if options['fix']:
+                rebuild_feed(user)
+
+        self.stdout.write(('Checked {checked} feeds. {mismatched} didn\'t '
+                           'match, with {missing} missing and {extra} extra '
+                           'saved events.').format(
+                checked=num_checked, mismatched=num_mismatched,
+                missing=num_missing, extra=num_extra))
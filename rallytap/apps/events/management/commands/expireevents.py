@@ -1,28 +1,21 @@
 from __future__ import unicode_literals
-from datetime import datetime, timedelta
-import json
+from datetime import timedelta
 from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.db.models import F, Q
-import pytz
-import requests
-from rallytap.apps.auth.models import Points, User
-from rallytap.apps.events.models import Event
-from rallytap.apps.utils.exceptions import ServiceUnavailable
+from django.utils import timezone
+from rallytap.apps.events.utils import expire_events
 
 
 class Command(BaseCommand):
-    help = 'Marks expired events as expired.'
+    help = ('Marks events that happened over 12 hours ago as expired, and '
+            'queues jobs to delete their chats on the meteor server.')
 
-    def handle(self, *args, **options):
-        twelve_hrs_ago = datetime.now(pytz.utc) - timedelta(hours=12)
-        event_ids = Event.objects.filter(
-                        Q(datetime__isnull=True,
-                          created_at__lte=twelve_hrs_ago) |
-                        Q(datetime__isnull=False,
-                          datetime__lte=twelve_hrs_ago),
-                        expired=False) \
-                .values_list('id', flat=True)
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.EXPIRE_EVENTS_BATCH_SIZE,
+                            help='The number of events to expire at a time.')
 
-        # Set the events to expired in the DB.
-        Event.objects.filter(id__in=event_ids).update(expired=True)
+    def handle(self, *args, **options):
+        twelve_hrs_ago = timezone.now() - timedelta(hours=12)
+        num_expired = expire_events(twelve_hrs_ago, options['batch_size'])
+        self.stdout.write('Expired {count} events.'.format(count=num_expired))
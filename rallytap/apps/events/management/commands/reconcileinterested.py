@@ -0,0 +1,23 @@
+from __future__ import unicode_literals
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F
+from rallytap.apps.events.models import Event, SavedEvent
+
+
+class Command(BaseCommand):
+    help = ('Fixes events whose interested count doesn\'t match their number of '
+            'saved events.')
+
+    def handle(self, *args, **options):
+        events = Event.objects.annotate(num_saved_events=Count('savedevent')) \
+                .exclude(num_interested=F('num_saved_events')) \
+                .values_list('id', flat=True)
+
+        # Recount each event's saved events when we update it, in case someone
+        # saved the event since we found it.
+        for event_id in events:
+            num_interested = SavedEvent.objects.filter(event_id=event_id).count()
+            Event.objects.filter(id=event_id) \
+                    .update(num_interested=num_interested)
+
+        self.stdout.write('Fixed {count} events.'.format(count=len(events)))
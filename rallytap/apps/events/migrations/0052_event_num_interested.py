@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0051_event_recommended_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='num_interested',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            sql=('UPDATE events_event SET num_interested = ('
+                 'SELECT COUNT(*) FROM events_savedevent '
+                 'WHERE events_savedevent.event_id = events_event.id)'),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from rallytap.apps.utils.operations import RunSQLOutsideTransaction
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0052_event_num_interested'),
+    ]
+
+    operations = [
+        # Index the expressions that the `near` lookup filters on. Build the
+        # indexes concurrently so that we don't block writes while they build.
+        RunSQLOutsideTransaction(
+            sql=('CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+                 'events_savedevent_location_geography '
+                 'ON events_savedevent '
+                 'USING GIST (geography(ST_FlipCoordinates(location)))'),
+            reverse_sql=('DROP INDEX CONCURRENTLY IF EXISTS '
+                         'events_savedevent_location_geography'),
+        ),
+        RunSQLOutsideTransaction(
+            sql=('CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+                 'events_place_geo_geography '
+                 'ON events_place '
+                 'USING GIST (geography(ST_FlipCoordinates(geo)))'),
+            reverse_sql=('DROP INDEX CONCURRENTLY IF EXISTS '
+                         'events_place_geo_geography'),
+        ),
+    ]
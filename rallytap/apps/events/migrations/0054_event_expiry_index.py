@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from rallytap.apps.utils.operations import RunSQLOutsideTransaction
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0053_geography_indexes'),
+    ]
+
+    operations = [
+        # Index when each unexpired event happened, so that expiring events
+        # doesn't scan the expired ones. Build the index concurrently so that
+        # we don't block writes to events while it builds.
+        RunSQLOutsideTransaction(
+            sql=('CREATE INDEX CONCURRENTLY events_event_unexpired_happened_at '
+                 'ON events_event ((COALESCE(datetime, created_at))) '
+                 'WHERE expired = false'),
+            reverse_sql=('DROP INDEX CONCURRENTLY '
+                         'events_event_unexpired_happened_at'),
+        ),
+    ]
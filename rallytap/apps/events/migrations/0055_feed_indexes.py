@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+from rallytap.apps.utils.operations import RunSQLOutsideTransaction
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0054_event_expiry_index'),
+    ]
+
+    operations = [
+        # Look up who saved an event, and which of the user's friends saved
+        # it, without visiting the saved events of other users. Saved events
+        # get written to constantly, so build the indexes concurrently.
+        RunSQLOutsideTransaction(
+            sql=('CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+                 'events_savedevent_event_id_user_id '
+                 'ON events_savedevent (event_id, user_id)'),
+            reverse_sql=('DROP INDEX CONCURRENTLY IF EXISTS '
+                         'events_savedevent_event_id_user_id'),
+        ),
+        # Read each user's saved events from newest to oldest without sorting
+        # them.
+        RunSQLOutsideTransaction(
+            sql=('CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+                 'events_savedevent_user_id_created_at '
+                 'ON events_savedevent (user_id, created_at, id)'),
+            reverse_sql=('DROP INDEX CONCURRENTLY IF EXISTS '
+                         'events_savedevent_user_id_created_at'),
+        ),
+        # The unique index on `(user_id, event_id)` and the index above on
+        # `(event_id, user_id)` cover lookups by either column.
+        migrations.AlterField(
+            model_name='savedevent',
+            name='event',
+            field=models.ForeignKey(to='events.Event', db_index=False),
+        ),
+        migrations.AlterField(
+            model_name='savedevent',
+            name='user',
+            field=models.ForeignKey(to=settings.AUTH_USER_MODEL, db_index=False),
+        ),
+    ]
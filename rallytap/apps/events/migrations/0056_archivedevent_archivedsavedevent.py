@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.contrib.gis.db.models.fields
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('events', '0055_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedEvent',
+            fields=[
+                ('id', models.IntegerField(serialize=False, primary_key=True)),
+                ('title', models.TextField()),
+                ('expired', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('datetime', models.DateTimeField(null=True, blank=True)),
+                ('friends_only', models.BooleanField(default=False)),
+                ('num_interested', models.IntegerField(default=0)),
+                ('creator', models.ForeignKey(related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('place', models.ForeignKey(related_name='+', blank=True, to='events.Place', null=True)),
+                ('recommended_event', models.ForeignKey(related_name='+', blank=True, to='events.RecommendedEvent', null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedSavedEvent',
+            fields=[
+                ('id', models.IntegerField(serialize=False, primary_key=True)),
+                ('location', django.contrib.gis.db.models.fields.PointField(srid=4326)),
+                ('created_at', models.DateTimeField()),
+                ('event', models.ForeignKey(to='events.ArchivedEvent')),
+                ('user', models.ForeignKey(related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='archivedsavedevent',
+            index_together=set([('user', 'created_at')]),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from rallytap.apps.utils.operations import RunSQLOutsideTransaction
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0057_feedentry'),
+    ]
+
+    operations = [
+        # Find the expired events that are old enough to archive. Build the
+        # index concurrently so that we don't block writes to events while it
+        # builds.
+        RunSQLOutsideTransaction(
+            sql=('CREATE INDEX CONCURRENTLY events_event_expired_happened_at '
+                 'ON events_event ((COALESCE(datetime, created_at))) '
+                 'WHERE expired = true'),
+            reverse_sql=('DROP INDEX CONCURRENTLY '
+                         'events_event_expired_happened_at'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from __future__ import unicode_literals
 from django.contrib.gis.db import models
+from django.db import transaction
 from rallytap.apps.auth.models import User
 
 
@@ -32,14 +33,19 @@ class Event(models.Model):
     friends_only = models.BooleanField(default=False)
     recommended_event = models.ForeignKey(RecommendedEvent, null=True,
                                           blank=True)
+    # The number of users who have saved the event. Kept up to date when saved
+    # events are created or deleted.
+    num_interested = models.IntegerField(default=0)
 
     def __unicode__(self):
         return unicode(self.title)
 
 
 class SavedEvent(models.Model):
-    user = models.ForeignKey(User)
-    event = models.ForeignKey(Event)
+    # The composite indexes that lead with these columns cover lookups by
+    # them, so they don't need their own indexes.
+    user = models.ForeignKey(User, db_index=False)
+    event = models.ForeignKey(Event, db_index=False)
     # where the user was when they saved the event
     location = models.PointField()
     # when the event was saved
@@ -50,3 +56,66 @@ class SavedEvent(models.Model):
 
     def __unicode__(self):
         return unicode(self.event.title)
+
+    def save(self, *args, **kwargs):
+        # Update the event's interested count in the same transaction as we
+        # save the saved event.
+        with transaction.atomic():
+            super(SavedEvent, self).save(*args, **kwargs)
+
+
+class ArchivedEvent(models.Model):
+    """
+    An expired event that we moved out of the events table, so that feed
+    queries don't have to skip over it. Keeps the event's id.
+    """
+    id = models.IntegerField(primary_key=True)
+    title = models.TextField()
+    creator = models.ForeignKey(User, related_name='+')
+    expired = models.BooleanField(default=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    datetime = models.DateTimeField(null=True, blank=True)
+    place = models.ForeignKey(Place, null=True, blank=True, related_name='+')
+    friends_only = models.BooleanField(default=False)
+    recommended_event = models.ForeignKey(RecommendedEvent, null=True,
+                                          blank=True, related_name='+')
+    num_interested = models.IntegerField(default=0)
+
+    def __unicode__(self):
+        return unicode(self.title)
+
+
+class ArchivedSavedEvent(models.Model):
+    """
+    A saved event for an archived event. Keeps the saved event's id.
+    """
+    id = models.IntegerField(primary_key=True)
+    user = models.ForeignKey(User, related_name='+')
+    event = models.ForeignKey(ArchivedEvent)
+    location = models.PointField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        index_together = ('user', 'created_at')
+
+    def __unicode__(self):
+        return unicode(self.event.title)
+
+
+class FeedEntry(models.Model):
+    """
+    A saved event in a user's feed, precomputed when the saved event was
+    created. Each user's feed has one entry per event, for the first saved
+    event. Only used when `FEED_FAN_OUT` is on.
+    """
+    # The unique index on `(user_id, event_id)` covers lookups by user.
+    user = models.ForeignKey(User, related_name='+', db_index=False)
+    event = models.ForeignKey(Event)
+    saved_event = models.ForeignKey(SavedEvent)
+    # When the saved event was created.
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'event')
+        index_together = ('user', 'created_at', 'id')
@@ -1,18 +1,24 @@
 from __future__ import unicode_literals
 from datetime import datetime, timedelta
-from django.conf import settings
 import requests
 import pytz
 from rest_framework import serializers
 from rest_framework_gis.serializers import GeoModelSerializer
 from rallytap.apps.auth.models import User
 from rallytap.apps.auth.serializers import FriendSerializer
-from rallytap.apps.friends.models import Friendship
+from rallytap.apps.friends.utils import get_added_me
 from rallytap.apps.notifications.utils import send_message
 from rallytap.apps.utils.exceptions import ServiceUnavailable
 from rallytap.apps.utils.serializers import PkOnlyPrimaryKeyRelatedField
-from rallytap.apps.utils.utils import add_members
-from .models import Event, Place, RecommendedEvent, SavedEvent
+from rallytap.apps.utils.meteor import add_members
+from .models import (
+    ArchivedEvent,
+    ArchivedSavedEvent,
+    Event,
+    Place,
+    RecommendedEvent,
+    SavedEvent,
+)
 
 
 class PlaceSerializer(GeoModelSerializer):
@@ -26,6 +32,7 @@ class EventSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Event
+        exclude = ('num_interested',)
         read_only_fields = ('created_at', 'updated_at')
 
     def create(self, validated_data):
@@ -56,31 +63,25 @@ class EventSerializer(serializers.ModelSerializer):
         one_hour_ago = now - timedelta(hours=1)
         if (user.last_post_notification is None
                 or user.last_post_notification < one_hour_ago):
-            # Notify nearby users who have added the user as a friend.
-            center = user.location
-            radius = settings.NEARBY_RADIUS
-            nearby_circle = center.buffer(radius)
-            friend_ids = Friendship.objects.filter(
-                    friend=user, user__location__contained=nearby_circle) \
-                    .values_list('user_id', flat=True)
-            if event.friends_only:
-                added_ids = set(Friendship.objects.filter(user=user) \
-                        .values_list('friend_id', flat=True))
-                friend_ids = [friend_id for friend_id in friend_ids
-                        if friend_id in added_ids]
+            # Notify nearby users who have added the user as a friend. Only
+            # notify mutual friends about friends only events.
+            friend_ids = get_added_me(user, mutual=event.friends_only) \
+                    .filter(location__near=user.location) \
+                    .values_list('id', flat=True)
             message = 'Your friend posted "{title}". Are you interested?'.format(
                     name=user.name, title=event.title)
             send_message(friend_ids, message)
 
             # Save the current time as when the user last sent a post push
-            # notification.
+            # notification. Only save that field, since the user might be a
+            # stale copy from the token cache.
             user.last_post_notification = now
-            user.save()
+            user.save(update_fields=['last_post_notification'])
 
         # Add the creator to the meteor server members list.
         try:
             add_members(event, event.creator_id)
-        except requests.exceptions.HTTPError:
+        except requests.exceptions.RequestException:
             raise ServiceUnavailable()
 
         return event
@@ -120,7 +121,25 @@ class SavedEventFullEventSerializer(GeoModelSerializer):
 
     def get_total_num_interested(self, obj):
         total_num_interested = self.context.get('total_num_interested', {})
-        return total_num_interested.get(obj.event_id)
+        if total_num_interested.has_key(obj.event_id):
+            return total_num_interested[obj.event_id]
+        return obj.event.num_interested
+
+
+class ArchivedEventSerializer(serializers.ModelSerializer):
+    place = PlaceSerializer(read_only=True)
+
+    class Meta:
+        model = ArchivedEvent
+        exclude = ('num_interested',)
+
+
+class ArchivedSavedEventSerializer(serializers.ModelSerializer):
+    event = ArchivedEventSerializer(read_only=True)
+
+    class Meta:
+        model = ArchivedSavedEvent
+        exclude = ('location',)
 
 
 class CommentSerializer(serializers.Serializer):
@@ -0,0 +1,80 @@
+from __future__ import unicode_literals
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Event, Place, RecommendedEvent, SavedEvent
+from rallytap.apps.friends.models import Friendship
+from rallytap.apps.jobs.utils import enqueue
+from .utils import invalidate_recommended_events
+
+
+@receiver(post_save, sender=SavedEvent)
+def increment_num_interested(sender, instance, created, **kwargs):
+    if not created:
+        return
+
+    Event.objects.filter(id=instance.event_id) \
+            .update(num_interested=F('num_interested') + 1)
+
+
+@receiver(post_delete, sender=SavedEvent)
+def decrement_num_interested(sender, instance, **kwargs):
+    Event.objects.filter(id=instance.event_id) \
+            .update(num_interested=F('num_interested') - 1)
+
+
+@receiver(post_save, sender=SavedEvent)
+def fan_out_saved_event(sender, instance, created, **kwargs):
+    if not created or not settings.FEED_FAN_OUT:
+        return
+
+    enqueue('rallytap.apps.events.utils.fan_out_saved_event',
+            saved_event_id=instance.id)
+
+
+@receiver(post_delete, sender=SavedEvent)
+def fan_out_event(sender, instance, **kwargs):
+    if not settings.FEED_FAN_OUT:
+        return
+
+    # The deleted saved event's feed entries are gone, so fan out the event's
+    # other saved events to replace them.
+    enqueue('rallytap.apps.events.utils.fan_out_event',
+            event_id=instance.event_id)
+
+
+@receiver(post_save, sender=Friendship)
+def fan_out_friend(sender, instance, created, **kwargs):
+    if not created or not settings.FEED_FAN_OUT:
+        return
+
+    enqueue('rallytap.apps.events.utils.fan_out_friend',
+            user_id=instance.user_id, friend_id=instance.friend_id)
+
+
+@receiver(post_delete, sender=Friendship)
+def remove_friend_from_feed(sender, instance, **kwargs):
+    if not settings.FEED_FAN_OUT:
+        return
+
+    enqueue('rallytap.apps.events.utils.remove_friend_from_feed',
+            user_id=instance.user_id, friend_id=instance.friend_id)
+
+
+@receiver(post_save, sender=RecommendedEvent)
+@receiver(post_delete, sender=RecommendedEvent)
+def invalidate_recommended_events_cache(sender, **kwargs):
+    invalidate_recommended_events()
+
+
+@receiver(post_save, sender=Place)
+def invalidate_recommended_event_place(sender, instance, created, **kwargs):
+    # Users' events have places, too, so only invalidate the cache when a
+    # recommended event is at the place. Deleting a place deletes its
+    # recommended events, which invalidates the cache.
+    if created:
+        return
+
+    if RecommendedEvent.objects.filter(place=instance).exists():
+        invalidate_recommended_events()
@@ -1,13 +1,25 @@
 from __future__ import unicode_literals
 from datetime import datetime, timedelta
 import json
+from StringIO import StringIO
 from django.conf import settings
 from django.core.management import call_command
 from django.test import TestCase
 from django.utils import timezone
+import mock
 import pytz
 from rallytap.apps.auth.models import Points, User
-from rallytap.apps.events.models import Event
+from rallytap.apps.events.models import (
+    ArchivedEvent,
+    ArchivedSavedEvent,
+    Event,
+    FeedEntry,
+    SavedEvent,
+)
+from rallytap.apps.events.utils import fan_out_saved_event
+from rallytap.apps.friends.models import Friendship
+from rallytap.apps.jobs.models import Job
+from rallytap.apps.jobs.utils import claim_job, run_job
 from rallytap.apps.utils.exceptions import ServiceUnavailable
 
 
@@ -19,25 +31,231 @@ class ExpireEventsTests(TestCase):
         self.event = Event(creator=self.user, title='drop it like it\'s hot')
         self.event.save()
 
+    def get_expire_chats_jobs(self):
+        return Job.objects \
+                .filter(task='rallytap.apps.utils.meteor.expire_chats') \
+                .order_by('id')
+
     def test_expired_no_datetime(self):
         # Mock an expired event without a datetime (by default, events expire after
         # 12 hours).
         self.event.created_at = datetime.now(pytz.utc) - timedelta(hours=12)
         self.event.save()
 
-        call_command('expireevents')
+        call_command('expireevents', stdout=StringIO())
 
         # It should update the event.
         event = Event.objects.get(id=self.event.id)
         self.assertEqual(event.expired, True)
 
+        # It should queue a job to delete the event's chat on the meteor
+        # server.
+        jobs = self.get_expire_chats_jobs()
+        self.assertEqual([job.kwargs for job in jobs],
+                         [{'event_ids': [self.event.id]}])
+
     def test_expired_has_datetime(self):
         # Mock an expired event with a datetime.
         self.event.datetime = datetime.now(pytz.utc) - timedelta(hours=12)
         self.event.save()
 
-        call_command('expireevents')
+        call_command('expireevents', stdout=StringIO())
 
         # It should update the event.
         event = Event.objects.get(id=self.event.id)
         self.assertEqual(event.expired, True)
+
+    def test_not_expired(self):
+        # Mock an event that was created a while ago, but hasn't happened yet.
+        self.event.created_at = datetime.now(pytz.utc) - timedelta(days=1)
+        self.event.datetime = datetime.now(pytz.utc) + timedelta(hours=1)
+        self.event.save()
+
+        call_command('expireevents', stdout=StringIO())
+
+        # It shouldn't update the event.
+        event = Event.objects.get(id=self.event.id)
+        self.assertEqual(event.expired, False)
+        self.assertEqual(self.get_expire_chats_jobs().count(), 0)
+
+    def test_expired_batches(self):
+        # Mock two expired events.
+        twelve_hrs_ago = datetime.now(pytz.utc) - timedelta(hours=12)
+        self.event.datetime = twelve_hrs_ago
+        self.event.save()
+        event = Event(creator=self.user, title='gin and juice',
+                      datetime=twelve_hrs_ago)
+        event.save()
+
+        call_command('expireevents', batch_size=1, stdout=StringIO())
+
+        # It should expire the events one batch at a time.
+        self.assertEqual(Event.objects.filter(expired=False).count(), 0)
+        expired_ids = [job.kwargs['event_ids']
+                       for job in self.get_expire_chats_jobs()]
+        self.assertEqual(sorted(expired_ids),
+                         [[self.event.id], [event.id]])
+
+    def test_meteor_error(self):
+        # Mock an expired event.
+        self.event.datetime = datetime.now(pytz.utc) - timedelta(hours=12)
+        self.event.save()
+
+        call_command('expireevents', stdout=StringIO())
+
+        # Mock the meteor server being down when the job runs.
+        with mock.patch('rallytap.apps.utils.meteor.expire_chats') \
+                as mock_expire_chats:
+            mock_expire_chats.side_effect = ServiceUnavailable()
+            self.assertFalse(run_job(claim_job()))
+
+        # It should still expire the event, and retry the job later.
+        event = Event.objects.get(id=self.event.id)
+        self.assertEqual(event.expired, True)
+        job = self.get_expire_chats_jobs().get()
+        self.assertEqual(job.status, Job.PENDING)
+
+
+class ArchiveEventsTests(TestCase):
+
+    def setUp(self):
+        self.user = User(location='POINT(40.6898319 -73.9904645)')
+        self.user.save()
+
+        # Mock an event that expired a long time ago, and that the user saved.
+        a_year_ago = timezone.now() - timedelta(days=365)
+        self.event = Event(creator=self.user, title='drop it like it\'s hot',
+                           datetime=a_year_ago, expired=True)
+        self.event.save()
+        self.saved_event = SavedEvent(user=self.user, event=self.event,
+                                      location=self.user.location)
+        self.saved_event.save()
+
+    def test_archive(self):
+        call_command('archiveevents', stdout=StringIO())
+
+        # It should move the event and the saved event to the archive tables,
+        # and keep their ids.
+        self.assertFalse(Event.objects.filter(id=self.event.id).exists())
+        self.assertFalse(SavedEvent.objects.filter(
+                id=self.saved_event.id).exists())
+        archived_event = ArchivedEvent.objects.get(id=self.event.id)
+        self.assertEqual(archived_event.title, self.event.title)
+        self.assertEqual(archived_event.datetime, self.event.datetime)
+        archived_saved_event = ArchivedSavedEvent.objects.get(
+                id=self.saved_event.id)
+        self.assertEqual(archived_saved_event.event_id, self.event.id)
+        self.assertEqual(archived_saved_event.user_id, self.user.id)
+
+    def test_archive_batches(self):
+        # Mock another event that expired a long time ago.
+        event = Event(creator=self.user, title='gin and juice',
+                      datetime=self.event.datetime, expired=True)
+        event.save()
+
+        call_command('archiveevents', batch_size=1, stdout=StringIO())
+
+        # It should archive both events.
+        self.assertEqual(ArchivedEvent.objects.count(), 2)
+        self.assertEqual(Event.objects.count(), 0)
+
+    def test_archive_feed_entries(self):
+        # Mock the saved event being in the user's feed.
+        feed_entry = FeedEntry(user=self.user, event=self.event,
+                               saved_event=self.saved_event,
+                               created_at=self.saved_event.created_at)
+        feed_entry.save()
+
+        call_command('archiveevents', stdout=StringIO())
+
+        # It should delete the event's feed entries.
+        self.assertEqual(ArchivedEvent.objects.count(), 1)
+        self.assertEqual(FeedEntry.objects.count(), 0)
+
+    def test_not_archived(self):
+        # Mock an event that expired recently, and an event that hasn't
+        # expired yet, even though it happened a long time ago.
+        recent_event = Event(creator=self.user, title='gin and juice',
+                             datetime=timezone.now() - timedelta(days=1),
+                             expired=True)
+        recent_event.save()
+        Event.objects.filter(id=self.event.id).update(expired=False)
+
+        call_command('archiveevents', stdout=StringIO())
+
+        # It shouldn't archive either event.
+        self.assertEqual(ArchivedEvent.objects.count(), 0)
+        self.assertEqual(Event.objects.count(), 2)
+
+
+class ReconcileInterestedTests(TestCase):
+
+    def setUp(self):
+        self.user = User(location='POINT(40.6898319 -73.9904645)')
+        self.user.save()
+        self.event = Event(creator=self.user, title='drop it like it\'s hot')
+        self.event.save()
+        self.saved_event = SavedEvent(user=self.user, event=self.event,
+                                      location=self.user.location)
+        self.saved_event.save()
+
+    def test_fix_drifted_count(self):
+        # Mock the event's interested count drifting.
+        Event.objects.filter(id=self.event.id).update(num_interested=5)
+
+        call_command('reconcileinterested')
+
+        # It should reset the count to the number of saved events.
+        event = Event.objects.get(id=self.event.id)
+        self.assertEqual(event.num_interested, 1)
+
+
+class FeedCommandTests(TestCase):
+
+    def setUp(self):
+        self.user = User(location='POINT(40.6898319 -73.9904645)')
+        self.user.save()
+
+        # Mock a nearby friend who added the user.
+        self.friend = User(location=self.user.location)
+        self.friend.save()
+        friendship = Friendship(user=self.friend, friend=self.user)
+        friendship.save()
+
+        # Mock an event that the user saved.
+        self.event = Event(creator=self.user, title='drop it like it\'s hot')
+        self.event.save()
+        self.saved_event = SavedEvent(user=self.user, event=self.event,
+                                      location=self.user.location)
+        self.saved_event.save()
+
+    def test_backfill(self):
+        call_command('backfillfeed', batch_size=1, stdout=StringIO())
+
+        # It should add the saved event to both users' feeds.
+        entries = FeedEntry.objects.filter(saved_event=self.saved_event)
+        self.assertEqual(set(entries.values_list('user_id', flat=True)),
+                         {self.user.id, self.friend.id})
+
+    def test_check(self):
+        fan_out_saved_event(self.saved_event.id)
+
+        stdout = StringIO()
+        call_command('checkfeed', stdout=stdout)
+
+        # It should find that every feed matches.
+        self.assertIn('0 didn\'t match', stdout.getvalue())
+
+    def test_check_fix(self):
+        # Mock the friend's feed entry going missing.
+        fan_out_saved_event(self.saved_event.id)
+        FeedEntry.objects.filter(user=self.friend).delete()
+
+        stdout = StringIO()
+        call_command('checkfeed', fix=True, stdout=stdout)
+
+        # It should report the missing saved event and rebuild the feed.
+        self.assertIn('1 didn\'t match, with 1 missing and 0 extra',
+                      stdout.getvalue())
+        self.assertTrue(FeedEntry.objects.filter(
+                user=self.friend, saved_event=self.saved_event).exists())
@@ -0,0 +1,124 @@
+from __future__ import unicode_literals
+import re
+from django.db import connection
+from django.test import TestCase
+from rallytap.apps.auth.models import User
+from rallytap.apps.events.models import Event, SavedEvent
+from rallytap.apps.events.utils import (
+    get_feed,
+    get_other_saved_events,
+    get_user_saved_events,
+)
+from rallytap.apps.friends.models import Friendship
+
+
+class SavedEventTests(TestCase):
+
+    def setUp(self):
+        self.user = User(location='POINT(40.6898319 -73.9904645)')
+        self.user.save()
+        self.event = Event(creator=self.user, title='bars?!?!?!')
+        self.event.save()
+
+    def test_save_increments_num_interested(self):
+        saved_event = SavedEvent(user=self.user, event=self.event,
+                                 location=self.user.location)
+        saved_event.save()
+
+        # It should increment the event's interested count.
+        event = Event.objects.get(id=self.event.id)
+        self.assertEqual(event.num_interested, 1)
+
+        # Saving the saved event again shouldn't change the count.
+        saved_event.save()
+        event = Event.objects.get(id=self.event.id)
+        self.assertEqual(event.num_interested, 1)
+
+    def test_delete_decrements_num_interested(self):
+        saved_event = SavedEvent(user=self.user, event=self.event,
+                                 location=self.user.location)
+        saved_event.save()
+
+        saved_event.delete()
+
+        # It should decrement the event's interested count.
+        event = Event.objects.get(id=self.event.id)
+        self.assertEqual(event.num_interested, 0)
+
+    def test_queryset_delete_decrements_num_interested(self):
+        friend = User(location=self.user.location)
+        friend.save()
+        for user in [self.user, friend]:
+            saved_event = SavedEvent(user=user, event=self.event,
+                                     location=self.user.location)
+            saved_event.save()
+
+        SavedEvent.objects.filter(event=self.event).delete()
+
+        # It should decrement the event's interested count once per saved event.
+        event = Event.objects.get(id=self.event.id)
+        self.assertEqual(event.num_interested, 0)
+
+
+class IndexTests(TestCase):
+    """
+    Check that the queries behind the feed, the user's saved events, and an
+    event's interested users use indexes instead of scanning saved events.
+    """
+
+    def setUp(self):
+        self.user = User(location='POINT(40.6898319 -73.9904645)')
+        self.user.save()
+        self.friend = User(location='POINT(40.6898319 -73.9904645)')
+        self.friend.save()
+        friendship = Friendship(user=self.user, friend=self.friend)
+        friendship.save()
+
+        # Mock some expired events, and an event that hasn't expired yet.
+        for i in xrange(20):
+            event = Event(creator=self.friend, title='old news', expired=True)
+            event.save()
+            saved_event = SavedEvent(user=self.friend, event=event,
+                                     location=self.friend.location)
+            saved_event.save()
+        self.event = Event(creator=self.user, title='bars?!?!?!')
+        self.event.save()
+        for user in (self.user, self.friend):
+            saved_event = SavedEvent(user=user, event=self.event,
+                                     location=user.location)
+            saved_event.save()
+
+        # Give the planner statistics for the mocked rows.
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE events_event')
+            cursor.execute('ANALYZE events_savedevent')
+
+    def explain(self, queryset):
+        # The tables are small, so make the planner avoid sequential scans
+        # when it can.
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + sql, params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, queryset, index):
+        plan = self.explain(queryset)
+        if not re.search(r'\b{index}\b'.format(index=index), plan):
+            self.fail('{index} not used:\n{plan}'.format(index=index, plan=plan))
+
+    def assertNoSeqScan(self, queryset, table):
+        plan = self.explain(queryset)
+        if re.search(r'Seq Scan on {table}\b'.format(table=table), plan):
+            self.fail('{table} scanned:\n{plan}'.format(table=table, plan=plan))
+
+    def test_feed(self):
+        self.assertNoSeqScan(get_feed(self.user), 'events_savedevent')
+
+    def test_user_saved_events(self):
+        self.assertNoSeqScan(get_user_saved_events(self.friend),
+                             'events_savedevent')
+
+    def test_interested(self):
+        queryset = get_other_saved_events(self.event.id, self.user)
+        self.assertUsesIndex(queryset, 'events_savedevent_event_id_user_id')
@@ -0,0 +1,177 @@
+from __future__ import unicode_literals
+from django.contrib.gis.geos import Point
+from django.test import TestCase
+from django.test.utils import override_settings
+from rallytap.apps.auth.models import User
+from rallytap.apps.events.models import Event, FeedEntry, SavedEvent
+from rallytap.apps.events.utils import (
+    fan_out_event,
+    fan_out_saved_event,
+    get_feed_differences,
+    remove_friend_from_feed,
+)
+from rallytap.apps.friends.models import Friendship
+from rallytap.apps.jobs.utils import claim_job, run_job
+
+
+class FanOutTests(TestCase):
+
+    def setUp(self):
+        # Mock the user.
+        self.location = Point(40.6898319, -73.9904645)
+        self.user = User(name='Alan Tdog Turing', location=self.location)
+        self.user.save()
+
+        # Mock a nearby friend who added the user.
+        self.friend = User(name='Joan Clarke', location=self.location)
+        self.friend.save()
+        self.friendship = Friendship(user=self.friend, friend=self.user)
+        self.friendship.save()
+
+        # Mock a far away friend who added the user.
+        self.far_friend = User(name='Tommy Flowers',
+                               location=Point(40.8560079, -73.970945))
+        self.far_friend.save()
+        friendship = Friendship(user=self.far_friend, friend=self.user)
+        friendship.save()
+
+        # Mock an event that the user saved.
+        self.event = Event(title='bombe party', creator=self.user)
+        self.event.save()
+        self.saved_event = SavedEvent(user=self.user, event=self.event,
+                                      location=self.location)
+        self.saved_event.save()
+
+    def run_jobs(self):
+        job = claim_job()
+        while job is not None:
+            run_job(job)
+            job = claim_job()
+
+    def get_feed_user_ids(self):
+        entries = FeedEntry.objects.filter(saved_event=self.saved_event)
+        return set(entries.values_list('user_id', flat=True))
+
+    def test_fan_out(self):
+        fan_out_saved_event(self.saved_event.id)
+
+        # It should add the saved event to the feeds of the user and their
+        # nearby friend.
+        self.assertEqual(self.get_feed_user_ids(),
+                         {self.user.id, self.friend.id})
+
+        # The feeds should match the read time feeds.
+        for user in (self.user, self.friend, self.far_friend):
+            self.assertEqual(get_feed_differences(user), (set(), set()))
+
+    def test_fan_out_friends_only(self):
+        # Mock a friends only event that the nearby friend created.
+        event = Event(title='secret meeting', creator=self.friend,
+                      friends_only=True)
+        event.save()
+
+        # Mock the user saving the friends only event.
+        saved_event = SavedEvent(user=self.user, event=event,
+                                 location=self.location)
+        saved_event.save()
+
+        fan_out_saved_event(saved_event.id)
+
+        # It should only add the saved event to the creator's feed.
+        entries = FeedEntry.objects.filter(saved_event=saved_event)
+        self.assertEqual(list(entries.values_list('user_id', flat=True)),
+                         [self.friend.id])
+
+    def test_fan_out_keeps_first_saved_event(self):
+        fan_out_saved_event(self.saved_event.id)
+
+        # Mock the nearby friend saving the event later.
+        saved_event = SavedEvent(user=self.friend, event=self.event,
+                                 location=self.location)
+        saved_event.save()
+        fan_out_saved_event(saved_event.id)
+
+        # It should keep the first saved event in the feeds that already had
+        # the event.
+        entry = FeedEntry.objects.get(user=self.friend, event=self.event)
+        self.assertEqual(entry.saved_event_id, self.saved_event.id)
+
+    def test_fan_out_same_created_at(self):
+        # Mock the nearby friend saving the event at the same time.
+        saved_event = SavedEvent(user=self.friend, event=self.event,
+                                 location=self.location)
+        saved_event.save()
+        SavedEvent.objects.filter(id=saved_event.id).update(
+                created_at=self.saved_event.created_at)
+
+        # Fan out the saved events out of order.
+        fan_out_saved_event(saved_event.id)
+        fan_out_saved_event(self.saved_event.id)
+
+        # It should keep the saved event with the lower id, like the read time
+        # feed.
+        entry = FeedEntry.objects.get(user=self.friend, event=self.event)
+        self.assertEqual(entry.saved_event_id, self.saved_event.id)
+        self.assertEqual(get_feed_differences(self.friend), (set(), set()))
+
+    def test_fan_out_deleted_saved_event(self):
+        fan_out_saved_event(self.saved_event.id)
+
+        # Mock the nearby friend saving the event, too.
+        saved_event = SavedEvent(user=self.friend, event=self.event,
+                                 location=self.location)
+        saved_event.save()
+
+        # Mock the user unsaving the event.
+        self.saved_event.delete()
+        fan_out_saved_event(self.saved_event.id)
+        fan_out_event(self.event.id)
+
+        # It should replace the deleted saved event with the friend's saved
+        # event.
+        entry = FeedEntry.objects.get(user=self.friend, event=self.event)
+        self.assertEqual(entry.saved_event_id, saved_event.id)
+
+    @override_settings(FEED_FAN_OUT=True)
+    def test_friendship_removed_and_added(self):
+        fan_out_saved_event(self.saved_event.id)
+
+        # Mock the nearby friend removing the user.
+        self.friendship.delete()
+        self.run_jobs()
+
+        # It should remove the user's saved event from the friend's feed.
+        self.assertEqual(self.get_feed_user_ids(), {self.user.id})
+        self.assertEqual(get_feed_differences(self.friend), (set(), set()))
+
+        # Mock the nearby friend adding the user back.
+        friendship = Friendship(user=self.friend, friend=self.user)
+        friendship.save()
+        self.run_jobs()
+
+        # It should add the user's saved event back to the friend's feed.
+        self.assertEqual(self.get_feed_user_ids(),
+                         {self.user.id, self.friend.id})
+        self.assertEqual(get_feed_differences(self.friend), (set(), set()))
+
+    def test_remove_friend_replaces_saved_event(self):
+        fan_out_saved_event(self.saved_event.id)
+
+        # Mock another friend of the nearby friend saving the event later.
+        other_friend = User(name='Gordon Welchman', location=self.location)
+        other_friend.save()
+        friendship = Friendship(user=self.friend, friend=other_friend)
+        friendship.save()
+        saved_event = SavedEvent(user=other_friend, event=self.event,
+                                 location=self.location)
+        saved_event.save()
+        fan_out_saved_event(saved_event.id)
+
+        # Mock the nearby friend removing the user.
+        self.friendship.delete()
+        remove_friend_from_feed(self.friend.id, self.user.id)
+
+        # It should replace the user's saved event with the other friend's.
+        entry = FeedEntry.objects.get(user=self.friend, event=self.event)
+        self.assertEqual(entry.saved_event_id, saved_event.id)
+        self.assertEqual(get_feed_differences(self.friend), (set(), set()))
@@ -1,11 +1,15 @@
 from __future__ import unicode_literals
+import calendar
 from datetime import datetime, timedelta
 import json
 import time
 from django.utils import timezone
 from django.conf import settings
 from django.contrib.gis.geos import Point
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
 from hashids import Hashids
 import httpretty
 import mock
@@ -16,6 +20,7 @@ from rest_framework.authtoken.models import Token
 from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from twilio import TwilioRestException
+from rallytap.apps.auth.authentication import CachedTokenAuthentication
 from rallytap.apps.auth.models import Points, User, UserPhone
 from rallytap.apps.auth.serializers import FriendSerializer
 from rallytap.apps.events.models import Event, Place, RecommendedEvent, SavedEvent
@@ -25,7 +30,9 @@ from rallytap.apps.events.serializers import (
     SavedEventSerializer,
     SavedEventFullEventSerializer,
 )
+from rallytap.apps.events.utils import fan_out_saved_event
 from rallytap.apps.friends.models import Friendship
+from rallytap.apps.jobs.models import Job
 
 
 class EventTests(APITestCase):
@@ -262,17 +269,8 @@ class EventTests(APITestCase):
 
     @mock.patch('rallytap.apps.events.views.send_message')
     def test_comment(self, mock_send_message):
-        # Use the meteor server's auth token.
-        try:
-            meteor_user = User.objects.get(id=settings.METEOR_USER_ID)
-            token = Token.objects.get(user=meteor_user)
-        except User.DoesNotExist:
-            dt = timezone.now()
-            meteor_user = User(id=settings.METEOR_USER_ID, date_joined=dt)
-            meteor_user.save()
-            token = Token(user=meteor_user)
-            token.save()
-        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        # Use the meteor server's key.
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + settings.METEOR_KEY)
 
         # Mock the user and their friend having saved the event.
         user_saved_event = SavedEvent(user=self.user, event=self.event,
@@ -304,6 +302,8 @@ class EventTests(APITestCase):
 class RecommendedEventTests(APITestCase):
 
     def setUp(self):
+        cache.clear()
+
         # Mock a user.
         self.user = User(location=Point(40.6898319, -73.9904645))
         self.user.save()
@@ -346,6 +346,135 @@ class RecommendedEventTests(APITestCase):
         json_recommended_events = JSONRenderer().render(serializer.data)
         self.assertEqual(response.content, json_recommended_events)
 
+    def test_query_cached(self):
+        # Mock a recommended event close by the user.
+        place = Place(name='Coopers Craft & Kitchen',
+                      geo=Point(40.7270113, -73.9912938))
+        place.save()
+        nearby_event = RecommendedEvent(title='$1 fish tacos', place=place)
+        nearby_event.save()
+
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Mock another user in the same geohash cell.
+        user = User(location=Point(40.6899319, -73.9905645))
+        user.save()
+        token = Token(user=user)
+        token.save()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should return the cached recommended events without querying
+        # them.
+        serializer = RecommendedEventSerializer([nearby_event], many=True)
+        json_recommended_events = JSONRenderer().render(serializer.data)
+        self.assertEqual(response.content, json_recommended_events)
+        for query in queries.captured_queries:
+            self.assertNotIn('events_recommendedevent', query['sql'])
+
+    def test_query_invalidated(self):
+        # Cache the user's recommended events.
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.content, '[]')
+
+        # Mock a recommended event close by the user.
+        place = Place(name='Coopers Craft & Kitchen',
+                      geo=Point(40.7270113, -73.9912938))
+        place.save()
+        nearby_event = RecommendedEvent(title='$1 fish tacos', place=place)
+        nearby_event.save()
+
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should return the new recommended event.
+        serializer = RecommendedEventSerializer([nearby_event], many=True)
+        json_recommended_events = JSONRenderer().render(serializer.data)
+        self.assertEqual(response.content, json_recommended_events)
+
+        # Move the place far from the user.
+        place.geo = Point(40.8560079, -73.970945)
+        place.save()
+
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.content, '[]')
+
+    @mock.patch('rallytap.apps.events.signals.invalidate_recommended_events')
+    def test_user_place_doesnt_invalidate(self, mock_invalidate):
+        # Mock a place for a user's event.
+        place = Place(name='the den', geo=self.user.location)
+        place.save()
+        place.name = 'my crib'
+        place.save()
+
+        # It shouldn't invalidate the cached recommended events.
+        self.assertEqual(mock_invalidate.call_count, 0)
+
+    def test_query_past_event(self):
+        # Mock a recommended event that already happened.
+        past_event = RecommendedEvent(title='drop it like it\'s hot',
+                                      datetime=timezone.now()-timedelta(hours=1))
+        past_event.save()
+
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should only return upcoming recommended events.
+        self.assertEqual(response.content, '[]')
+
+    def test_query_ranked(self):
+        # Mock a recommended event without a location.
+        no_location_event = RecommendedEvent(title='drop it like it\'s hot')
+        no_location_event.save()
+
+        # Mock recommended events at a place close by the user.
+        tomorrow = timezone.now() + timedelta(days=1)
+        place = Place(name='Coopers Craft & Kitchen',
+                      geo=Point(40.7270113, -73.9912938))
+        place.save()
+        later_event = RecommendedEvent(title='$1 oysters', place=place,
+                                       datetime=tomorrow+timedelta(hours=1))
+        later_event.save()
+        sooner_event = RecommendedEvent(title='$1 fish tacos', place=place,
+                                        datetime=tomorrow)
+        sooner_event.save()
+
+        # Mock a recommended event at a place closer to the user.
+        place = Place(name='Brooklyn Bridge Park',
+                      geo=Point(40.7002843, -73.9967689))
+        place.save()
+        closest_event = RecommendedEvent(title='movies with a view',
+                                         place=place)
+        closest_event.save()
+
+        response = self.client.get(self.list_url, {'limit': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should return the closest events first, then the events that
+        # start soonest.
+        content = json.loads(response.content)
+        self.assertEqual([event['id'] for event in content['results']],
+                         [closest_event.id, sooner_event.id, later_event.id])
+        self.assertEqual(content['results'][0]['distance'], 1278)
+        self.assertIsNotNone(content['next'])
+
+        response = self.client.get(self.list_url, {
+            'limit': 3,
+            'cursor': content['next'],
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should return the events without a place last.
+        content = json.loads(response.content)
+        self.assertEqual([event['id'] for event in content['results']],
+                         [no_location_event.id])
+        self.assertIsNone(content['results'][0]['distance'])
+        self.assertIsNone(content['next'])
+
     def test_query_not_logged_in(self):
         # Don't include the user's credentials in the request.
         self.client.credentials()
@@ -483,6 +612,45 @@ class SavedEventTests(APITestCase):
         response = self.client.post(self.list_url, data)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_create_friends_only_not_mutual(self):
+        # Mock a friends only event created by someone the user added, but who
+        # hasn't added the user back.
+        friend = User(name='Michael Bolton')
+        friend.save()
+        friendship = Friendship(user=self.user, friend=friend)
+        friendship.save()
+        event = Event(title='get jiggy with it', creator=friend,
+                      friends_only=True)
+        event.save()
+        saved_event = SavedEvent(user=friend, event=event,
+                                 location=self.user.location)
+        saved_event.save()
+
+        data = {'event': event.id}
+        response = self.client.post(self.list_url, data)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @mock.patch('rallytap.apps.events.views.add_members')
+    @mock.patch('rallytap.apps.events.views.send_message')
+    def test_create_cached_user(self, mock_send_message, mock_add_members):
+        # Cache the user's token, and then mock the user changing their name
+        # in another request.
+        CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        User.objects.filter(id=self.user.id).update(name='Alan Tdog Turing')
+
+        # Mock an event the user is saving.
+        event = Event(title='get jiggy with it', creator=self.user)
+        event.save()
+
+        data = {'event': event.id}
+        response = self.client.post(self.list_url, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # It should give the user points without undoing the name change.
+        user = User.objects.get(id=self.user.id)
+        self.assertEqual(user.name, 'Alan Tdog Turing')
+        self.assertEqual(user.points, self.user.points+Points.SAVED_EVENT)
+
     @mock.patch('rallytap.apps.events.views.add_members')
     def test_create_add_members_error(self, mock_add_members):
         mock_add_members.side_effect = requests.exceptions.HTTPError()
@@ -624,3 +792,158 @@ class SavedEventTests(APITestCase):
                                                    context=context)
         json_saved_events = JSONRenderer().render(serializer.data)
         self.assertEqual(response.content, json_saved_events)
+
+    def mock_friends_saved_events(self, num_friends):
+        # Mock friends who each saved a nearby event that the user also saved.
+        for i in xrange(num_friends):
+            friend = User(name='Friend {}'.format(i))
+            friend.save()
+            friendship = Friendship(user=self.user, friend=friend)
+            friendship.save()
+            event = Event(title='event {}'.format(i), creator=friend)
+            event.save()
+            saved_event = SavedEvent(user=friend, event=event,
+                                     location=self.user.location)
+            saved_event.save()
+            saved_event = SavedEvent(user=self.user, event=event,
+                                     location=self.user.location)
+            saved_event.save()
+
+    def test_list_num_queries(self):
+        self.mock_friends_saved_events(1)
+        # Cache the user's token so that both requests skip authenticating.
+        CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        with CaptureQueriesContext(connection) as few_queries:
+            response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(json.loads(response.content)), 1)
+
+        self.mock_friends_saved_events(20)
+        with CaptureQueriesContext(connection) as many_queries:
+            response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(json.loads(response.content)), 21)
+
+        # The number of queries shouldn't grow with the number of friends or
+        # saved events.
+        self.assertEqual(len(many_queries), len(few_queries))
+
+    def test_list_paginated(self):
+        # Mock three events that the user saved.
+        saved_events = []
+        for i in xrange(3):
+            event = Event(title='event {}'.format(i), creator=self.user)
+            event.save()
+            saved_event = SavedEvent(user=self.user, event=event,
+                                     location=self.user.location)
+            saved_event.save()
+            saved_events.append(saved_event)
+
+        response = self.client.get(self.list_url, {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should return the two newest saved events, and a cursor for the next
+        # page.
+        data = json.loads(response.content)
+        ids = [result['id'] for result in data['results']]
+        self.assertEqual(ids, [saved_events[2].id, saved_events[1].id])
+        self.assertIsNotNone(data['next'])
+
+        response = self.client.get(self.list_url, {
+            'limit': 2,
+            'cursor': data['next'],
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should return the rest of the saved events.
+        data = json.loads(response.content)
+        ids = [result['id'] for result in data['results']]
+        self.assertEqual(ids, [saved_events[0].id])
+        self.assertIsNone(data['next'])
+
+    def test_list_bad_cursor(self):
+        response = self.client.get(self.list_url, {
+            'limit': 2,
+            'cursor': 'bad cursor',
+        })
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_bad_since(self):
+        for fan_out in (False, True):
+            for since in ('bad since', '99999999999999999999'):
+                with self.settings(FEED_FAN_OUT=fan_out):
+                    response = self.client.get(self.list_url, {'since': since})
+                self.assertEqual(response.status_code,
+                                 status.HTTP_400_BAD_REQUEST)
+
+    def test_list_since(self):
+        # Mock a saved event that the user saved a day ago.
+        a_day_ago = timezone.now() - timedelta(days=1)
+        old_event = Event(title='old news', creator=self.user)
+        old_event.save()
+        old_saved_event = SavedEvent(user=self.user, event=old_event,
+                                     location=self.user.location)
+        old_saved_event.save()
+        Event.objects.filter(id=old_event.id).update(updated_at=a_day_ago)
+        SavedEvent.objects.filter(id=old_saved_event.id).update(
+                created_at=a_day_ago)
+
+        # Mock a saved event that the user just saved.
+        new_event = Event(title='hot off the press', creator=self.user)
+        new_event.save()
+        new_saved_event = SavedEvent(user=self.user, event=new_event,
+                                     location=self.user.location)
+        new_saved_event.save()
+
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        since = calendar.timegm(an_hour_ago.utctimetuple())
+        response = self.client.get(self.list_url, {'since': since})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should only return the saved event that was created since then.
+        data = json.loads(response.content)
+        ids = [result['id'] for result in data]
+        self.assertEqual(ids, [new_saved_event.id])
+
+    @override_settings(FEED_FAN_OUT=True)
+    def test_list_fanned_out(self):
+        # Mock the user's friend.
+        friend = User(name='Whitney Houston')
+        friend.save()
+        friendship = Friendship(user=self.user, friend=friend)
+        friendship.save()
+
+        # Mock two nearby events that the user's friend saved.
+        saved_events = []
+        for i in xrange(2):
+            event = Event(title='event {}'.format(i), creator=friend)
+            event.save()
+            saved_event = SavedEvent(user=friend, event=event,
+                                     location=self.user.location)
+            saved_event.save()
+            saved_events.append(saved_event)
+
+        # Run the fan out jobs.
+        jobs = Job.objects.filter(
+                task='rallytap.apps.events.utils.fan_out_saved_event') \
+                .order_by('id')
+        for job in jobs:
+            fan_out_saved_event(**job.kwargs)
+
+        response = self.client.get(self.list_url, {'limit': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should return the newest saved event from the user's feed
+        # entries, and a cursor for the next page.
+        data = json.loads(response.content)
+        ids = [result['id'] for result in data['results']]
+        self.assertEqual(ids, [saved_events[1].id])
+        self.assertIsNotNone(data['next'])
+
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should return the whole feed when there's no limit.
+        data = json.loads(response.content)
+        ids = [result['id'] for result in data]
+        self.assertEqual(ids, [saved_events[1].id, saved_events[0].id])
@@ -0,0 +1,456 @@
+from __future__ import unicode_literals
+import calendar
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rallytap.apps.auth.models import User
+from rallytap.apps.friends.utils import get_added_me, get_friend_ids
+from rallytap.apps.jobs.utils import enqueue
+from rallytap.apps.utils import geohash
+from rallytap.apps.utils.utils import bump_cache_version, get_cache_version
+from .models import (
+    ArchivedEvent,
+    ArchivedSavedEvent,
+    Event,
+    FeedEntry,
+    RecommendedEvent,
+    SavedEvent,
+)
+from .serializers import RecommendedEventSerializer
+
+RECOMMENDED_EVENTS_VERSION_KEY = 'recommended-events:version'
+
+
+def get_feed_queryset(user):
+    """
+    Return a queryset of every saved event that could show up in the user's
+    feed. The queryset includes saved events that fulfill any of the following
+    criteria:
+
+    - The user saved the event.
+    - The user's friend saved the event, and the event is nearby.
+    - The user's friend saved the event, and the friend was nearby when they
+      saved the event.
+
+    Only include saved events where the event hasn't expired yet.
+    """
+    friend_ids = get_friend_ids(user)
+    center = user.location
+    return SavedEvent.objects.filter(Q(user=user) | Q(user_id__in=friend_ids)) \
+            .filter(event__expired=False) \
+            .filter(
+                Q(user=user) |
+                Q(location__near=center) |
+                (Q(event__place__isnull=False) &
+                 Q(event__place__geo__near=center))) \
+            .exclude(
+                Q(event__friends_only=True) &
+                ~Q(event__creator_id=user.id) &
+                ~Q(event__creator_id=F('user_id')))
+            # TODO: don't return friends only events created by the user's
+            # friend who hasn't added them back.
+
+
+def get_feed(user):
+    """
+    Return a queryset of the saved events in the user's feed, sorted from newest
+    to oldest.
+
+    If multiple of the user's friends have saved the same event, only the saved
+    event that was created first is included.
+    """
+    # Postgres' `DISTINCT ON` keeps the first row for each event, so order each
+    # event's saved events from oldest to newest.
+    first_saved_event_ids = get_feed_queryset(user) \
+            .order_by('event_id', 'created_at', 'id') \
+            .distinct('event_id') \
+            .values('id')
+    return SavedEvent.objects.filter(id__in=first_saved_event_ids) \
+            .select_related('event', 'event__place') \
+            .order_by('-created_at', '-id')
+
+
+def get_fanned_out_feed(user):
+    """
+    Return a queryset of the user's precomputed feed entries for events that
+    haven't expired yet. The entries' saved events match `get_feed`, except
+    for any drift since the entries were created.
+
+    Entries are added and removed when saved events and friendships are, but
+    not when a user's location changes, so the feed can drift until it gets
+    rebuilt.
+    """
+    return FeedEntry.objects.filter(user=user, event__expired=False) \
+            .select_related('saved_event', 'event', 'event__place')
+
+def get_feed_recipient_ids(saved_event):
+    """
+    Return a set of the ids of the users whose feeds the saved event belongs
+    in, using the same criteria as `get_feed_queryset`.
+    """
+    event = saved_event.event
+    saver_id = saved_event.user_id
+    if event.friends_only and event.creator_id != saver_id:
+        # Only the creator sees the friends only event when someone else saved
+        # it.
+        candidates = get_added_me(saved_event.user) \
+                .filter(id=event.creator_id)
+    else:
+        candidates = get_added_me(saved_event.user)
+
+    nearby = Q(location__near=saved_event.location)
+    if event.place is not None and event.place.geo is not None:
+        nearby |= Q(location__near=event.place.geo)
+    recipient_ids = set(candidates.filter(nearby).values_list('id', flat=True))
+    if not event.friends_only or event.creator_id == saver_id:
+        recipient_ids.add(saver_id)
+    return recipient_ids
+
+def fan_out_saved_event(saved_event_id):
+    """
+    Add the saved event to the feeds of the users it belongs in. Runs as a
+    background job after the saved event is created.
+
+    Users who already have an entry for the event keep the entry for whichever
+    saved event was created first, breaking ties by id like `get_feed`.
+    """
+    try:
+        saved_event = SavedEvent.objects \
+                .select_related('user', 'event', 'event__place') \
+                .get(id=saved_event_id)
+    except SavedEvent.DoesNotExist:
+        # The user unsaved the event before we got to it.
+        return
+    if saved_event.event.expired:
+        return
+
+    recipient_ids = get_feed_recipient_ids(saved_event)
+    add_feed_entries([
+        (user_id, saved_event.event_id, saved_event.id, saved_event.created_at)
+        for user_id in recipient_ids
+    ])
+
+def add_feed_entries(entries):
+    """
+    Add a list of `(user_id, event_id, saved_event_id, created_at)` feed
+    entries. Users who already have an entry for an event keep the entry for
+    whichever saved event was created first, breaking ties by id like
+    `get_feed`. Each user can only have one entry per event in the list.
+    """
+    if not entries:
+        return
+
+    # Jobs for the same event can run at the same time, so insert and replace
+    # the entries in a single statement that handles the existing entries.
+    # Sort the entries so that concurrent jobs lock them in the same order.
+    user_ids, event_ids, saved_event_ids, created_ats = zip(*sorted(entries))
+    sql = ('INSERT INTO {table} AS entry '
+           '(user_id, event_id, saved_event_id, created_at) '
+           'SELECT * FROM unnest(%s::integer[], %s::integer[], '
+           '%s::integer[], %s::timestamptz[]) '
+           'ON CONFLICT (user_id, event_id) DO UPDATE '
+           'SET saved_event_id = EXCLUDED.saved_event_id, '
+           'created_at = EXCLUDED.created_at '
+           'WHERE (entry.created_at, entry.saved_event_id) > '
+           '(EXCLUDED.created_at, EXCLUDED.saved_event_id)').format(
+                   table=connection.ops.quote_name(FeedEntry._meta.db_table))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [list(user_ids), list(event_ids),
+                             list(saved_event_ids), list(created_ats)])
+
+def fan_out_event(event_id):
+    """
+    Fan out each of the event's saved events from oldest to newest. Runs as a
+    background job after one of the event's saved events is deleted, so that
+    the next saved event replaces the deleted one's entries.
+    """
+    saved_event_ids = SavedEvent.objects.filter(event_id=event_id) \
+            .order_by('created_at', 'id') \
+            .values_list('id', flat=True)
+    for saved_event_id in saved_event_ids:
+        fan_out_saved_event(saved_event_id)
+
+def fan_out_friend(user_id, friend_id):
+    """
+    Add the friend's saved events that belong in the user's feed to it. Runs
+    as a background job after the user adds the friend.
+    """
+    try:
+        user = User.objects.get(id=user_id)
+    except User.DoesNotExist:
+        return
+
+    saved_events = get_feed_queryset(user).filter(user_id=friend_id) \
+            .values_list('id', 'event_id', 'created_at')
+    add_feed_entries([
+        (user.id, event_id, saved_event_id, created_at)
+        for saved_event_id, event_id, created_at in saved_events
+    ])
+
+def remove_friend_from_feed(user_id, friend_id):
+    """
+    Remove the friend's saved events from the user's feed, and replace them
+    with the next saved events in the user's feed for the same events. Runs as
+    a background job after the user removes the friend.
+    """
+    entries = FeedEntry.objects.filter(user_id=user_id,
+                                       saved_event__user_id=friend_id)
+    event_ids = list(entries.values_list('event_id', flat=True))
+    if not event_ids:
+        return
+    entries.delete()
+
+    try:
+        user = User.objects.get(id=user_id)
+    except User.DoesNotExist:
+        return
+
+    saved_events = get_feed(user).filter(event_id__in=event_ids) \
+            .values_list('id', 'event_id', 'created_at')
+    add_feed_entries([
+        (user.id, event_id, saved_event_id, created_at)
+        for saved_event_id, event_id, created_at in saved_events
+    ])
+
+def rebuild_feed(user):
+    """
+    Replace the user's feed entries with the saved events in their feed from
+    `get_feed`.
+    """
+    saved_events = get_feed(user).values_list('id', 'event_id', 'created_at')
+    with transaction.atomic():
+        FeedEntry.objects.filter(user=user).delete()
+        FeedEntry.objects.bulk_create([
+            FeedEntry(user_id=user.id, event_id=event_id,
+                      saved_event_id=saved_event_id, created_at=created_at)
+            for saved_event_id, event_id, created_at in saved_events
+        ], batch_size=1000)
+
+def get_feed_differences(user):
+    """
+    Return a `(missing, extra)` tuple of sets of saved event ids. `missing`
+    has the saved events in the user's feed from `get_feed` without feed
+    entries, and `extra` has the feed entries' saved events that aren't.
+    """
+    expected = set(get_feed(user).values_list('id', flat=True))
+    actual = set(get_fanned_out_feed(user).values_list('saved_event_id',
+                                                       flat=True))
+    return expected - actual, actual - expected
+
+def get_user_saved_events(user):
+    """
+    Return a queryset of the user's saved events, sorted from newest to oldest
+    by when the event is happening if the event has a date, and by when the
+    event was created if it doesn't.
+    """
+    return SavedEvent.objects.filter(user=user) \
+            .select_related('event', 'event__place') \
+            .annotate(event_at=Coalesce('event__datetime',
+                                        'event__created_at')) \
+            .order_by('-event_at', '-id')
+
+def get_other_saved_events(event_id, user):
+    """
+    Return a queryset of the event's saved events, except for the user's.
+    """
+    return SavedEvent.objects.filter(event_id=event_id).exclude(user=user)
+
+def get_interested_friends(user, event_ids, saved_events_qs):
+    """
+    Return a dict mapping each event id to a list of the users other than the
+    given user who saved the event in `saved_events_qs`, in the order that they
+    saved the event.
+    """
+    interested_friends = {event_id: [] for event_id in event_ids}
+    saved_events = saved_events_qs.filter(event_id__in=event_ids) \
+            .exclude(user=user) \
+            .select_related('user') \
+            .order_by('created_at', 'id')
+    for saved_event in saved_events:
+        interested_friends[saved_event.event_id].append(saved_event.user)
+    return interested_friends
+
+
+def invalidate_recommended_events():
+    bump_cache_version(RECOMMENDED_EVENTS_VERSION_KEY)
+
+
+def get_cell_recommended_events(cell):
+    """
+    Return a list of `(data, point, starts_at)` tuples for every upcoming
+    recommended event that's either nearby some point in the geohash cell, or
+    doesn't have a place. `data` is the serialized event, `point` is the
+    event's `(lat, lng)`, or `None` if the event doesn't have a place, and
+    `starts_at` is the event's datetime.
+    """
+    key = 'recommended-events:{version}:{cell}'.format(
+            version=get_cache_version(RECOMMENDED_EVENTS_VERSION_KEY), cell=cell)
+    candidates = cache.get(key)
+    if candidates is not None:
+        return candidates
+
+    south, west, north, east = geohash.bounds(cell)
+    lat = (south + north) / 2
+    lng = (west + east) / 2
+    # Widen the radius by the distance from the center to the farthest corner
+    # so that we include every event nearby any point in the cell.
+    radius = settings.NEARBY_DISTANCE + max(
+            geohash.distance(lat, lng, corner_lat, corner_lng)
+            for corner_lat in (south, north)
+            for corner_lng in (west, east))
+    center = Point(lat, lng)
+    recommended_events = RecommendedEvent.objects.select_related('place') \
+            .filter(Q(place__isnull=True) | Q(place__geo__near=(center, radius))) \
+            .filter(Q(datetime__isnull=True) | Q(datetime__gte=timezone.now())) \
+            .order_by('id')
+    serializer = RecommendedEventSerializer(recommended_events, many=True)
+    candidates = []
+    for recommended_event, data in zip(recommended_events, serializer.data):
+        if recommended_event.place is None:
+            point = None
+        else:
+            point = (recommended_event.place.geo.x, recommended_event.place.geo.y)
+        candidates.append((data, point, recommended_event.datetime))
+    cache.set(key, candidates, settings.RECOMMENDED_EVENTS_CACHE_TIMEOUT)
+    return candidates
+
+
+def get_nearby_recommended_events(location):
+    """
+    Return a list of `(data, meters, starts_at)` tuples for the upcoming
+    recommended events that are either nearby the location, or don't have a
+    place. `meters` is the distance from the location to the event's place, or
+    `None` if the event doesn't have a place.
+
+    Every location in the same geohash cell shares one cached list of
+    candidates, so we only have to run the spatial query once per cell.
+    """
+    lat, lng = location.x, location.y
+    precision = geohash.get_precision(settings.NEARBY_DISTANCE / 2)
+    cell = geohash.encode(lat, lng, precision)
+    now = timezone.now()
+    recommended_events = []
+    for data, point, starts_at in get_cell_recommended_events(cell):
+        # Cached events may have started since we cached them.
+        if starts_at is not None and starts_at < now:
+            continue
+
+        if point is None:
+            meters = None
+        else:
+            meters = geohash.distance(lat, lng, point[0], point[1])
+            if meters > settings.NEARBY_DISTANCE:
+                continue
+        recommended_events.append((data, meters, starts_at))
+    return recommended_events
+
+
+def get_recommended_event_rank(data, meters, starts_at):
+    """
+    Return a tuple of non-negative integers to rank a recommended event by.
+    Closer events rank higher, and events at the same distance are ranked by
+    which starts soonest. Events without a place or a datetime rank last.
+    """
+    if meters is None:
+        distance_rank = (1, 0)
+    else:
+        distance_rank = (0, int(round(meters)))
+    if starts_at is None:
+        starts_at_rank = (1, 0, 0)
+    else:
+        seconds = calendar.timegm(starts_at.utctimetuple())
+        starts_at_rank = (0, seconds, starts_at.microsecond)
+    return distance_rank + starts_at_rank + (data['id'],)
+
+def expire_events(happened_before, batch_size):
+    """
+    Mark the events that happened before `happened_before` as expired, and
+    queue a job to delete their chats on the meteor server. Events without a
+    datetime happened when they were created. Return the number of events we
+    expired.
+
+    Expire the events in batches of `batch_size`, and commit each batch with
+    its job, so that we only lock one batch of rows at a time, and so that
+    the meteor server being down doesn't stop events from expiring.
+    """
+    # The partial index on `COALESCE(datetime, created_at)` for unexpired
+    # events covers the subquery. Check `expired` again in case another run
+    # expired the event while we were waiting to lock it.
+    sql = ('UPDATE {table} SET expired = true '
+           'WHERE expired = false AND id IN ('
+           'SELECT id FROM {table} WHERE expired = false '
+           'AND COALESCE(datetime, created_at) <= %s '
+           'LIMIT %s) '
+           'RETURNING id').format(
+                   table=connection.ops.quote_name(Event._meta.db_table))
+    num_expired = 0
+    while True:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [happened_before, batch_size])
+                event_ids = [event_id for event_id, in cursor.fetchall()]
+            if event_ids:
+                enqueue('rallytap.apps.utils.meteor.expire_chats',
+                        event_ids=event_ids)
+        num_expired += len(event_ids)
+        if len(event_ids) < batch_size:
+            return num_expired
+
+def archive_events(happened_before, batch_size):
+    """
+    Move the expired events that happened before `happened_before`, and their
+    saved events, to the archive tables. Return the number of events we
+    archived.
+
+    Move the events in batches of `batch_size`. Each batch is a single
+    statement in its own transaction, so the rows never show up in both
+    tables, and we only lock one batch of rows at a time.
+    """
+    qn = connection.ops.quote_name
+    event_columns = ', '.join(qn(field.column)
+                              for field in Event._meta.concrete_fields)
+    saved_event_columns = ', '.join(
+            qn(field.column) for field in SavedEvent._meta.concrete_fields)
+    # Foreign keys are checked when the transaction commits, so it's fine to
+    # delete the events in the same statement as their saved events and feed
+    # entries.
+    sql = ('WITH batch AS ('
+           'SELECT id FROM {event} WHERE expired = true '
+           'AND COALESCE(datetime, created_at) <= %s '
+           'LIMIT %s FOR UPDATE), '
+           'feed_entries AS ('
+           'DELETE FROM {feed_entry} WHERE event_id IN (SELECT id FROM batch)), '
+           'saved_events AS ('
+           'DELETE FROM {saved_event} '
+           'WHERE event_id IN (SELECT id FROM batch) '
+           'RETURNING {saved_event_columns}), '
+           'events AS ('
+           'DELETE FROM {event} WHERE id IN (SELECT id FROM batch) '
+           'RETURNING {event_columns}), '
+           'archived_events AS ('
+           'INSERT INTO {archived_event} ({event_columns}) '
+           'SELECT {event_columns} FROM events RETURNING id), '
+           'archived_saved_events AS ('
+           'INSERT INTO {archived_saved_event} ({saved_event_columns}) '
+           'SELECT {saved_event_columns} FROM saved_events) '
+           'SELECT COUNT(*) FROM archived_events').format(
+                   event=qn(Event._meta.db_table),
+                   feed_entry=qn(FeedEntry._meta.db_table),
+                   saved_event=qn(SavedEvent._meta.db_table),
+                   archived_event=qn(ArchivedEvent._meta.db_table),
+                   archived_saved_event=qn(ArchivedSavedEvent._meta.db_table),
+                   event_columns=event_columns,
+                   saved_event_columns=saved_event_columns)
+    num_archived = 0
+    while True:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [happened_before, batch_size])
+                batch_num_archived, = cursor.fetchone()
+        num_archived += batch_num_archived
+        if batch_num_archived < batch_size:
+            return num_archived
@@ -1,15 +1,16 @@
 from __future__ import unicode_literals
+from collections import OrderedDict
 from django.conf import settings
 from django.contrib.gis.measure import D
-from django.db.models import F, Q
 from django.views.generic.base import TemplateView
 import requests
-from rest_framework import authentication, mixins, status, viewsets
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import detail_route
+from rest_framework.filters import DjangoFilterBackend
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .filters import NearbyPlaceFilter
+from .filters import FeedEntryFilter, SavedEventFilter
 from .models import Event, RecommendedEvent, SavedEvent
 from .permissions import IsCreator
 from .serializers import (
@@ -19,19 +20,35 @@ from .serializers import (
     SavedEventSerializer,
     SavedEventFullEventSerializer,
 )
+from .utils import (
+    get_fanned_out_feed,
+    get_feed,
+    get_feed_queryset,
+    get_interested_friends,
+    get_nearby_recommended_events,
+    get_other_saved_events,
+    get_recommended_event_rank,
+)
+from rallytap.apps.auth.authentication import (
+    CachedTokenAuthentication,
+    MeteorAuthentication,
+)
 from rallytap.apps.auth.models import User, Points
 from rallytap.apps.auth.permissions import IsMeteor
 from rallytap.apps.auth.serializers import FriendSerializer
+from rallytap.apps.auth.utils import add_points
 from rallytap.apps.events.models import Event
-from rallytap.apps.friends.models import Friendship
+from rallytap.apps.friends.utils import are_mutual_friends, get_friend_ids
 from rallytap.apps.notifications.utils import send_message
 from rallytap.apps.utils.exceptions import ServiceUnavailable
-from rallytap.apps.utils.utils import add_members
+from rallytap.apps.utils.pagination import KeysetPagination, RankPagination
+from rallytap.apps.utils.meteor import add_members
+from rallytap.apps.utils.profiling import profile_serialization
 
 
 class EventViewSet(mixins.CreateModelMixin, mixins.UpdateModelMixin,
                    mixins.RetrieveModelMixin, viewsets.GenericViewSet):
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated, IsCreator)
     queryset = Event.objects.all()
     serializer_class = EventSerializer
@@ -49,12 +66,14 @@ class EventViewSet(mixins.CreateModelMixin, mixins.UpdateModelMixin,
             raise PermissionDenied('You aren\'t interested in this event, yet.')
 
         users = [saved_event.user
-                 for saved_event in SavedEvent.objects.filter(event_id=pk) \
-                         .exclude(user=request.user.id)]
+                 for saved_event in get_other_saved_events(pk, request.user)]
         serializer = FriendSerializer(users, many=True)
-        return Response(serializer.data)
+        with profile_serialization():
+            data = serializer.data
+        return Response(data)
 
-    @detail_route(methods=['post'], permission_classes=(IsMeteor,))
+    @detail_route(methods=['post'], permission_classes=(IsMeteor,),
+                  authentication_classes=(MeteorAuthentication,))
     def comment(self, request, pk=None):
         serializer = CommentSerializer(data=request.data)
         serializer.is_valid()
@@ -72,19 +91,38 @@ class EventViewSet(mixins.CreateModelMixin, mixins.UpdateModelMixin,
 
 
 class RecommendedEventViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     queryset = RecommendedEvent.objects.all()
     serializer_class = RecommendedEventSerializer
-    filter_backends = (NearbyPlaceFilter,)
+    pagination_class = RankPagination
+
+    def list(self, request, *args, **kwargs):
+        recommended_events = get_nearby_recommended_events(request.user.location)
+
+        ranked_events = []
+        for data, meters, starts_at in recommended_events:
+            rank = get_recommended_event_rank(data, meters, starts_at)
+            ranked_data = OrderedDict(data)
+            ranked_data['distance'] = int(round(meters)) if meters is not None else None
+            ranked_events.append((rank, ranked_data))
+        page = self.paginate_queryset(ranked_events)
+        if page is not None:
+            return self.get_paginated_response(page)
+
+        # Clients that don't send a `limit` get every event, unranked.
+        return Response([data for data, meters, starts_at in recommended_events])
 
 
 class SavedEventViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
                         viewsets.GenericViewSet):
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     queryset = SavedEvent.objects.all()
     serializer_class = SavedEventSerializer
+    filter_backends = (DjangoFilterBackend,)
+    filter_class = SavedEventFilter
+    pagination_class = KeysetPagination
 
     def create(self, request, *args, **kwargs):
         data = dict(request.data)
@@ -94,18 +132,19 @@ class SavedEventViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
         serializer = SavedEventSerializer(data=data)
         serializer.is_valid(raise_exception=True)
         
-        # Make sure the user has access to this event.
-        friendships = Friendship.objects.filter(user=request.user)
-        friends_ids = set(friendships.values_list('friend_id', flat=True))
+        # Make sure the user has access to this event. Only the creator's mutual
+        # friends can save friends only events.
+        friends_ids = get_friend_ids(request.user)
         event_id = serializer.data['event']
-        event = Event.objects.get(id=event_id)
-        friends_saved_events = SavedEvent.objects.filter(event_id=event_id,
-                                                         user__in=friends_ids)
+        event = Event.objects.select_related('creator').get(id=event_id)
+        friends_saved_events = list(SavedEvent.objects.filter(
+                event_id=event_id, user__in=friends_ids).select_related('user'))
         saved_event_friends_ids = [saved_event.user_id
                                    for saved_event in friends_saved_events]
         if (not event.creator_id == request.user.id and
-            (friends_saved_events.count() == 0 or
-             (event.friends_only and event.creator_id not in friends_ids))):
+            (len(friends_saved_events) == 0 or
+             (event.friends_only and
+              not are_mutual_friends(request.user, event.creator)))):
             raise PermissionDenied('You don\'t have access to that event.')
 
         self.perform_create(serializer)
@@ -114,7 +153,7 @@ class SavedEventViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
         # Add the creator to the meteor server members list.
         try:
             add_members(event, request.user.id)
-        except requests.exceptions.HTTPError:
+        except requests.exceptions.RequestException:
             raise ServiceUnavailable()
 
         # Notify the user's friends who are also interested.
@@ -123,38 +162,21 @@ class SavedEventViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
         send_message(saved_event_friends_ids, message)
 
         # Give the user points!
-        request.user.points += Points.SAVED_EVENT
-        request.user.save()
+        add_points(request.user.id, Points.SAVED_EVENT)
 
         # Give the user who created the event points!
         if event.creator_id != request.user.id:
-            creator = event.creator
-            creator.points += Points.SAVED_EVENT
-            creator.save()
-
-        # See how many users are interested in this event. Convert the queryset
-        # to a list so that it's only evaluated once.
-        saved_events = list(SavedEvent.objects.filter(event_id=event_id))
-        total_num_interested = {event_id: len(saved_events)}
+            add_points(event.creator_id, Points.SAVED_EVENT)
 
         # See which of the user's friends are interested in this event.
-        friends_dict = {
-            friendship.friend_id: friendship.friend
-            for friendship in friendships
-        }
         interested_friends = {
-            event_id: [friends_dict[saved_event.user_id]
-                       for saved_event in saved_events
-                       if friends_dict.has_key(saved_event.user_id)]
+            event_id: [saved_event.user for saved_event in friends_saved_events]
         }
 
         # Since creating the saved event removes any context from the serializer,
         # we have to serialize the saved event again with the user's connections
         # who are also interested.
-        context = {
-            'interested_friends': interested_friends,
-            'total_num_interested': total_num_interested,
-        }
+        context = {'interested_friends': interested_friends}
         saved_event = serializer.instance
         # We have to get the event because right now it's a pk-only object.
         saved_event.event = Event.objects.get(id=saved_event.event_id)
@@ -165,98 +187,64 @@ class SavedEventViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
 
     def list(self, request, *args, **kwargs):
         """
-        Return saved events that fulfill any of the following criteria:
-
-        - The user saved the event.
-        - The user's friend saved the event, and the event is nearby.
-        - The user's friend saved the event, and the friend was nearby when they
-          saved the event.
-
-        Only return saved events where the event hasn't expired yet.
+        Return the saved events in the user's feed, sorted from newest to
+        oldest. See `get_feed_queryset` for which saved events are included.
 
         If multiple of the user's friends have saved the event, only return the
         saved event that was created first.
+
+        When the client sends a `limit`, return one page of the feed at a time,
+        along with a cursor for the next page. When the client sends a `since`
+        unix timestamp, only return saved events that were created or changed
+        since then.
+
+        When `FEED_FAN_OUT` is on, read the feed from the user's precomputed
+        feed entries instead.
         """
-        user_ids = [friendship.friend
-                for friendship in Friendship.objects.filter(user=request.user)]
-        user_ids.append(request.user.id)
-        user_location = request.user.location
-        center = request.user.location
-        radius = settings.NEARBY_RADIUS
-        nearby_circle = center.buffer(radius)
-        saved_events_qs = SavedEvent.objects.filter(user_id__in=user_ids) \
-                .select_related('event') \
-                .filter(event__expired=False) \
-                .select_related('event__place') \
-                .filter(
-                    Q(user=request.user) |
-                    Q(location__contained=nearby_circle) |
-                    (Q(event__place__isnull=False) &
-                     Q(event__place__geo__contained=nearby_circle))) \
-                .exclude(
-                    Q(event__friends_only=True) &
-                    ~Q(event__creator_id=request.user.id) &
-                    ~Q(event__creator_id=F('user_id')))
-                # TODO: don't return friends only events created by the user's
-                # friend who hasn't added them back.
-
-        # Filter out duplicates.
-        unique_saved_events = {}
-        for saved_event in saved_events_qs:
-            event = saved_event.event
-            if (not unique_saved_events.has_key(event.id) or
-                    unique_saved_events[event.id].created_at > event.created_at):
-                unique_saved_events[event.id] = saved_event
-        saved_events = [saved_event for saved_event in saved_events_qs
-                if unique_saved_events.has_key(saved_event.event_id)
-                and unique_saved_events[saved_event.event_id].id == saved_event.id]
-
-        # Sort the saved events from newest to oldest.
-        saved_events.sort(lambda a, b: 1 if a.created_at < b.created_at else -1)
-
-        # Get the users who are interested in each event that the user is interested
-        # in.
-        interested_friends = {}
-        friend_ids = set()
-        for saved_event in saved_events_qs:
-            friend_ids.add(saved_event.user_id)
-        # Convert the queryset into a list to evaluate the queryset.
-        # TODO: Double check that this is necessary.
-        friends = list(User.objects.filter(id__in=friend_ids) \
-                .exclude(id=request.user.id))
-        friends_dict = {friend.id: friend for friend in friends}
-        for saved_event in saved_events:
-            # Only set the interested friends if the user has saved the event.
-            if saved_events_qs.filter(user_id=request.user.id,
-                                      event_id=saved_event.event_id) \
-                    .count() == 0:
-                continue
-
-            this_event_saved_events = saved_events_qs.filter(
-                    event_id=saved_event.event_id)
-            this_event_interested_friends = [friends_dict[_saved_event.user_id]
-                    for _saved_event in this_event_saved_events
-                    if _saved_event.user_id != request.user.id]
-            interested_friends[saved_event.event_id] = this_event_interested_friends
-
-        # Get the total number of people who are interested in each event.
+        if settings.FEED_FAN_OUT:
+            saved_events = self.list_fanned_out_feed(request)
+        else:
+            queryset = self.filter_queryset(get_feed(request.user))
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                saved_events = page
+            else:
+                # Convert the queryset into a list to evaluate the queryset.
+                saved_events = list(queryset)
         event_ids = [saved_event.event_id for saved_event in saved_events]
-        # Make the result a list to evaluate the queryset.
-        all_saved_events = list(SavedEvent.objects.filter(
-                event_id__in=event_ids))
-        total_num_interested = {
-            saved_event.event_id: len([
-                _saved_event for _saved_event in all_saved_events
-                if _saved_event.event_id == saved_event.event_id
-            ])
-            for saved_event in saved_events
-        }
 
-        context = {
-            'interested_friends': interested_friends,
-            'total_num_interested': total_num_interested,
-        }
-        serializer = SavedEventFullEventSerializer(data=saved_events, many=True,
+        # Get the users who are interested in each event that the user is
+        # interested in.
+        user_event_ids = SavedEvent.objects.filter(user=request.user,
+                                                   event_id__in=event_ids) \
+                .values_list('event_id', flat=True)
+        interested_friends = get_interested_friends(request.user,
+                list(user_event_ids), get_feed_queryset(request.user))
+
+        context = {'interested_friends': interested_friends}
+        serializer = SavedEventFullEventSerializer(saved_events, many=True,
                                                    context=context)
-        serializer.is_valid()
-        return Response(serializer.data)
+        with profile_serialization():
+            data = serializer.data
+        if self.paginator.limit is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def list_fanned_out_feed(self, request):
+        """
+        Return a list of the saved events in the user's feed entries, sorted
+        from newest to oldest.
+        """
+        queryset = FeedEntryFilter(request.query_params,
+                                   queryset=get_fanned_out_feed(request.user)).qs
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            page = queryset.order_by('-created_at', '-id')
+
+        saved_events = []
+        for entry in page:
+            # Avoid querying for the event again when serializing.
+            saved_event = entry.saved_event
+            saved_event.event = entry.event
+            saved_events.append(saved_event)
+        return saved_events
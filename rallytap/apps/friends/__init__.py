@@ -0,0 +1 @@
+default_app_config = 'rallytap.apps.friends.apps.FriendsConfig'
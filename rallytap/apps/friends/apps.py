@@ -0,0 +1,9 @@
+from __future__ import unicode_literals
+from django.apps import AppConfig
+
+class FriendsConfig(AppConfig):
+    name = 'rallytap.apps.friends'
+    verbose_name = 'Rallytap friends'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0022_auto_20151104_2359'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='friendship',
+            name='mutual',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterIndexTogether(
+            name='friendship',
+            index_together=set([('user', 'mutual')]),
+        ),
+        migrations.RunSQL(
+            sql=('UPDATE friends_friendship SET mutual = EXISTS ('
+                 'SELECT 1 FROM friends_friendship AS added_back '
+                 'WHERE added_back.user_id = friends_friendship.friend_id '
+                 'AND added_back.friend_id = friends_friendship.user_id)'),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.db.models import Q
+
+
+def delete_system_friendships(apps, schema_editor):
+    # System accounts are virtual friends with every user now.
+    Friendship = apps.get_model('friends', 'Friendship')
+    system_usernames = ['teamrallytap']
+    Friendship.objects.filter(Q(user__username__in=system_usernames) |
+                              Q(friend__username__in=system_usernames)) \
+            .delete()
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0023_friendship_mutual'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_system_friendships,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0024_delete_system_friendships'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='friendship',
+            index_together=set([('friend', 'mutual')]),
+        ),
+    ]
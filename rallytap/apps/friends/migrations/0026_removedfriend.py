@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('friends', '0025_friendship_friend_mutual_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RemovedFriend',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('friend_id', models.IntegerField()),
+                ('removed_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(related_name='+', db_constraint=False, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='removedfriend',
+            unique_together=set([('user', 'friend_id')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='removedfriend',
+            index_together=set([('user', 'removed_at')]),
+        ),
+    ]
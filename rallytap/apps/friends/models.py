@@ -6,12 +6,36 @@ from rallytap.apps.auth.models import User
 class Friendship(models.Model):
     user = models.ForeignKey(User, related_name='user+')
     friend = models.ForeignKey(User, related_name='friend+')
+    # Set to true when the friend has added the user back.
+    mutual = models.BooleanField(default=False)
     since = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('user', 'friend')
+        # Covers finding who added a user, and which of them are mutual.
+        index_together = ('friend', 'mutual')
 
     def __unicode__(self):
         return '{user} -> {friend}'.format(user=unicode(self.user.name),
                                            friend=unicode(self.friend.name))
+
+
+class RemovedFriend(models.Model):
+    """
+    A friend that the user removed, so that clients syncing only what changed
+    in their friends list find out about it. Re-adding the friend deletes this.
+    """
+    # Keep the removal after the friend deletes their account, and don't check
+    # the user, since deleting a user removes their friends as it deletes them.
+    user = models.ForeignKey(User, related_name='+', db_constraint=False)
+    friend_id = models.IntegerField()
+    removed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'friend_id')
+        index_together = ('user', 'removed_at')
+
+    def __unicode__(self):
+        return '{user} -x {friend_id}'.format(user=self.user_id,
+                                              friend_id=self.friend_id)
@@ -2,15 +2,22 @@ from __future__ import unicode_literals
 from rest_framework import serializers
 from rallytap.apps.auth.models import User
 from rallytap.apps.notifications.utils import send_message
-from rallytap.apps.utils.utils import add_members
+from rallytap.apps.utils.meteor import add_members
 from .models import Friendship
+from .utils import is_system_user
 
 
 class FriendshipSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Friendship
-        read_only_fields = ('since', 'updated_at')
+        read_only_fields = ('mutual', 'since', 'updated_at')
+
+    def validate(self, data):
+        # System accounts are already friends with every user.
+        if is_system_user(data['user']) or is_system_user(data['friend']):
+            raise serializers.ValidationError('You\'re already friends.')
+        return data
 
     def create(self, validated_data):
         friendship = super(FriendshipSerializer, self).create(validated_data)
@@ -20,16 +27,12 @@ class FriendshipSerializer(serializers.ModelSerializer):
         friend_id = validated_data['friend'].id
         user_ids = [friend_id]
 
-        try:
-            # Check if the user's new friend has already added the user as a
-            # friend.
-            Friendship.objects.get(user=friend_id, friend=user)
-
-            # Send the friend this user added a notification.
+        if friendship.mutual:
+            # The user's new friend had already added the user as a friend.
             message = '{name} (@{username}) added you back!'.format(
                     name=user.name, username=user.username)
             send_message(user_ids, message)
-        except Friendship.DoesNotExist:
+        else:
             # Send the friend this user added a notification.
             message = '{name} (@{username}) added you as a friend!'.format(
                     name=user.name, username=user.username)
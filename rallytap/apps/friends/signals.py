@@ -0,0 +1,36 @@
+from __future__ import unicode_literals
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Friendship, RemovedFriend
+from .utils import update_mutual
+
+
+@receiver(post_save, sender=Friendship)
+def add_mutual(sender, instance, created, **kwargs):
+    if not created:
+        return
+
+    instance.mutual = update_mutual(instance.user_id, instance.friend_id)
+
+
+@receiver(post_delete, sender=Friendship)
+def remove_mutual(sender, instance, **kwargs):
+    # The friendship back is no longer mutual.
+    Friendship.objects.filter(user_id=instance.friend_id,
+                              friend_id=instance.user_id) \
+            .update(mutual=False)
+
+
+@receiver(post_save, sender=Friendship)
+def unremove_friend(sender, instance, created, **kwargs):
+    if not created:
+        return
+
+    RemovedFriend.objects.filter(user_id=instance.user_id,
+                                 friend_id=instance.friend_id).delete()
+
+
+@receiver(post_delete, sender=Friendship)
+def remove_friend(sender, instance, **kwargs):
+    RemovedFriend.objects.update_or_create(user_id=instance.user_id,
+                                           friend_id=instance.friend_id)
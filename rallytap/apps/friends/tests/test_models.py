@@ -1 +1,44 @@
 from __future__ import unicode_literals
+from django.test import TestCase
+from rallytap.apps.auth.models import User
+from rallytap.apps.friends.models import Friendship
+from rallytap.apps.friends.utils import are_mutual_friends
+
+
+class FriendshipTests(TestCase):
+
+    def setUp(self):
+        # Mock two users.
+        self.user = User(name='Alan Tdog Turing')
+        self.user.save()
+        self.friend = User(name='Joan Clarke')
+        self.friend.save()
+
+    def test_add_back(self):
+        friendship = Friendship(user=self.user, friend=self.friend)
+        friendship.save()
+        self.assertFalse(friendship.mutual)
+        self.assertFalse(are_mutual_friends(self.user, self.friend))
+
+        friendship_back = Friendship(user=self.friend, friend=self.user)
+        friendship_back.save()
+
+        # It should mark both friendships as mutual.
+        self.assertTrue(friendship_back.mutual)
+        friendship = Friendship.objects.get(id=friendship.id)
+        self.assertTrue(friendship.mutual)
+        self.assertTrue(are_mutual_friends(self.user, self.friend))
+        self.assertTrue(are_mutual_friends(self.friend, self.user))
+
+    def test_delete(self):
+        friendship = Friendship(user=self.user, friend=self.friend)
+        friendship.save()
+        friendship_back = Friendship(user=self.friend, friend=self.user)
+        friendship_back.save()
+
+        Friendship.objects.filter(id=friendship_back.id).delete()
+
+        # It should mark the remaining friendship as not mutual.
+        friendship = Friendship.objects.get(id=friendship.id)
+        self.assertFalse(friendship.mutual)
+        self.assertFalse(are_mutual_friends(self.user, self.friend))
@@ -0,0 +1,71 @@
+from __future__ import unicode_literals
+from django.db import connection
+from django.test import TestCase
+from rallytap.apps.auth.models import User
+from rallytap.apps.friends.models import Friendship
+from rallytap.apps.friends.utils import (
+    are_mutual_friends,
+    get_added_me,
+    get_friends,
+)
+
+
+class SystemFriendsTests(TestCase):
+
+    def setUp(self):
+        # Mock the user.
+        self.user = User(name='Alan Tdog Turing')
+        self.user.save()
+
+        # Mock the user's friend.
+        self.friend = User(name='Joan Clarke')
+        self.friend.save()
+        friendship = Friendship(user=self.user, friend=self.friend)
+        friendship.save()
+
+        # Mock the teamrallytap user.
+        self.teamrallytap_user = User(username='teamrallytap')
+        self.teamrallytap_user.save()
+
+    def test_get_friends(self):
+        # It should include the system accounts without friendships.
+        friends = get_friends(self.user).order_by('id')
+        self.assertEqual(list(friends), [self.friend, self.teamrallytap_user])
+
+    def test_get_system_friends(self):
+        # System accounts should be friends with every other user.
+        friends = get_friends(self.teamrallytap_user).order_by('id')
+        self.assertEqual(list(friends), [self.user, self.friend])
+
+    def test_get_added_me(self):
+        added_me = get_added_me(self.friend).order_by('id')
+        self.assertEqual(list(added_me), [self.user, self.teamrallytap_user])
+
+        # Only mutual friends and the system accounts should be included.
+        added_me = get_added_me(self.friend, mutual=True)
+        self.assertEqual(list(added_me), [self.teamrallytap_user])
+
+    def test_are_mutual_friends(self):
+        self.assertTrue(are_mutual_friends(self.user, self.teamrallytap_user))
+        self.assertTrue(are_mutual_friends(self.teamrallytap_user, self.user))
+
+    def test_friends_query_plan(self):
+        # Give the planner statistics for the mocked rows.
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE down_auth_user')
+            cursor.execute('ANALYZE friends_friendship')
+
+        for queryset in (get_friends(self.user), get_added_me(self.friend),
+                         get_added_me(self.friend, mutual=True)):
+            # The tables are small, so make the planner avoid sequential scans
+            # when it can.
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql, params)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+            # It should join the friend ids to the users instead of filtering
+            # every user.
+            self.assertNotIn('Seq Scan on down_auth_user', plan)
+            self.assertNotIn('SubPlan', plan)
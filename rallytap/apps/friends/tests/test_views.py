@@ -1,7 +1,6 @@
 from __future__ import unicode_literals
 from django.conf import settings
 from django.core.urlresolvers import reverse
-from django.utils import timezone
 import mock
 from rest_framework import status
 from rest_framework.authtoken.models import Token
@@ -69,6 +68,23 @@ class FriendshipTests(APITestCase):
         json_friendship = JSONRenderer().render(serializer.data)
         self.assertEqual(response.content, json_friendship)
 
+    def test_create_system_user(self):
+        # Mock the teamrallytap user.
+        teamrallytap_user = User(username='teamrallytap')
+        teamrallytap_user.save()
+
+        data = {
+            'user': self.user.id,
+            'friend': teamrallytap_user.id,
+        }
+        response = self.client.post(self.list_url, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # It shouldn't save a friendship, since every user is already friends
+        # with the system accounts.
+        self.assertFalse(Friendship.objects.filter(
+                friend=teamrallytap_user).exists())
+
     @mock.patch('rallytap.apps.friends.serializers.send_message')
     def test_create_add_back(self, mock_send_message):
         # Delete the user's mocked friendship.
@@ -114,17 +130,8 @@ class FriendshipTests(APITestCase):
 
     @mock.patch('rallytap.apps.friends.views.send_message')
     def test_send_message(self, mock_send_message):
-        # Use the meteor server's auth token.
-        try:
-            meteor_user = User.objects.get(id=settings.METEOR_USER_ID)
-            token = Token.objects.get(user=meteor_user)
-        except User.DoesNotExist:
-            dt = timezone.now()
-            meteor_user = User(id=settings.METEOR_USER_ID, date_joined=dt)
-            meteor_user.save()
-            token = Token(user=meteor_user)
-            token.save()
-        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        # Use the meteor server's key.
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + settings.METEOR_KEY)
 
         data = {
             'text': 'So down!',
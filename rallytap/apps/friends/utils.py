@@ -0,0 +1,101 @@
+from __future__ import unicode_literals
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from rallytap.apps.auth.models import User
+from .models import Friendship
+
+SYSTEM_USER_IDS_KEY = 'system-user-ids'
+
+
+def update_mutual(user_id, friend_id):
+    """
+    Set whether the friendships between the two users are mutual, based on
+    whether both of them exist, and return whether they're mutual.
+    """
+    table = Friendship._meta.db_table
+    sql = ('UPDATE {table} SET mutual = EXISTS ('
+           'SELECT 1 FROM {table} AS added_back '
+           'WHERE added_back.user_id = {table}.friend_id '
+           'AND added_back.friend_id = {table}.user_id) '
+           'WHERE ({table}.user_id = %s AND {table}.friend_id = %s) '
+           'OR ({table}.user_id = %s AND {table}.friend_id = %s) '
+           'RETURNING mutual').format(
+                   table=connection.ops.quote_name(table))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, friend_id, friend_id, user_id])
+        return any(mutual for mutual, in cursor.fetchall())
+
+def is_system_user(user):
+    """
+    Return whether the user is a system account, like Team Rallytap. System
+    accounts are virtual friends with every user, so they don't have any
+    friendship rows.
+    """
+    return user.username in settings.SYSTEM_USERNAMES
+
+def get_system_user_ids():
+    """
+    Return a list of the system accounts' ids. Cache the ids until a system
+    account is saved or deleted.
+    """
+    user_ids = cache.get(SYSTEM_USER_IDS_KEY)
+    if user_ids is None:
+        user_ids = list(User.objects \
+                .filter(username__in=settings.SYSTEM_USERNAMES) \
+                .values_list('id', flat=True))
+        cache.set(SYSTEM_USER_IDS_KEY, user_ids, None)
+    return user_ids
+
+def invalidate_system_user_ids():
+    cache.delete(SYSTEM_USER_IDS_KEY)
+
+def get_users_and_system_users(column, **filters):
+    """
+    Return a queryset of the users whose ids are in `column` of the friendships
+    matching `filters`, along with the system accounts.
+
+    Postgres can't plan `id IN (...) OR username IN (...)` as a semi-join, so
+    it would scan every user. Union the system accounts' ids into the subquery
+    instead.
+    """
+    conditions = ' AND '.join('{field} = %s'.format(field=field)
+                              for field in sorted(filters))
+    params = [filters[field] for field in sorted(filters)]
+    sql = ('SELECT {column} FROM {table} WHERE {conditions} '
+           'UNION ALL SELECT unnest(%s::integer[])').format(
+                   column=column, conditions=conditions,
+                   table=connection.ops.quote_name(Friendship._meta.db_table))
+    params.append(get_system_user_ids())
+    return User.objects.filter(id__in=RawSQL(sql, params))
+
+def get_friends(user):
+    """
+    Return a queryset of the users the user added as a friend, including the
+    system accounts. A system account's friends are every other user.
+    """
+    if is_system_user(user):
+        return User.objects.exclude(id=user.id)
+    return get_users_and_system_users('friend_id', user_id=user.id)
+
+def get_friend_ids(user):
+    return get_friends(user).values('id')
+
+def get_added_me(user, mutual=False):
+    """
+    Return a queryset of the users who added the user as a friend, including
+    the system accounts. Only include mutual friends if `mutual` is true.
+    """
+    if is_system_user(user):
+        return User.objects.exclude(id=user.id)
+    if mutual:
+        return get_users_and_system_users('user_id', friend_id=user.id,
+                                          mutual=True)
+    return get_users_and_system_users('user_id', friend_id=user.id)
+
+def are_mutual_friends(user, friend):
+    if is_system_user(user) or is_system_user(friend):
+        return True
+    return Friendship.objects.filter(user=user, friend=friend,
+                                     mutual=True).exists()
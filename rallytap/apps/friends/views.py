@@ -1,10 +1,13 @@
 from __future__ import unicode_literals
 from rest_framework import mixins, status, viewsets
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import detail_route, list_route
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rallytap.apps.auth.authentication import (
+    CachedTokenAuthentication,
+    MeteorAuthentication,
+)
 from rallytap.apps.auth.models import User
 from rallytap.apps.auth.permissions import IsMeteor
 from rallytap.apps.notifications.utils import send_message
@@ -18,7 +21,7 @@ from .serializers import (
 
 class FriendshipViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
                         viewsets.GenericViewSet):
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     queryset = Friendship.objects.all()
     serializer_class = FriendshipSerializer
@@ -48,7 +51,8 @@ class FriendshipViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
 
         return Response()
 
-    @detail_route(methods=['post'], permission_classes=(IsMeteor,))
+    @detail_route(methods=['post'], permission_classes=(IsMeteor,),
+                  authentication_classes=(MeteorAuthentication,))
     def message(self, request, pk=None):
         serializer = MessageSerializer(data=request.data)
         serializer.is_valid() # TODO: Handle bad data
@@ -0,0 +1,8 @@
+from __future__ import unicode_literals
+from django.contrib import admin
+from .models import Job
+
+
+@admin.register(Job)
+class JobsAdmin(admin.ModelAdmin):
+    pass
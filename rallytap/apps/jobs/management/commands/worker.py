@@ -0,0 +1,29 @@
+from __future__ import unicode_literals
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from rallytap.apps.jobs.utils import claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Runs background jobs as they get enqueued.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--burst', action='store_true', default=False,
+                            help='Exit once there are no jobs left to run.')
+
+    def handle(self, *args, **options):
+        while True:
+            # Workers run for a long time, so don't hold onto a broken or
+            # expired database connection.
+            close_old_connections()
+
+            job = claim_job()
+            if job is None:
+                if options['burst']:
+                    return
+                time.sleep(settings.JOBS_POLL_INTERVAL)
+                continue
+
+            run_job(job)
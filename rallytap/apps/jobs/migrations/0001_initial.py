@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('task', models.CharField(max_length=255)),
+                ('kwargs', jsonfield.fields.JSONField(default=b'{}')),
+                ('status', models.SmallIntegerField(default=0, choices=[(0, 'pending'), (1, 'running'), (2, 'failed')])),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(null=True, blank=True)),
+                ('run_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='job',
+            index_together=set([('status', 'run_at')]),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from __future__ import unicode_literals
+import json
+from django.db import models
+from jsonfield import JSONField
+
+
+class Job(models.Model):
+    # The dotted path to the function that runs the job, e.g.
+    # 'rallytap.apps.notifications.utils.deliver_message'.
+    task = models.CharField(max_length=255)
+    kwargs = JSONField(default=json.dumps({}))
+    PENDING = 0
+    RUNNING = 1
+    FAILED = 2
+    STATUS_TYPE = (
+        (PENDING, 'pending'),
+        (RUNNING, 'running'),
+        (FAILED, 'failed'),
+    )
+    status = models.SmallIntegerField(choices=STATUS_TYPE, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+    # When a pending job should run next. While a job is running, when a worker
+    # can assume the worker that claimed it died and run it again.
+    run_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        index_together = ('status', 'run_at')
+
+    def __unicode__(self):
+        return unicode(self.task)
@@ -0,0 +1,131 @@
+from __future__ import unicode_literals
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+import mock
+import pytz
+from rallytap.apps.jobs import utils
+from rallytap.apps.jobs.models import Job
+
+
+task_calls = []
+
+def mock_task(**kwargs):
+    task_calls.append(kwargs)
+
+def mock_failing_task(**kwargs):
+    raise Exception('Bars are closed.')
+
+
+class JobTests(TestCase):
+
+    def setUp(self):
+        del task_calls[:]
+
+    def test_enqueue(self):
+        task = 'rallytap.apps.jobs.tests.test_utils.mock_task'
+        job = utils.enqueue(task, message='Bars?!?!?!')
+
+        # It should save a pending job.
+        job = Job.objects.get(id=job.id)
+        self.assertEqual(job.task, task)
+        self.assertEqual(job.kwargs, {'message': 'Bars?!?!?!'})
+        self.assertEqual(job.status, Job.PENDING)
+
+        # It shouldn't run the task.
+        self.assertEqual(task_calls, [])
+
+    def test_claim_job(self):
+        job = utils.enqueue('rallytap.apps.jobs.tests.test_utils.mock_task')
+
+        claimed_job = utils.claim_job()
+
+        # It should mark the job as running.
+        self.assertEqual(claimed_job.id, job.id)
+        job = Job.objects.get(id=job.id)
+        self.assertEqual(job.status, Job.RUNNING)
+        self.assertEqual(job.attempts, 1)
+
+        # It shouldn't let another worker claim the job.
+        self.assertIsNone(utils.claim_job())
+
+    def test_claim_job_timed_out(self):
+        # Mock a job whose worker died while running it.
+        job = utils.enqueue('rallytap.apps.jobs.tests.test_utils.mock_task')
+        job.status = Job.RUNNING
+        job.run_at = datetime.now(pytz.utc) - timedelta(seconds=1)
+        job.save()
+
+        # It should claim the job again.
+        claimed_job = utils.claim_job()
+        self.assertEqual(claimed_job.id, job.id)
+
+    def test_claim_job_timed_out_out_of_attempts(self):
+        # Mock a job that killed its worker on its last attempt.
+        job = utils.enqueue('rallytap.apps.jobs.tests.test_utils.mock_task')
+        job.status = Job.RUNNING
+        job.attempts = settings.JOBS_MAX_ATTEMPTS
+        job.run_at = datetime.now(pytz.utc) - timedelta(seconds=1)
+        job.save()
+
+        # It shouldn't claim the job again.
+        self.assertIsNone(utils.claim_job())
+
+        # It should give up on the job.
+        job = Job.objects.get(id=job.id)
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, settings.JOBS_MAX_ATTEMPTS)
+
+    def test_run_job(self):
+        utils.enqueue('rallytap.apps.jobs.tests.test_utils.mock_task',
+                      message='Bars?!?!?!')
+
+        job = utils.claim_job()
+        self.assertTrue(utils.run_job(job))
+
+        # It should run the task.
+        self.assertEqual(task_calls, [{'message': 'Bars?!?!?!'}])
+
+        # It should delete the job.
+        self.assertFalse(Job.objects.filter(id=job.id).exists())
+
+    def test_run_job_error(self):
+        utils.enqueue('rallytap.apps.jobs.tests.test_utils.mock_failing_task')
+
+        job = utils.claim_job()
+        self.assertFalse(utils.run_job(job))
+
+        # It should retry the job later.
+        job = Job.objects.get(id=job.id)
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertGreater(job.run_at, datetime.now(pytz.utc))
+        self.assertIn('Bars are closed.', job.last_error)
+
+    def test_run_job_out_of_attempts(self):
+        job = utils.enqueue(
+                'rallytap.apps.jobs.tests.test_utils.mock_failing_task')
+        job.attempts = settings.JOBS_MAX_ATTEMPTS - 1
+        job.save()
+
+        job = utils.claim_job()
+        utils.run_job(job)
+
+        # It should give up on the job.
+        job = Job.objects.get(id=job.id)
+        self.assertEqual(job.status, Job.FAILED)
+
+    @mock.patch('rallytap.apps.jobs.management.commands.worker.close_old_connections')
+    def test_worker(self, mock_close_old_connections):
+        for message in ['Bars?!?!?!', 'Ball?']:
+            utils.enqueue('rallytap.apps.jobs.tests.test_utils.mock_task',
+                          message=message)
+
+        call_command('worker', burst=True)
+
+        # It should run every job.
+        self.assertEqual(task_calls, [
+            {'message': 'Bars?!?!?!'},
+            {'message': 'Ball?'},
+        ])
+        self.assertFalse(Job.objects.exists())
@@ -0,0 +1,84 @@
+from __future__ import unicode_literals
+from datetime import datetime, timedelta
+import logging
+import traceback
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+import pytz
+from .models import Job
+
+
+def enqueue(task, **kwargs):
+    """
+    Save a job to run `task` (the dotted path to a function) with `kwargs` in
+    a background worker. The kwargs have to be JSON serializable.
+
+    When this gets called inside a transaction, workers won't see the job
+    until the transaction commits.
+    """
+    job = Job(task=task, kwargs=kwargs, run_at=datetime.now(pytz.utc))
+    job.save()
+    return job
+
+
+def claim_job():
+    """
+    Lock the next job that's ready to run, and mark it as running. Return None
+    if there aren't any jobs to run.
+
+    Skip jobs that other workers are claiming, so that workers don't wait on
+    each other for the same job. Running jobs whose timeout has passed get
+    claimed again, in case the worker running them died, unless they're out of
+    attempts. Mark those as failed instead, so that a job that kills its
+    worker doesn't keep taking down workers.
+    """
+    now = datetime.now(pytz.utc)
+    Job.objects.filter(status=Job.RUNNING, run_at__lte=now,
+                       attempts__gte=settings.JOBS_MAX_ATTEMPTS) \
+            .update(status=Job.FAILED, last_error='Timed out.', updated_at=now)
+
+    run_at = now + timedelta(seconds=settings.JOBS_TIMEOUT)
+    # Django 1.8's `select_for_update` doesn't support `SKIP LOCKED`.
+    sql = ('UPDATE {table} SET status = %s, attempts = attempts + 1, '
+           'run_at = %s '
+           'WHERE id = ('
+           'SELECT id FROM {table} '
+           'WHERE status IN (%s, %s) AND run_at <= %s AND attempts < %s '
+           'ORDER BY run_at, id LIMIT 1 '
+           'FOR UPDATE SKIP LOCKED) '
+           'RETURNING *').format(
+                   table=connection.ops.quote_name(Job._meta.db_table))
+    params = [Job.RUNNING, run_at, Job.PENDING, Job.RUNNING, now,
+              settings.JOBS_MAX_ATTEMPTS]
+    with transaction.atomic():
+        jobs = list(Job.objects.raw(sql, params))
+    if len(jobs) == 0:
+        return None
+    return jobs[0]
+
+
+def run_job(job):
+    """
+    Run a claimed job. Delete the job if it succeeds. Otherwise, retry it later
+    with exponential backoff, or mark it as failed once it's out of attempts.
+    """
+    try:
+        task = import_string(job.task)
+        task(**job.kwargs)
+    except Exception:
+        logger = logging.getLogger('console')
+        logger.exception('Job {id} ({task}) failed'.format(id=job.id,
+                                                           task=job.task))
+        job.last_error = traceback.format_exc()
+        if job.attempts < settings.JOBS_MAX_ATTEMPTS:
+            job.status = Job.PENDING
+            delay = timedelta(seconds=2 ** job.attempts * 30)
+            job.run_at = datetime.now(pytz.utc) + delay
+        else:
+            job.status = Job.FAILED
+        job.save()
+        return False
+
+    job.delete()
+    return True
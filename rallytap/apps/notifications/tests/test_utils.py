@@ -2,10 +2,13 @@ from __future__ import unicode_literals
 from django.conf import settings
 from django.test import TestCase
 import mock
+from push_notifications.apns import APNSServerError
 from push_notifications.gcm import GCMError
 from push_notifications.models import APNSDevice, GCMDevice
 from rallytap.apps.auth.models import User, UserPhone
 from rallytap.apps.events.models import Event
+from rallytap.apps.jobs.models import Job
+from rallytap.apps.jobs.utils import claim_job, run_job
 from rallytap.apps.notifications import utils
 
 
@@ -40,26 +43,52 @@ class SendMessageTests(TestCase):
         self.contact_phone = UserPhone(user=self.contact, phone='+12036227310')
         self.contact_phone.save()
 
-    @mock.patch('push_notifications.apns.apns_send_message')
-    @mock.patch('push_notifications.gcm.gcm_send_message')
+    def run_jobs(self):
+        job = claim_job()
+        while job is not None:
+            self.assertTrue(run_job(job))
+            job = claim_job()
+
+    @mock.patch('rallytap.apps.notifications.utils.deliver_message')
+    def test_send_message(self, mock_deliver_message):
+        user_ids = [self.user.id, self.contact.id]
+        message = 'Bars?!?!?!'
+        utils.send_message(user_ids, message)
+
+        # It shouldn't notify the users in the request.
+        self.assertEqual(mock_deliver_message.call_count, 0)
+
+        # It should enqueue a job to notify the users.
+        job = Job.objects.get()
+        self.assertEqual(job.task,
+                         'rallytap.apps.notifications.utils.deliver_message')
+        self.assertEqual(job.kwargs, {
+            'user_ids': user_ids,
+            'message': message,
+            'added_friend': False,
+        })
+
+    @mock.patch('rallytap.apps.notifications.utils.apns_send_bulk_message')
+    @mock.patch('rallytap.apps.notifications.utils.gcm_send_bulk_message')
     @mock.patch('rallytap.apps.notifications.utils.TwilioRestClient')
-    def test_send_message(self, mock_twilio, mock_gcm, mock_apns):
+    def test_deliver_message(self, mock_twilio, mock_gcm, mock_apns):
         # Mock the Twilio SMS API.
         mock_client = mock.MagicMock()
         mock_twilio.return_value = mock_client
 
         user_ids = [self.user.id, self.contact.id]
         message = 'Bars?!?!?!'
-        utils.send_message(user_ids, message)
+        utils.deliver_message(user_ids, message)
+        self.run_jobs()
 
         # It should send push notifications to users with ios devices.
         token = self.ios_device.registration_id
-        mock_apns.assert_any_call(registration_id=token, alert=message, badge=1)
+        mock_apns.assert_any_call([token], message, badge=1)
 
         # It should send push notifications to users with android devices.
         token = self.android_device.registration_id
         data = {'title': 'Rallytap', 'message': message}
-        mock_gcm.assert_any_call(registration_id=token, data=data)
+        mock_gcm.assert_any_call([token], data)
 
         # It should send SMS to users without devices.
         url = 'https://rallytap.com/app'
@@ -70,10 +99,10 @@ class SendMessageTests(TestCase):
                                                        from_=settings.TWILIO_PHONE,
                                                        body=message)
 
-    @mock.patch('push_notifications.apns.apns_send_message')
-    @mock.patch('push_notifications.gcm.gcm_send_message')
+    @mock.patch('rallytap.apps.notifications.utils.apns_send_bulk_message')
+    @mock.patch('rallytap.apps.notifications.utils.gcm_send_bulk_message')
     @mock.patch('rallytap.apps.notifications.utils.TwilioRestClient')
-    def test_send_message_added_friend(self, mock_twilio, mock_gcm, mock_apns):
+    def test_deliver_message_added_friend(self, mock_twilio, mock_gcm, mock_apns):
         # Mock the Twilio SMS API.
         mock_client = mock.MagicMock()
         mock_twilio.return_value = mock_client
@@ -85,16 +114,17 @@ class SendMessageTests(TestCase):
         user_ids = [self.user.id, self.contact.id]
         message = 'Barack Obama (@bobama) added you as a friend!'
         from_user = self.user
-        utils.send_message(user_ids, message, added_friend=True)
+        utils.deliver_message(user_ids, message, added_friend=True)
+        self.run_jobs()
 
         # It should send push notifications to users with ios devices.
         token = self.ios_device.registration_id
-        mock_apns.assert_any_call(registration_id=token, alert=message, badge=1)
+        mock_apns.assert_any_call([token], message, badge=1)
 
         # It should send push notifications to users with android devices.
         token = self.android_device.registration_id
         data = {'title': 'Rallytap', 'message': message}
-        mock_gcm.assert_any_call(registration_id=token, data=data)
+        mock_gcm.assert_any_call([token], data)
 
         # It should send SMS to users without devices.
         message = message[:-1] # remove the exclamation point at the end.
@@ -105,16 +135,101 @@ class SendMessageTests(TestCase):
                                                        from_=settings.TWILIO_PHONE,
                                                        body=message)
 
-    @mock.patch('push_notifications.apns.apns_send_message')
-    @mock.patch('push_notifications.gcm.gcm_send_message')
-    def test_send_message_gcm_error(self, mock_gcm, mock_apns):
+    def test_deliver_message_jobs(self):
+        user_ids = [self.user.id, self.contact.id]
+        message = 'Bars?!?!?!'
+        utils.deliver_message(user_ids, message)
+
+        # It should enqueue a job for each channel, and for each SMS, so that
+        # a failed job doesn't notify the users again when it's retried.
+        tasks = Job.objects.order_by('id').values_list('task', flat=True)
+        self.assertEqual(list(tasks), [
+            'rallytap.apps.notifications.utils.deliver_apns_message',
+            'rallytap.apps.notifications.utils.deliver_gcm_message',
+            'rallytap.apps.notifications.utils.send_sms',
+        ])
+
+    @mock.patch('rallytap.apps.notifications.utils.apns_send_bulk_message')
+    @mock.patch('rallytap.apps.notifications.utils.gcm_send_bulk_message')
+    @mock.patch('rallytap.apps.notifications.utils.TwilioRestClient')
+    def test_deliver_message_gcm_error(self, mock_twilio, mock_gcm, mock_apns):
         # Mock an error when sending an Android device a push notification.
-        mock_gcm.side_effect = GCMError
+        mock_gcm.side_effect = GCMError({
+            'failure': 1,
+            'results': [{'error': 'Unavailable'}],
+        })
 
         user_ids = [self.user.id, self.contact.id]
         message = 'Bars?!?!?!'
-        utils.send_message(user_ids, message)
+        utils.deliver_message(user_ids, message)
+        self.run_jobs()
 
         # It should send push notifications to users with ios devices.
         token = self.ios_device.registration_id
-        mock_apns.assert_any_call(registration_id=token, alert=message, badge=1)
+        mock_apns.assert_any_call([token], message, badge=1)
+
+    @mock.patch('rallytap.apps.notifications.utils.apns_send_bulk_message')
+    def test_send_apns_messages_invalid_token(self, mock_apns):
+        # Mock another iOS device.
+        registration_id = ('2ed202ac08ea9033665e853a3dc8bc4c5e78f7a6cf8d559'
+                           '10df230567037dcc4')
+        other_device = APNSDevice(registration_id=registration_id,
+                                  name='iPhone, 9.0', user=self.user)
+        other_device.save()
+
+        # Mock APNS rejecting the first device's token.
+        mock_apns.side_effect = [APNSServerError(8, 0), None]
+
+        devices = [self.ios_device, other_device]
+        message = 'Bars?!?!?!'
+        results = utils.send_apns_messages(devices, message)
+
+        # It should send the notifications after the rejected one again.
+        self.assertEqual(mock_apns.call_count, 2)
+        mock_apns.assert_any_call([self.ios_device.registration_id,
+                                   other_device.registration_id],
+                                  message, badge=1)
+        mock_apns.assert_any_call([other_device.registration_id], message,
+                                  badge=1)
+
+        # It should return the result for each device.
+        self.assertEqual(results, {
+            self.ios_device.registration_id: 8,
+            other_device.registration_id: None,
+        })
+
+        # It should deactivate the device with the invalid token.
+        ios_device = APNSDevice.objects.get(id=self.ios_device.id)
+        self.assertFalse(ios_device.active)
+        other_device = APNSDevice.objects.get(id=other_device.id)
+        self.assertTrue(other_device.active)
+
+    @mock.patch('rallytap.apps.notifications.utils.gcm_send_bulk_message')
+    def test_send_gcm_messages_batches(self, mock_gcm):
+        # Mock more Android devices than GCM accepts in a single request.
+        devices = [GCMDevice(registration_id='token{}'.format(i))
+                   for i in xrange(utils.GCM_MAX_RECIPIENTS + 1)]
+        def mock_send(registration_ids, data):
+            return {
+                'failure': 0,
+                'results': [{'message_id': '1'} for _ in registration_ids],
+            }
+        mock_gcm.side_effect = mock_send
+
+        message = 'Bars?!?!?!'
+        results = utils.send_gcm_messages(devices, message)
+
+        # It should send the notifications in two requests.
+        self.assertEqual(mock_gcm.call_count, 2)
+        data = {'title': 'Rallytap', 'message': message}
+        registration_ids = [device.registration_id for device in devices]
+        mock_gcm.assert_any_call(registration_ids[:utils.GCM_MAX_RECIPIENTS],
+                                 data)
+        mock_gcm.assert_any_call(registration_ids[utils.GCM_MAX_RECIPIENTS:],
+                                 data)
+
+        # It should return the result for each device.
+        self.assertEqual(results, {
+            registration_id: None
+            for registration_id in registration_ids
+        })
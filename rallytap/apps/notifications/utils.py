@@ -1,40 +1,129 @@
 from __future__ import unicode_literals
 from django.conf import settings
-from push_notifications.gcm import GCMError
+from django.db import transaction
+from push_notifications.apns import APNSServerError, apns_send_bulk_message
+from push_notifications.gcm import GCMError, gcm_send_bulk_message
 from push_notifications.models import APNSDevice, GCMDevice
 from twilio.rest import TwilioRestClient
 from rallytap.apps.auth.models import UserPhone
+from rallytap.apps.jobs.utils import enqueue
+from rallytap.apps.utils.profiling import profile_http
 
-def send_message(user_ids, message, added_friend=False):
-    # Notify users with iOS devices.
-    apnsdevices = APNSDevice.objects.filter(user_id__in=user_ids)
-    for device in apnsdevices:
-        device.send_message(message, badge=1)
+# The APNS status code for an invalid device token.
+APNS_INVALID_TOKEN = 8
+# The max number of registration ids GCM accepts in a single request.
+GCM_MAX_RECIPIENTS = 1000
 
-    # Notify users with Android devices.
-    gcmdevices = GCMDevice.objects.filter(user_id__in=user_ids)
-    extra = {'title': 'Rallytap', 'message': message}
-    for device in gcmdevices:
-        try:
-            device.send_message(None, extra=extra)
-        except GCMError:
-            continue
+def send_message(user_ids, message, added_friend=False):
+    """
+    Enqueue a job to notify the users, so that the request doesn't have to wait
+    on APNS, GCM, or Twilio.
+    """
+    enqueue('rallytap.apps.notifications.utils.deliver_message',
+            user_ids=list(user_ids), message=message, added_friend=added_friend)
 
+def deliver_message(user_ids, message, added_friend=False):
+    """
+    Enqueue a job to notify the users over each channel, and a job for each
+    SMS, so that retrying a failed job doesn't notify users who already got
+    the message.
+    """
     url = 'https://rallytap.com/app'
     if added_friend:
         # The message is a notification that the user added a contact as a friend
         # on rallytap. Include a link to the app.
-        message = message[:-1] # remove the exclamation point at the end.
-        message = '{message} on Rallytap! - {url}'.format(message=message, url=url)
+        sms_message = message[:-1] # remove the exclamation point at the end.
+        sms_message = '{message} on Rallytap! - {url}'.format(
+                message=sms_message, url=url)
     else:
         footer = '\n--\nDownload Rallytap to reply - {url}'.format(url=url)
-        message = '{message}{footer}'.format(message=message, footer=footer)
+        sms_message = '{message}{footer}'.format(message=message,
+                                                 footer=footer)
 
     # Notify users who were added from contacts.
+    phones = UserPhone.objects.filter(user_id__in=user_ids,
+                                      user__username__isnull=True) \
+            .values_list('phone', flat=True)
+
+    with transaction.atomic():
+        # Notify users with iOS devices.
+        enqueue('rallytap.apps.notifications.utils.deliver_apns_message',
+                user_ids=list(user_ids), message=message)
+
+        # Notify users with Android devices.
+        enqueue('rallytap.apps.notifications.utils.deliver_gcm_message',
+                user_ids=list(user_ids), message=message)
+
+        for phone in phones:
+            enqueue('rallytap.apps.notifications.utils.send_sms',
+                    phone=unicode(phone), message=sms_message)
+
+def deliver_apns_message(user_ids, message):
+    apnsdevices = APNSDevice.objects.filter(user_id__in=user_ids, active=True)
+    send_apns_messages(apnsdevices, message)
+
+def deliver_gcm_message(user_ids, message):
+    gcmdevices = GCMDevice.objects.filter(user_id__in=user_ids, active=True)
+    send_gcm_messages(gcmdevices, message)
+
+def send_sms(phone, message):
     client = TwilioRestClient(settings.TWILIO_ACCOUNT, settings.TWILIO_TOKEN)
-    userphones = UserPhone.objects.filter(user_id__in=user_ids,
-                                          user__username__isnull=True)
-    for userphone in userphones:
-        phone = unicode(userphone.phone)
+    with profile_http('twilio'):
         client.messages.create(to=phone, from_=settings.TWILIO_PHONE,
                                body=message)
+
+def send_apns_messages(devices, message):
+    """
+    Send the message to every APNS device over a single connection. Return a
+    dict mapping each device's registration id to None if the notification was
+    sent, or to the error APNS responded with.
+
+    Deactivate devices with invalid tokens.
+    """
+    registration_ids = [device.registration_id for device in devices]
+    results = {registration_id: None for registration_id in registration_ids}
+
+    # APNS closes the connection after the first notification it rejects, and
+    # drops every notification we sent after it. Send the rest again starting
+    # after the rejected one.
+    start = 0
+    while start < len(registration_ids):
+        try:
+            with profile_http('apns'):
+                apns_send_bulk_message(registration_ids[start:], message,
+                                       badge=1)
+            break
+        except APNSServerError as e:
+            index = start + e.identifier
+            results[registration_ids[index]] = e.status
+            start = index + 1
+
+    invalid_ids = [registration_id
+                   for registration_id, status in results.items()
+                   if status == APNS_INVALID_TOKEN]
+    if invalid_ids:
+        APNSDevice.objects.filter(registration_id__in=invalid_ids) \
+                .update(active=False)
+    return results
+
+def send_gcm_messages(devices, message):
+    """
+    Send the message to every GCM device in batches of up to 1000 devices per
+    request. Return a dict mapping each device's registration id to None if
+    the notification was sent, or to the error GCM responded with.
+
+    push_notifications deactivates devices that aren't registered anymore.
+    """
+    registration_ids = [device.registration_id for device in devices]
+    results = {}
+    extra = {'title': 'Rallytap', 'message': message}
+    for start in xrange(0, len(registration_ids), GCM_MAX_RECIPIENTS):
+        batch = registration_ids[start:start+GCM_MAX_RECIPIENTS]
+        try:
+            with profile_http('gcm'):
+                response = gcm_send_bulk_message(batch, extra)
+        except GCMError as e:
+            response = e.args[0]
+        for registration_id, result in zip(batch, response['results']):
+            results[registration_id] = result.get('error')
+    return results
@@ -0,0 +1,12 @@
+from __future__ import unicode_literals
+from django.apps import AppConfig
+
+class UtilsConfig(AppConfig):
+    name = 'rallytap.apps.utils'
+    verbose_name = 'Rallytap utils'
+
+    def ready(self):
+        # Register the `near` lookup on geometry fields.
+        from django.contrib.gis.db.models import GeometryField
+        from .lookups import NearLookup
+        GeometryField.register_lookup(NearLookup)
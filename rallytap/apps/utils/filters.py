@@ -2,6 +2,7 @@ from __future__ import unicode_literals
 from datetime import datetime
 from django_filters import Filter, FilterSet, CharFilter
 import pytz
+from rest_framework.exceptions import ParseError
 
 
 class IgnoreCaseCharFilter(CharFilter):
@@ -28,6 +29,15 @@ class UnixEpochDateFilter(Filter):
         if not value:
             return qs
 
-        # Convert the value to a Python datetime object.
-        value = datetime.utcfromtimestamp(int(value)).replace(tzinfo=pytz.utc)
+        value = self.to_datetime(value)
         return super(UnixEpochDateFilter, self).filter(qs, value)
+
+    def to_datetime(self, value):
+        """
+        Convert the unix timestamp to a Python datetime object.
+        """
+        try:
+            return datetime.utcfromtimestamp(int(value)) \
+                    .replace(tzinfo=pytz.utc)
+        except (ValueError, OverflowError):
+            raise ParseError('Invalid timestamp: {}'.format(value))
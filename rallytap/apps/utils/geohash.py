@@ -0,0 +1,81 @@
+from __future__ import unicode_literals
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS = 6371009 # meters
+MAX_PRECISION = 12
+
+
+def encode(lat, lng, precision):
+    """
+    Return the geohash of the given coordinates with `precision` characters.
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    num_bits = 0
+    is_lng = True
+    while len(geohash) < precision:
+        if is_lng:
+            value, value_range = lng, lng_range
+        else:
+            value, value_range = lat, lat_range
+        mid = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            value_range[0] = mid
+        else:
+            value_range[1] = mid
+        is_lng = not is_lng
+
+        num_bits += 1
+        if num_bits == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            num_bits = 0
+    return ''.join(geohash)
+
+
+def bounds(geohash):
+    """
+    Return the `(south, west, north, east)` bounds of the geohash's cell.
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    is_lng = True
+    for char in geohash:
+        bits = BASE32.index(char)
+        for shift in xrange(4, -1, -1):
+            value_range = lng_range if is_lng else lat_range
+            mid = (value_range[0] + value_range[1]) / 2
+            if bits >> shift & 1:
+                value_range[0] = mid
+            else:
+                value_range[1] = mid
+            is_lng = not is_lng
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def distance(lat1, lng1, lat2, lng2):
+    """
+    Return the great-circle distance in meters between two coordinates.
+    """
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(a)))
+
+
+def get_precision(meters):
+    """
+    Return the smallest number of characters whose cells at the equator are at
+    most `meters` wide and tall.
+    """
+    for precision in xrange(1, MAX_PRECISION+1):
+        south, west, north, east = bounds('0' * precision)
+        if max(distance(0, 0, north - south, 0),
+               distance(0, 0, 0, east - west)) <= meters:
+            return precision
+    return MAX_PRECISION
@@ -0,0 +1,37 @@
+from __future__ import unicode_literals
+from django.conf import settings
+from django.contrib.gis.geos import GEOSGeometry
+from django.db.models import Lookup
+
+
+class NearLookup(Lookup):
+    """
+    Filter points that are within a distance in meters of a point, e.g.
+    `location__near=point`, or `location__near=(point, meters)`. The distance
+    defaults to `NEARBY_DISTANCE`.
+
+    We store points as `POINT(lat lng)`, so flip the coordinates before casting
+    them to geography. The expression matches the GiST indexes on
+    `geography(ST_FlipCoordinates(<column>))`, so the lookup is an index scan.
+    """
+    lookup_name = 'near'
+
+    def get_prep_lookup(self):
+        if isinstance(self.rhs, (list, tuple)):
+            point, distance = self.rhs
+        else:
+            point, distance = self.rhs, settings.NEARBY_DISTANCE
+        if not isinstance(point, GEOSGeometry):
+            point = GEOSGeometry(point)
+        if point.srid is None:
+            point = point.clone()
+            point.srid = self.lhs.output_field.srid
+        return point, distance
+
+    def as_sql(self, compiler, connection):
+        lhs, params = self.process_lhs(compiler, connection)
+        point, distance = self.rhs
+        params.extend([connection.ops.Adapter(point), distance])
+        sql = ('ST_DWithin(geography(ST_FlipCoordinates({lhs})), '
+               'geography(ST_FlipCoordinates(%s)), %s)').format(lhs=lhs)
+        return sql, params
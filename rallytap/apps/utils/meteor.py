@@ -0,0 +1,101 @@
+from __future__ import unicode_literals
+from datetime import timedelta
+import json
+from django.conf import settings
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3 import Retry
+from .exceptions import ServiceUnavailable
+from .profiling import profile_http
+
+_session = None
+
+
+def get_session():
+    """
+    Return the session shared by every request to the meteor server, so that
+    requests reuse pooled keep-alive connections instead of opening a new
+    connection each time.
+    """
+    global _session
+    if _session is None:
+        # Only retry failed connections. The request never reached the meteor
+        # server, so it's safe to send a POST again.
+        retries = Retry(total=settings.METEOR_MAX_RETRIES,
+                        connect=settings.METEOR_MAX_RETRIES, read=False,
+                        backoff_factor=settings.METEOR_BACKOFF_FACTOR)
+        adapter = HTTPAdapter(pool_maxsize=settings.METEOR_POOL_SIZE,
+                              max_retries=retries)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _session = session
+    return _session
+
+def post(path, data):
+    """
+    POST the data as JSON to the meteor server, and return the response.
+    """
+    url = '{meteor_url}{path}'.format(meteor_url=settings.METEOR_URL,
+                                      path=path)
+    auth_header = 'Token {api_key}'.format(api_key=settings.METEOR_KEY)
+    headers = {
+        'Authorization': auth_header,
+        'Content-Type': 'application/json',
+    }
+    with profile_http('meteor'):
+        return get_session().post(url, data=json.dumps(data), headers=headers,
+                                  timeout=settings.METEOR_TIMEOUT)
+
+def meteor_login(token):
+    """
+    Authenticate the user on the meteor server.
+    """
+    data = {
+        'user_id': token.user_id,
+        'password': token.key,
+    }
+    try:
+        response = post('/users', data)
+    except requests.exceptions.RequestException as e:
+        raise ServiceUnavailable(unicode(e))
+    if response.status_code != 200:
+        error_msg = '{status} response from the meteor server'.format(
+                status=response.status_code)
+        raise ServiceUnavailable(error_msg)
+
+def expire_chats(event_ids):
+    """
+    Delete the events' chats on the meteor server.
+    """
+    try:
+        response = post('/events/expired', {'event_ids': list(event_ids)})
+    except requests.exceptions.RequestException as e:
+        raise ServiceUnavailable(unicode(e))
+    if response.status_code != 200:
+        error_msg = '{status} response from the meteor server'.format(
+                status=response.status_code)
+        raise ServiceUnavailable(error_msg)
+
+def add_members(event, user_ids):
+    """
+    Add the users to the event's chat on the meteor server. `user_ids` can be
+    a single user id, or a list of user ids.
+
+    The meteor server adds one member per request, so send every request over
+    the same pooled connection.
+    """
+    if not isinstance(user_ids, (list, tuple, set)):
+        user_ids = [user_ids]
+
+    path = '/events/{event_id}/members'.format(event_id=event.id)
+    if event.datetime is not None:
+        twenty_four_hrs_later = event.datetime + timedelta(hours=24)
+    else:
+        twenty_four_hrs_later = event.created_at + timedelta(hours=24)
+    for user_id in user_ids:
+        response = post(path, {
+            'user_id': user_id,
+            'expires_at': twenty_four_hrs_later.isoformat(),
+        })
+        response.raise_for_status()
@@ -0,0 +1,32 @@
+from __future__ import unicode_literals
+from django.db import migrations
+
+
+class RunSQLOutsideTransaction(migrations.RunSQL):
+    """
+    Run SQL that Postgres won't run inside a transaction, like
+    `CREATE INDEX CONCURRENTLY`.
+
+    Django 1.8 runs every migration inside a transaction, so commit the
+    migration's transaction before running the SQL, and start a new one after.
+    Put these operations in their own migration, since the operations before
+    them are committed even if the SQL fails.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        schema_editor.execute('COMMIT')
+        try:
+            super(RunSQLOutsideTransaction, self).database_forwards(
+                    app_label, schema_editor, from_state, to_state)
+        finally:
+            schema_editor.execute('BEGIN')
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        schema_editor.execute('COMMIT')
+        try:
+            super(RunSQLOutsideTransaction, self).database_backwards(
+                    app_label, schema_editor, from_state, to_state)
+        finally:
+            schema_editor.execute('BEGIN')
@@ -0,0 +1,132 @@
+from __future__ import unicode_literals
+import calendar
+from datetime import datetime
+from django.conf import settings
+from django.db.models import Q
+from hashids import Hashids
+import pytz
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate a queryset from newest to oldest by `(created_at, id)`.
+
+    Only paginate when the client sends a `limit`. The cursor for the next page
+    is the `created_at` and `id` of the last object on the current page, so
+    every page is a range scan no matter how deep into the results it is.
+
+    Set `created_at_field` to paginate by a different datetime field.
+    """
+    limit_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    max_limit = 100
+    created_at_field = 'created_at'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            created_at, id = self.decode_cursor(encoded)
+            field = self.created_at_field
+            queryset = queryset.filter(
+                    Q(**{field + '__lt': created_at}) |
+                    Q(**{field: created_at, 'id__lt': id}))
+
+        # Fetch an extra object to find out whether there's a next page.
+        results = list(queryset.order_by('-' + self.created_at_field, '-id') \
+                [:self.limit+1])
+        self.page = results[:self.limit]
+        if len(results) > self.limit:
+            self.next_cursor = self.encode_cursor(self.page[-1])
+        else:
+            self.next_cursor = None
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.next_cursor,
+            'results': data,
+        })
+
+    def get_limit(self, request):
+        limit = request.query_params.get(self.limit_query_param)
+        if limit is None:
+            return None
+
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ParseError('Invalid limit: {}'.format(limit))
+        if limit < 1:
+            raise ParseError('Invalid limit: {}'.format(limit))
+        return min(limit, self.max_limit)
+
+    def encode_cursor(self, obj):
+        hashids = Hashids(salt=settings.HASHIDS_SALT)
+        created_at = getattr(obj, self.created_at_field)
+        seconds = calendar.timegm(created_at.utctimetuple())
+        return hashids.encode(seconds, created_at.microsecond, obj.id)
+
+    def decode_cursor(self, encoded):
+        hashids = Hashids(salt=settings.HASHIDS_SALT)
+        try:
+            seconds, microseconds, id = hashids.decode(encoded)
+        except ValueError:
+            raise NotFound('Invalid cursor')
+        created_at = datetime.utcfromtimestamp(seconds).replace(
+                microsecond=microseconds, tzinfo=pytz.utc)
+        return created_at, id
+
+
+class DateJoinedPagination(KeysetPagination):
+    """
+    Paginate users from the most to the least recently joined.
+    """
+    created_at_field = 'date_joined'
+
+
+class RankPagination(KeysetPagination):
+    """
+    Paginate a list of `(rank, item)` tuples from lowest to highest rank, where
+    each rank is a unique tuple of non-negative integers.
+
+    Only paginate when the client sends a `limit`. The cursor for the next page
+    is the rank of the last item on the current page.
+    """
+
+    def paginate_queryset(self, ranked_items, request, view=None):
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        ranked_items = sorted(ranked_items, key=lambda ranked_item: ranked_item[0])
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            cursor = self.decode_cursor(encoded)
+            ranked_items = [(rank, item) for rank, item in ranked_items
+                            if rank > cursor]
+
+        page = ranked_items[:self.limit]
+        if len(ranked_items) > self.limit:
+            self.next_cursor = self.encode_cursor(page[-1][0])
+        else:
+            self.next_cursor = None
+        self.page = [item for rank, item in page]
+        return self.page
+
+    def encode_cursor(self, rank):
+        hashids = Hashids(salt=settings.HASHIDS_SALT)
+        return hashids.encode(*rank)
+
+    def decode_cursor(self, encoded):
+        hashids = Hashids(salt=settings.HASHIDS_SALT)
+        rank = hashids.decode(encoded)
+        if not rank:
+            raise NotFound('Invalid cursor')
+        return rank
@@ -0,0 +1,71 @@
+from __future__ import unicode_literals
+from collections import defaultdict
+from contextlib import contextmanager
+import threading
+import time
+
+_local = threading.local()
+
+
+class Profile(object):
+    """
+    The time a request spent on external HTTP calls, grouped by service, on
+    serializing its response's data, and on rendering its response.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.http_times = defaultdict(float)
+        self.serialization_time = 0.0
+        self.render_time = 0.0
+
+
+def start_profile():
+    _local.profile = Profile()
+    return _local.profile
+
+def end_profile():
+    profile = get_profile()
+    _local.profile = None
+    return profile
+
+def get_profile():
+    """
+    Return the profile for the current thread's request, or `None` if the
+    request isn't being profiled.
+    """
+    return getattr(_local, 'profile', None)
+
+@contextmanager
+def profile_http(service):
+    """
+    Add the time spent in the block to the current request's time calling the
+    service. Do nothing if the request isn't being profiled.
+    """
+    profile = get_profile()
+    if profile is None:
+        yield
+        return
+
+    started_at = time.time()
+    try:
+        yield
+    finally:
+        profile.http_times[service] += time.time() - started_at
+
+@contextmanager
+def profile_serialization():
+    """
+    Add the time spent in the block to the current request's time serializing
+    its response's data. Do nothing if the request isn't being profiled.
+    """
+    profile = get_profile()
+    if profile is None:
+        yield
+        return
+
+    started_at = time.time()
+    try:
+        yield
+    finally:
+        profile.serialization_time += time.time() - started_at
@@ -0,0 +1,26 @@
+from __future__ import unicode_literals
+from django.test import TestCase
+from rallytap.apps.utils import geohash
+
+
+class GeohashTests(TestCase):
+
+    def test_encode(self):
+        self.assertEqual(geohash.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_bounds(self):
+        south, west, north, east = geohash.bounds('u4pruydqqvj')
+
+        # The cell should contain the encoded coordinates.
+        self.assertTrue(south <= 57.64911 <= north)
+        self.assertTrue(west <= 10.40744 <= east)
+
+    def test_distance(self):
+        # One degree of latitude is about 111 km.
+        meters = geohash.distance(40, -74, 41, -74)
+        self.assertAlmostEqual(meters, 111195, delta=1)
+
+    def test_get_precision(self):
+        # Five characters is about 4.9 km by 4.9 km at the equator.
+        self.assertEqual(geohash.get_precision(8046), 5)
+        self.assertEqual(geohash.get_precision(4000), 6)
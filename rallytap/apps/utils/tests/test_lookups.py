@@ -0,0 +1,44 @@
+from __future__ import unicode_literals
+from django.contrib.gis.geos import Point
+from django.test import TestCase
+from rallytap.apps.auth.models import User
+
+
+class NearLookupTests(TestCase):
+
+    def setUp(self):
+        # Points are stored as (lat, lng).
+        self.center = Point(40.6898319, -73.9904645)
+
+        # Mock a user who's about 15 km north of the center.
+        self.nearby_user = User(location=Point(40.8248319, -73.9904645))
+        self.nearby_user.save()
+
+        # Mock a user who's about 20 km north of the center.
+        self.far_user = User(location=Point(40.8698319, -73.9904645))
+        self.far_user.save()
+
+    def test_near(self):
+        users = User.objects.filter(location__near=self.center)
+
+        # It should only return users within 10 miles.
+        self.assertEqual(list(users), [self.nearby_user])
+
+    def test_near_distance(self):
+        users = User.objects.filter(location__near=(self.center, 25000)) \
+                .order_by('id')
+
+        # It should return users within the given number of meters.
+        self.assertEqual(list(users), [self.nearby_user, self.far_user])
+
+    def test_near_high_latitude(self):
+        # Mock a user about 15 km east of a point in Oslo. That's more than
+        # the number of degrees in 10 miles at the equator.
+        center = Point(59.9138688, 10.7522454)
+        user = User(location=Point(59.9138688, 11.0222454))
+        user.save()
+
+        users = User.objects.filter(location__near=center)
+
+        # It should measure the distance on the earth's surface.
+        self.assertEqual(list(users), [user])
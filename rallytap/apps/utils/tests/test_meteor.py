@@ -0,0 +1,148 @@
+from __future__ import unicode_literals
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from datetime import timedelta
+import json
+from SocketServer import ThreadingMixIn
+import threading
+import time
+from django.conf import settings
+from django.test import TestCase
+from django.test.utils import override_settings
+import requests
+from rest_framework.authtoken.models import Token
+from rallytap.apps.auth.models import User
+from rallytap.apps.events.models import Event
+from rallytap.apps.utils import meteor
+from rallytap.apps.utils.exceptions import ServiceUnavailable
+
+
+class StubMeteorHandler(BaseHTTPRequestHandler):
+    # Keep connections alive between requests.
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        self.server.requests.append({
+            'path': self.path,
+            'body': json.loads(self.rfile.read(length)),
+            'headers': dict(self.headers),
+            'client_address': self.client_address,
+        })
+        time.sleep(self.server.delay)
+
+        self.send_response(self.server.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubMeteorServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubMeteorHandler)
+        self.requests = []
+        self.status = 200
+        self.delay = 0
+
+
+class MeteorClientTests(TestCase):
+
+    def setUp(self):
+        # Run a stub meteor server.
+        self.server = StubMeteorServer()
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        meteor_url = 'http://127.0.0.1:{port}'.format(
+                port=self.server.server_address[1])
+        self.settings_override = override_settings(METEOR_URL=meteor_url,
+                                                   METEOR_TIMEOUT=(1, 0.5))
+        self.settings_override.enable()
+
+        self.user = User(name='Barack Obama')
+        self.user.save()
+        self.event = Event(title='breaking it down', creator=self.user)
+        self.event.save()
+
+    def tearDown(self):
+        # Close the pooled connections to the stub server.
+        meteor.get_session().close()
+        self.settings_override.disable()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_meteor_login(self):
+        token = Token(user=self.user)
+        token.save()
+
+        meteor.meteor_login(token)
+
+        # It should authenticate the user on the meteor server.
+        request = self.server.requests[0]
+        self.assertEqual(request['path'], '/users')
+        self.assertEqual(request['body'], {
+            'user_id': self.user.id,
+            'password': token.key,
+        })
+        auth_header = 'Token {api_key}'.format(api_key=settings.METEOR_KEY)
+        self.assertEqual(request['headers']['authorization'], auth_header)
+
+    def test_meteor_login_timeout(self):
+        token = Token(user=self.user)
+        token.save()
+
+        # Mock the meteor server taking too long to respond.
+        self.server.delay = 1
+
+        with self.assertRaises(ServiceUnavailable):
+            meteor.meteor_login(token)
+
+    def test_add_members_batch(self):
+        friend = User(name='Joe Biden')
+        friend.save()
+
+        meteor.add_members(self.event, [self.user.id, friend.id])
+
+        # It should add each user to the event's chat.
+        path = '/events/{event_id}/members'.format(event_id=self.event.id)
+        twenty_four_hrs_later = self.event.created_at + timedelta(hours=24)
+        self.assertEqual(self.server.requests[0]['path'], path)
+        self.assertEqual([request['body'] for request in self.server.requests], [
+            {
+                'user_id': self.user.id,
+                'expires_at': twenty_four_hrs_later.isoformat(),
+            },
+            {
+                'user_id': friend.id,
+                'expires_at': twenty_four_hrs_later.isoformat(),
+            },
+        ])
+
+        # It should send both requests over the same connection.
+        client_addresses = set(request['client_address']
+                               for request in self.server.requests)
+        self.assertEqual(len(client_addresses), 1)
+
+    def test_add_members_bad_response(self):
+        self.server.status = 500
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            meteor.add_members(self.event, self.user.id)
+
+    def test_expire_chats(self):
+        meteor.expire_chats([self.event.id])
+
+        # It should delete the events' chats in a single request.
+        self.assertEqual(len(self.server.requests), 1)
+        request = self.server.requests[0]
+        self.assertEqual(request['path'], '/events/expired')
+        self.assertEqual(request['body'], {'event_ids': [self.event.id]})
+
+    def test_expire_chats_bad_response(self):
+        self.server.status = 500
+
+        with self.assertRaises(ServiceUnavailable):
+            meteor.expire_chats([self.event.id])
@@ -1,2 +1,136 @@
-from rest_framework.test import APITestCase
+from __future__ import unicode_literals
+import json
+import logging
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+import mock
 from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from rallytap.apps.auth.models import User
+from rallytap.middleware import format_request_log, redact
+from rallytap.apps.utils.profiling import (
+    end_profile,
+    get_profile,
+    profile_http,
+    profile_serialization,
+    start_profile,
+)
+
+
+class ProfilingMiddlewareTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+
+        # Mock the user.
+        self.user = User(name='Alan Tdog Turing', username='tdog')
+        self.user.save()
+
+        # Authorize the requests with the user's token.
+        self.token = Token(user=self.user)
+        self.token.save()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+        # Save URLs.
+        self.me_url = reverse('user-me')
+        self.saved_events_url = reverse('user-saved-events')
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    @mock.patch.object(logging.getLogger('profiling'), 'info')
+    def test_profile(self, mock_info):
+        response = self.client.get(self.me_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should add the stats to the response's headers.
+        self.assertGreater(int(response['X-Profile-Queries']), 0)
+        for header in ('X-Profile-DB-Time', 'X-Profile-HTTP-Time',
+                       'X-Profile-Serialization-Time', 'X-Profile-Render-Time',
+                       'X-Profile-Time'):
+            self.assertGreaterEqual(int(response[header]), 0)
+
+        # It should log the stats.
+        self.assertEqual(mock_info.call_count, 1)
+
+        # It should stop profiling after the request.
+        self.assertIsNone(get_profile())
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        response = self.client.get(self.me_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It shouldn't profile the request.
+        self.assertFalse(response.has_header('X-Profile-Time'))
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    @mock.patch('rallytap.apps.utils.profiling.time')
+    def test_profile_serialization(self, mock_time):
+        # Starting the profile, then starting and ending serialization.
+        mock_time.time.side_effect = [0.0, 1.0, 1.25]
+        response = self.client.get(self.saved_events_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # It should record the time the view spent serializing the saved
+        # events.
+        self.assertEqual(response['X-Profile-Serialization-Time'], '250')
+
+    @mock.patch('rallytap.apps.utils.profiling.time')
+    def test_profile_serialization_adds_time(self, mock_time):
+        mock_time.time.side_effect = [0.0, 1.0, 1.5, 2.0, 4.5]
+        profile = start_profile()
+        try:
+            with profile_serialization():
+                pass
+            with profile_serialization():
+                pass
+        finally:
+            end_profile()
+
+        # It should add up the time spent in each block.
+        self.assertEqual(profile.serialization_time, 3.0)
+
+    def test_profile_http_not_profiled(self):
+        # It should do nothing when the request isn't being profiled.
+        with profile_http('meteor'):
+            pass
+        self.assertIsNone(get_profile())
+
+    def test_profile_serialization_not_profiled(self):
+        # It should do nothing when the request isn't being profiled.
+        with profile_serialization():
+            pass
+        self.assertIsNone(get_profile())
+
+
+class RequestLogTests(TestCase):
+
+    def test_redact(self):
+        token = 'a' * 40
+        data = {
+            'phone': '+19178699626',
+            'friends': [{'name': '+14388843460'}],
+            'text': 'My token is {token}'.format(token=token),
+        }
+
+        # It should redact the phone numbers and tokens.
+        self.assertEqual(redact(data), {
+            'phone': '[redacted]',
+            'friends': [{'name': '[redacted]'}],
+            'text': 'My token is [redacted]',
+        })
+
+    @override_settings(REQUEST_LOG_MAX_BODY_SIZE=10)
+    def test_format_truncates_bodies(self):
+        entry = {
+            'method': 'GET',
+            'path': '/api/users/me/',
+            'response': '{"name": "Alan Tdog Turing"}',
+        }
+
+        # It should cap the size of the response content.
+        line = json.loads(format_request_log(entry))
+        self.assertEqual(line['response'], '{"name": "... (28 chars)')
+        self.assertEqual(line['path'], entry['path'])
@@ -7,14 +7,18 @@ from django.utils import timezone
 import httpretty
 import requests
 from rest_framework import status
-from rallytap.apps.auth.models import User
+from rallytap.apps.auth.models import User, UserPhone
 from rallytap.apps.events.models import Event
-from ..utils import add_members
+from .. import meteor
+from ..utils import add_members, bulk_create_returning
 
 
 class MeteorTests(TestCase):
 
     def setUp(self):
+        # Don't reuse connections that were opened while httpretty was enabled.
+        self.addCleanup(meteor.get_session().close)
+
         # Save re-used data.
         self.user = User(name='Barack Obama', first_name='Barack',
                          last_name='Obama', image_url='http:/facebook.com/img/prez')
@@ -73,3 +77,34 @@ class MeteorTests(TestCase):
 
         with self.assertRaises(requests.exceptions.HTTPError):
             add_members(self.event, self.user.id)
+
+
+class BulkCreateReturningTests(TestCase):
+
+    def test_bulk_create_returning(self):
+        users = [
+            User(name='Barack Obama', location='POINT(40.7545645 -73.9813595)'),
+            User(name='Joe Biden'),
+        ]
+        bulk_create_returning(users)
+
+        # It should set the users' ids.
+        for user in users:
+            self.assertEqual(User.objects.get(id=user.id).name, user.name)
+        self.assertEqual(User.objects.get(id=users[0].id).location,
+                         users[0].location)
+
+        # It should be able to create objects that reference the users.
+        userphones = [UserPhone(user=users[0], phone='+12036227310')]
+        bulk_create_returning(userphones)
+        self.assertEqual(UserPhone.objects.get(id=userphones[0].id).user_id,
+                         users[0].id)
+
+    def test_bulk_create_returning_batches(self):
+        users = [User(name='User {}'.format(i)) for i in xrange(5)]
+        bulk_create_returning(users, batch_size=2)
+
+        # It should set every user's id.
+        self.assertEqual(len(set(user.id for user in users)), 5)
+        self.assertEqual(User.objects.filter(id__in=[user.id for user in users])
+                         .count(), 5)
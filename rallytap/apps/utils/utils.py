@@ -1,25 +1,86 @@
 from __future__ import unicode_literals
-from datetime import timedelta
-import json
-from django.conf import settings
-import requests
-
-
-def add_members(event, user_id):
-    url = '{meteor_url}/events/{event_id}/members'.format(
-            meteor_url=settings.METEOR_URL, event_id=event.id)
-    if event.datetime is not None:
-        twenty_four_hrs_later = event.datetime + timedelta(hours=24)
-    else:
-        twenty_four_hrs_later = event.created_at + timedelta(hours=24)
-    data = json.dumps({
-        'user_id': user_id,
-        'expires_at': twenty_four_hrs_later.isoformat(),
-    })
-    auth_header = 'Token {api_key}'.format(api_key=settings.METEOR_KEY)
-    headers = {
-        'Authorization': auth_header,
-        'Content-Type': 'application/json',
-    }
-    response = requests.post(url, data=data, headers=headers)
-    response.raise_for_status()
+import time
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import AutoField
+from django.db.models.sql import InsertQuery
+from .meteor import add_members
+
+
+def bulk_create_returning(objs, batch_size=1000):
+    """
+    Insert the objects with multi-row `INSERT ... RETURNING id` statements, and
+    set each object's id.
+
+    Django's `bulk_create` doesn't set ids on Postgres, and it inserts rows one
+    at a time for models with geo fields.
+    """
+    if len(objs) == 0:
+        return objs
+
+    model = objs[0].__class__
+    opts = model._meta
+    using = router.db_for_write(model)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    fields = [field for field in opts.concrete_fields
+              if not isinstance(field, AutoField)]
+    # The insert compiler knows which placeholders geo fields need.
+    compiler = InsertQuery(model).get_compiler(using=using)
+    columns = ', '.join(qn(field.column) for field in fields)
+
+    with transaction.atomic(using=using, savepoint=False):
+        with connection.cursor() as cursor:
+            for start in xrange(0, len(objs), batch_size):
+                batch = objs[start:start+batch_size]
+                rows = []
+                params = []
+                for obj in batch:
+                    values = [field.get_db_prep_save(field.pre_save(obj, True),
+                                                     connection=connection)
+                              for field in fields]
+                    placeholders = [compiler.placeholder(field, value)
+                                    for field, value in zip(fields, values)]
+                    rows.append('({})'.format(', '.join(placeholders)))
+                    params.extend(values)
+                sql = 'INSERT INTO {table} ({columns}) VALUES {rows} ' \
+                      'RETURNING {pk}'.format(table=qn(opts.db_table),
+                                              columns=columns,
+                                              rows=', '.join(rows),
+                                              pk=qn(opts.pk.column))
+                cursor.execute(sql, params)
+
+                # Postgres returns the ids in the order the rows were inserted.
+                for obj, (pk,) in zip(batch, cursor.fetchall()):
+                    obj.pk = pk
+                    obj._state.adding = False
+                    obj._state.db = using
+    return objs
+
+
+def get_cache_version(key):
+    """
+    Return the version stored in the cache under the key. Include the version in
+    the keys of cached values so that bumping it invalidates all of them.
+    """
+    return get_cache_versions([key])[key]
+
+def get_cache_versions(keys):
+    """
+    Return a dict mapping each key to the version stored in the cache under it,
+    with a single round trip when all of the versions are cached.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if versions.get(key) is None:
+            # Start from the current time so that we never go back to a
+            # version that has cached values if the version gets evicted.
+            cache.add(key, int(time.time() * 1000), None)
+            versions[key] = cache.get(key)
+    return versions
+
+def bump_cache_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
@@ -1,20 +1,234 @@
 from __future__ import unicode_literals
+import json
 import logging
+import os
+import Queue
+import random
+import re
+import threading
+import time
+from django.conf import settings
+from django.db import connections
 from django.http import HttpResponse
 from rest_framework import status
+from rallytap.apps.utils.profiling import end_profile, get_profile, start_profile
+
+
+# Keys whose values we never log.
+REDACTED_KEYS = {'access_token', 'authtoken', 'code', 'password', 'phone',
+                 'token'}
+# Auth tokens and phone numbers that show up anywhere else in the logs.
+REDACTED_PATTERNS = [
+    re.compile(r'\b[0-9a-f]{40}\b'),
+    re.compile(r'\+\d{8,15}\b'),
+]
+REDACTED = '[redacted]'
+
+
+def redact(value):
+    """
+    Return a copy of the value with tokens and phone numbers redacted.
+    """
+    if isinstance(value, dict):
+        return {key: REDACTED if key in REDACTED_KEYS else redact(item)
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, basestring):
+        for pattern in REDACTED_PATTERNS:
+            value = pattern.sub(REDACTED, value)
+    return value
+
+def truncate(text):
+    max_size = settings.REQUEST_LOG_MAX_BODY_SIZE
+    if len(text) <= max_size:
+        return text
+    return '{text}... ({size} chars)'.format(text=text[:max_size],
+                                             size=len(text))
+
+def format_request_log(entry):
+    """
+    Return the request log entry as a line of JSON, with the bodies redacted
+    and truncated.
+    """
+    entry = redact(entry)
+    if 'request' in entry:
+        entry['request'] = truncate(json.dumps(entry['request'],
+                                               default=unicode))
+    if 'response' in entry:
+        entry['response'] = truncate(entry['response'])
+    return json.dumps(entry, sort_keys=True)
+
+
+class QueueLogWriter(object):
+    """
+    Log messages from a bounded queue on a background thread, so that requests
+    never wait on the log. Drop messages when the queue is full.
+
+    The thread formats each message with `format` before logging it.
+    """
+
+    def __init__(self, logger_name, maxsize, format=unicode):
+        self.logger_name = logger_name
+        self.format = format
+        self.queue = Queue.Queue(maxsize)
+        self.lock = threading.Lock()
+        self.pid = None
+        self.dropped = 0
+
+    def put(self, message):
+        self.start()
+        try:
+            self.queue.put_nowait(message)
+        except Queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        # Workers fork after importing this module, so start a thread in each
+        # process.
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            thread = threading.Thread(target=self.run)
+            thread.daemon = True
+            thread.start()
+            self.pid = os.getpid()
+
+    def run(self):
+        logger = logging.getLogger(self.logger_name)
+        while True:
+            message = self.queue.get()
+            if self.dropped:
+                logger.warning('Dropped {} log messages'.format(self.dropped))
+                self.dropped = 0
+            logger.info(self.format(message))
+
+
+request_log = QueueLogWriter('console', settings.REQUEST_LOG_QUEUE_SIZE,
+                             format=format_request_log)
 
 
 class LoggingMixin(object):
+    """
+    Log each request's metadata in the background. Also log the request data
+    and the response content for a sample of requests, capped at
+    `REQUEST_LOG_MAX_BODY_SIZE` characters. Redact tokens and phone numbers.
+    """
 
     def finalize_response(self, request, response, *args, **kwargs):
         response = super(LoggingMixin, self).finalize_response(request, response,
                                                                *args, **kwargs)
 
-        # Log the request data, and response content.
-        logger = logging.getLogger('console')
-        logger.info(request.data)
-        # The response must be rendered before accessing its content.
-        response.render()
-        logger.info(response.content)
+        # The background thread redacts and formats the entry.
+        entry = {
+            'method': request.method,
+            'path': request.path,
+            'query': dict(request.query_params.items()),
+            'user_id': getattr(request.user, 'id', None),
+            'status': response.status_code,
+        }
+        log_bodies = random.random() < settings.REQUEST_LOG_BODY_SAMPLE_RATE
+        if log_bodies:
+            entry['request'] = request.data
+
+        # Wait for Django to render the response instead of rendering it
+        # twice.
+        def log_response(response):
+            if log_bodies:
+                entry['response'] = response.content.decode('utf-8', 'replace')
+            request_log.put(entry)
+        if hasattr(response, 'add_post_render_callback'):
+            response.add_post_render_callback(log_response)
+        else:
+            log_response(response)
+
+        return response
+
+
+def to_ms(seconds):
+    return int(round(seconds * 1000))
+
+
+class ProfilingMiddleware(object):
+    """
+    Profile a sample of requests. Record how many queries each request ran, and
+    how long it spent in the database, calling external services, serializing
+    its response's data, rendering the data as JSON, and in total.
+
+    Views time their serializers with `profile_serialization`. Database queries
+    that serializers run count towards both the database and serialization
+    times.
+
+    Add the stats to the response's headers, and log them as JSON to the
+    `profiling` logger. Times are in milliseconds.
+    """
+
+    def process_request(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return None
+
+        # Debug cursors log every query with how long it took. Remember where
+        # each connection's log started, and whether it was already logging.
+        profile = start_profile()
+        profile.connections = {}
+        for connection in connections.all():
+            profile.connections[connection.alias] = (
+                    connection.force_debug_cursor, len(connection.queries_log))
+            connection.force_debug_cursor = True
+
+    def process_template_response(self, request, response):
+        profile = get_profile()
+        if profile is None:
+            return response
+
+        # Django renders the response right after this.
+        started_at = time.time()
+        def set_render_time(response):
+            profile.render_time = time.time() - started_at
+        response.add_post_render_callback(set_render_time)
+        return response
+
+    def process_response(self, request, response):
+        profile = end_profile()
+        if profile is None:
+            return response
+
+        num_queries = 0
+        db_time = 0.0
+        for alias, (force_debug_cursor, start) in profile.connections.items():
+            connection = connections[alias]
+            connection.force_debug_cursor = force_debug_cursor
+            queries = list(connection.queries_log)[start:]
+            num_queries += len(queries)
+            db_time += sum(float(query['time']) for query in queries)
+        http_time = sum(profile.http_times.values())
+        total_time = time.time() - profile.started_at
+
+        response['X-Profile-Queries'] = num_queries
+        response['X-Profile-DB-Time'] = to_ms(db_time)
+        response['X-Profile-HTTP-Time'] = to_ms(http_time)
+        response['X-Profile-Serialization-Time'] = to_ms(
+                profile.serialization_time)
+        response['X-Profile-Render-Time'] = to_ms(profile.render_time)
+        response['X-Profile-Time'] = to_ms(total_time)
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        logger = logging.getLogger('profiling')
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': resolver_match and resolver_match.url_name,
+            'status': response.status_code,
+            'queries': num_queries,
+            'db_time': to_ms(db_time),
+            'http_time': to_ms(http_time),
+            'http_times': {service: to_ms(seconds)
+                           for service, seconds in profile.http_times.items()},
+            'serialization_time': to_ms(profile.serialization_time),
+            'render_time': to_ms(profile.render_time),
+            'time': to_ms(total_time),
+        }, sort_keys=True))
 
         return response
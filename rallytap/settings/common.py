@@ -22,12 +22,15 @@ INSTALLED_APPS = (
     'rallytap.apps.client',
     'rallytap.apps.events',
     'rallytap.apps.friends',
+    'rallytap.apps.jobs',
     'rallytap.apps.notifications',
+    'rallytap.apps.utils',
     'push_notifications',
     'rest_framework.authtoken',
     'corsheaders',
 )
 MIDDLEWARE_CLASSES = (
+    'rallytap.middleware.ProfilingMiddleware', # Has to come first to time everything
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware', # Has to come before common middleware
     'django.middleware.common.CommonMiddleware',
@@ -103,12 +106,21 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'verbose'
         },
+        'profiling': {
+            'level': 'INFO',
+            'class': 'logging.StreamHandler',
+            'formatter': 'simple'
+        },
     },
     'loggers': {
         'console': {
             'handlers': ['console'],
             'level': 'INFO',
-        }
+        },
+        'profiling': {
+            'handlers': ['profiling'],
+            'level': 'INFO',
+        },
     }
 }
 
@@ -124,12 +136,26 @@ CORS_ORIGIN_ALLOW_ALL = True
 
 # Meteor server
 METEOR_KEY = os.environ['METEOR_KEY']
+# Keys the meteor server can authenticate with. Put the new key first when
+# rotating, and keep the old key until the meteor server has switched.
+METEOR_KEYS = [METEOR_KEY] + [
+    key for key in os.environ.get('METEOR_OLD_KEYS', '').split(',') if key]
 METEOR_URL = os.environ['METEOR_URL']
 METEOR_USER_ID = -1
+# Seconds to wait to connect to the meteor server, and for it to respond.
+METEOR_TIMEOUT = (3.05, 10)
+METEOR_MAX_RETRIES = 3
+METEOR_BACKOFF_FACTOR = 0.1
+# The max number of open connections to keep to the meteor server per process.
+METEOR_POOL_SIZE = 10
 
 # Facebook
 FACEBOOK_APP_ID = os.environ['FACEBOOK_APP_ID']
 FACEBOOK_APP_SECRET = os.environ['FACEBOOK_APP_SECRET']
+# Seconds to wait to connect to Facebook, and for it to respond.
+FACEBOOK_TIMEOUT = (3.05, 10)
+# Seconds to cache a user's list of Facebook friends.
+FACEBOOK_FRIENDS_CACHE_TIMEOUT = 60 * 60
 
 # Twilio
 TWILIO_ACCOUNT = os.environ['TWILIO_ACCOUNT']
@@ -142,6 +168,9 @@ HASHIDS_SALT = os.environ['HASHIDS_SALT']
 # Push notifications
 PUSH_NOTIFICATIONS_SETTINGS = {
     'GCM_API_KEY': os.environ['GCM_API_KEY'],
+    # Wait for APNS to report an invalid token after sending a batch of
+    # notifications.
+    'APNS_ERROR_TIMEOUT': 1,
 }
 
 # Branch
@@ -151,7 +180,54 @@ BRANCH_API_KEY = os.environ['BRANCH_API_KEY']
 MIXPANEL_TOKEN = os.environ['MIXPANEL_TOKEN']
 
 # Querying
-# 10: miles away that is still considered nearby
-# 24,901: circumference of the earth in miles
-# 360: degrees in a circle
-NEARBY_RADIUS = (10 / 24901) * 360
+# Meters away that is still considered nearby (10 miles).
+NEARBY_DISTANCE = 16093
+# The number of events to expire in each transaction.
+EXPIRE_EVENTS_BATCH_SIZE = 1000
+# Days after an event happens before we move it to the archive tables.
+ARCHIVE_EVENTS_AFTER_DAYS = 30
+# The number of events to archive in each transaction.
+ARCHIVE_EVENTS_BATCH_SIZE = 1000
+# Whether to add saved events to a feed table for each user when they're saved,
+# and read feeds from that table.
+FEED_FAN_OUT = os.environ.get('FEED_FAN_OUT', 'false') == 'true'
+# Seconds to cache the recommended events in a geohash cell.
+RECOMMENDED_EVENTS_CACHE_TIMEOUT = 60 * 60
+# Seconds to cache a response for a user. We invalidate cached responses when
+# they change, so this only limits how long unused responses take up memory.
+USER_RESPONSE_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Friends
+# Usernames of the system accounts that are friends with every user. We don't
+# store friendships for system accounts; we add them when reading friends.
+SYSTEM_USERNAMES = ('teamrallytap',)
+
+# Profiling
+# The fraction of requests to profile.
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0.01'))
+
+# Request logging
+# The max number of request log messages waiting to be written.
+REQUEST_LOG_QUEUE_SIZE = 1000
+# The fraction of requests to log the request data and response content for.
+REQUEST_LOG_BODY_SAMPLE_RATE = float(
+        os.environ.get('REQUEST_LOG_BODY_SAMPLE_RATE', '0'))
+# The max number of characters of a body to log.
+REQUEST_LOG_MAX_BODY_SIZE = 2000
+
+# Token authentication
+# Seconds to cache a token and its user in the shared cache.
+TOKEN_CACHE_TIMEOUT = 5 * 60
+# Seconds to cache a token and its user in each process. Other processes can't
+# invalidate these, so keep them short.
+TOKEN_LOCAL_CACHE_TIMEOUT = 5
+# The max number of tokens to cache in each process.
+TOKEN_LOCAL_CACHE_SIZE = 1000
+
+# Background jobs
+# The number of times to try running a job before giving up on it.
+JOBS_MAX_ATTEMPTS = 5
+# Seconds to wait before assuming the worker running a job died.
+JOBS_TIMEOUT = 5 * 60
+# Seconds a worker sleeps when there are no jobs to run.
+JOBS_POLL_INTERVAL = 1
@@ -1,7 +1,9 @@
 #!/bin/bash
 
 PYTHON_VERSION=2.7.8
-POSTGRES_VERSION=9.3.5
+# The job queue and migrations use `SKIP LOCKED`, `ON CONFLICT` and
+# `CREATE INDEX ... IF NOT EXISTS`, which need Postgres 9.5.
+POSTGRES_VERSION=9.5
 BASH_PROFILE="$HOME/.bash_profile"
 
 #
@@ -51,15 +53,15 @@ heroku login
 #
 # Check if Postgres is installed
 #
-psql --version | grep ${POSTGRES_VERSION}
+psql --version | grep " ${POSTGRES_VERSION}\."
 if [[ $? != 0 ]] ; then
-    echo "Please install Postgres v9.3.5"
+    echo "Please install Postgres v${POSTGRES_VERSION}"
     echo "Make sure to remove any previous versions of Postgres you have"
-    open https://github.com/PostgresApp/PostgresApp/releases/download/9.3.5.0/Postgres-9.3.5.0.zip
+    open https://github.com/PostgresApp/PostgresApp/releases
     read -p "Press return when done with Postgres installation"
     echo "" >> $BASH_PROFILE
     echo "### Add Postgres to the path (Down)" >> $BASH_PROFILE
-    echo "export PATH=/Applications/Postgres.app/Contents/Versions/9.3/bin:\$PATH" >> $BASH_PROFILE
+    echo "export PATH=/Applications/Postgres.app/Contents/Versions/${POSTGRES_VERSION}/bin:\$PATH" >> $BASH_PROFILE
     source $BASH_PROFILE
 fi
 